@@ -29,7 +29,8 @@ server = None
 
 
 def init(mode='sim', configfile=None, scenfile=None, discoverable=False,
-         gui=None, detached=False, workdir=None, **kwargs):
+         gui=None, detached=False, workdir=None, batchfile=None, nnodes=None,
+         results=None, **kwargs):
     ''' Initialize bluesky modules.
 
         Arguments:
@@ -41,6 +42,9 @@ def init(mode='sim', configfile=None, scenfile=None, discoverable=False,
         - gui: Gui type (only when mode is client or server) [qtgl/pygame/console]
         - detached: Run with or without networking (only when mode is sim) [True/False]
         - workdir: Pass a custom working directory (instead of cwd or ~/bluesky)
+        - batchfile: Run this batch file, and quit when done (only when mode is server) [filename]
+        - nnodes: Maximum number of simulation nodes (only when mode is server) [int]
+        - results: Batch results file (only when mode is server) [filename]
     '''
 
     # Argument checking
@@ -56,6 +60,8 @@ def init(mode='sim', configfile=None, scenfile=None, discoverable=False,
         assert mode != 'sim' or gui == 'pygame', 'BlueSky init: Gui type shouldn\'t be specified in sim mode.'
     if detached:
         assert mode == 'sim', 'BlueSky init: Detached operation is only available in sim mode.'
+    if batchfile:
+        assert mode == 'server', 'BlueSky init: Batch files can only be run in server mode.'
 
     # Keep track of mode and gui type.
     globals()['mode'] = mode
@@ -82,7 +88,7 @@ def init(mode='sim', configfile=None, scenfile=None, discoverable=False,
     if mode == 'server':
         global server
         from bluesky.network.server import Server
-        server = Server(discoverable, configfile, scenfile)
+        server = Server(discoverable, configfile, scenfile, batchfile, nnodes, results)
 
     # The remaining objects are only instantiated in the sim nodes
     if mode == 'sim':
@@ -0,0 +1,10 @@
+''' Headless performance benchmarks for the BlueSky simulation.
+
+    Run the benchmark suite from the command line with:
+
+        python -m bluesky.benchmarks [--sizes 100 1000] [--output results.json]
+                                     [--compare baseline.json]
+
+    The simulation is initialised in detached mode, without GUI or networking.
+'''
+from bluesky.benchmarks.suite import run, compare
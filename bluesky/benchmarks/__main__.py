@@ -0,0 +1,32 @@
+import sys
+import argparse
+from bluesky.benchmarks import suite
+
+
+def main():
+    ''' Run the benchmark suite from the command line.
+        Exits with a non-zero status when compared with a baseline, and
+        one or more benchmarks turn out slower than the threshold allows. '''
+    parser = argparse.ArgumentParser(prog='python -m bluesky.benchmarks',
+                                     description='BlueSky headless performance benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(suite.SIZES),
+                        help='Numbers of aircraft to benchmark')
+    parser.add_argument('--duration', type=float, default=suite.DURATION,
+                        help='Simulated duration [s] of the timed steps per size')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Compare the results with a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    results = suite.run(args.sizes, args.duration, args.output)
+    if args.compare:
+        regressions = suite.compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} benchmark(s) slower than baseline')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+''' Benchmark suite for the simulation step and related operations. '''
+import json
+import time
+import random
+import platform
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+import numpy as np
+
+import bluesky as bs
+from bluesky import settings
+from bluesky.stack import simstack
+from bluesky.tools import profiler
+from bluesky.tools.aero import ft, kts
+
+
+# Default numbers of aircraft to benchmark
+SIZES = (100, 1000, 5000, 20000)
+# Simulated duration [s] of the timed simulation steps per traffic size.
+# This spans several intervals of the stages that run on their own timers
+# (asas_dt, performance_dt), so that these are sampled as well
+DURATION = 10.0
+# Traffic density: aircraft are spread over a square of this many degrees
+# for 1000 aircraft, and scaled with sqrt(n) to keep the density constant
+SPREAD1000 = 2.0
+class Timings:
+    ''' Collection of wall-clock timings per benchmark item. '''
+    def __init__(self):
+        self.samples = dict()
+
+    def add(self, name, dt):
+        self.samples.setdefault(name, []).append(dt)
+
+    @contextmanager
+    def time(self, name):
+        ''' Time the enclosed code block as one sample of name. '''
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def addprofile(self, group):
+        ''' Add the samples recorded by the profiler in group. '''
+        for name, hist in profiler.histograms[group].items():
+            self.samples.setdefault(name, []).extend(hist.window().tolist())
+
+    def summary(self):
+        ''' Return a dict with statistics for each timed item. '''
+        return {name: dict(calls=len(s), total=float(np.sum(s)), mean=float(np.mean(s)),
+                           median=float(np.median(s)), min=float(np.min(s)), max=float(np.max(s)))
+                for name, s in self.samples.items()}
+
+
+def init():
+    ''' Initialise BlueSky in detached mode, if this wasn't done yet. '''
+    if bs.sim is None:
+        bs.init(mode='sim', detached=True)
+
+
+def reset(seed=0):
+    ''' Reset the simulation, and make the random traffic reproducible. '''
+    bs.sim.reset()
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def maketraffic(n):
+    ''' Create n random aircraft with Traffic.mcre, at a constant density,
+        with a share of them in predefined conflicts (Traffic.creconfs). '''
+    spread = SPREAD1000 * np.sqrt(n / 1000.0)
+    bs.scr.zoom(2.0 / spread)
+
+    nconf = min(n // 20, 200)
+    bs.traf.mcre(n - nconf, acalt=None, acspd=None)
+    for i in range(nconf):
+        bs.traf.creconfs(f'CONF{i:04d}', 'B744', i, dpsi=random.uniform(0.0, 180.0),
+                         dcpa=random.uniform(0.0, 4.0), tlosh=random.uniform(60.0, 240.0))
+
+
+def bench_step(n, duration, timings):
+    ''' Time complete simulation steps over a simulated duration [s],
+        Traffic.update, and its stages (see profiler.STAGES). '''
+    reset()
+    maketraffic(n)
+
+    # Switch on the optional stages
+    bs.stack.stack('ASAS ON')
+    bs.stack.stack('RESO MVP')
+    bs.stack.stack('TRAIL ON')
+    simstack.process()
+    bs.traf.wind.addpoint(52.0, 4.0, 270.0, 30.0 * kts)
+    bs.traf.wind.addpoint(50.0, 8.0, [260.0, 250.0], [30.0 * kts, 50.0 * kts], [0.0, 30000 * ft])
+
+    bs.sim.op()
+    # Warm up: the first steps include one-time initialisation
+    for _ in range(2):
+        bs.sim.step()
+
+    nsteps = int(round(duration / bs.sim.simdt))
+
+    # Time Traffic.update and its stages with the timed wrappers of the
+    # profiler, keeping all samples of this run
+    settings.profile_window = max(settings.profile_window, nsteps)
+    profiler.reset()
+    profiler.install_stages()
+    try:
+        for _ in range(nsteps):
+            with timings.time('sim_step'):
+                bs.sim.step()
+    finally:
+        profiler.uninstall_stages()
+    timings.addprofile('traffic')
+
+
+def bench_stack(n, timings):
+    ''' Time processing of a typical mix of stack commands, one per aircraft. '''
+    reset()
+    maketraffic(n)
+    cmds = ('ALT {} FL{}', 'HDG {} {}', 'SPD {} {}', 'VS {} {}')
+    for i, acid in enumerate(bs.traf.id):
+        cmd = cmds[i % len(cmds)]
+        bs.stack.stack(cmd.format(acid, random.randint(100, 350)))
+
+    with timings.time('stack_process'):
+        simstack.process()
+
+
+def bench_credel(n, timings):
+    ''' Time creation of aircraft, and deletion of half of them. '''
+    reset()
+    with timings.time('create'):
+        maketraffic(n)
+
+    delidx = np.random.permutation(bs.traf.ntraf)[:bs.traf.ntraf // 2]
+    with timings.time('delete'):
+        bs.traf.delete(delidx)
+
+
+def bench_scenario(n, timings):
+    ''' Time loading and executing a scenario file that creates n aircraft. '''
+    reset()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fname = Path(tmpdir) / 'benchmark.scn'
+        lat = 52.0 + np.random.uniform(-1.0, 1.0, n)
+        lon = 4.0 + np.random.uniform(-1.0, 1.0, n)
+        with open(fname, 'w') as f:
+            for i in range(n):
+                f.write(f'00:00:00.00>CRE BM{i:05d} B744 {lat[i]:.5f} {lon[i]:.5f} '
+                        f'{random.randint(0, 359)} FL{random.randint(100, 390)} 300\n')
+
+        with timings.time('scenario_load'):
+            bs.stack.stack(f'IC {fname}')
+            simstack.process()
+            # Scenario commands at t=0 are executed in the first step
+            bs.sim.op()
+            bs.sim.step()
+
+
+def run(sizes=SIZES, duration=DURATION, output=None):
+    ''' Run the benchmark suite for each traffic size in sizes.
+        Returns the results as a dict, and writes them to output as JSON
+        if a filename is passed. '''
+    init()
+    results = dict(
+        meta=dict(date=time.strftime('%Y-%m-%d %H:%M:%S'),
+                  python=platform.python_version(),
+                  numpy=np.__version__,
+                  platform=platform.platform(),
+                  processor=platform.processor(),
+                  duration=duration),
+        results=dict())
+
+    for n in sizes:
+        print(f'Benchmarking {n} aircraft')
+        timings = Timings()
+        bench_step(n, duration, timings)
+        bench_stack(n, timings)
+        bench_credel(n, timings)
+        bench_scenario(n, timings)
+        results['results'][str(n)] = timings.summary()
+
+    reset()
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Benchmark results written to {output}')
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    ''' Compare benchmark results with a baseline.
+        Results and baseline can be dicts or JSON filenames.
+        Prints a table of median timings, and returns a list of
+        (size, item, ratio) for items that are more than threshold
+        (relative) slower than the baseline. '''
+    if not isinstance(results, dict):
+        with open(results) as f:
+            results = json.load(f)
+    if not isinstance(baseline, dict):
+        with open(baseline) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    print(f'{"size":>6} {"item":<20} {"baseline [ms]":>14} {"current [ms]":>13} {"ratio":>7}')
+    for size, items in results['results'].items():
+        refitems = baseline['results'].get(size, dict())
+        for item, stats in items.items():
+            ref = refitems.get(item)
+            if ref is None:
+                continue
+            ratio = stats['median'] / max(ref['median'], 1e-12)
+            flag = ''
+            if ratio > 1.0 + threshold:
+                regressions.append((size, item, ratio))
+                flag = ' <--'
+            print(f'{size:>6} {item:<20} {1e3 * ref["median"]:>14.3f} '
+                  f'{1e3 * stats["median"]:>13.3f} {ratio:>7.2f}{flag}')
+
+    return regressions
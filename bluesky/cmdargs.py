@@ -49,6 +49,21 @@ def parse():
     parser.add_argument("--workdir", dest="workdir",
                         help="Set BlueSky working directory (if other than cwd or ~/bluesky).")
 
+    batch = parser.add_argument_group("batch simulation")
+    batch.add_argument("--batch", dest="batchfile",
+                        help="Run all scenarios in a batch file on a headless server, and quit when done. "
+                        "An interrupted batch is resumed when it is started again with the same results file.")
+    batch.add_argument("--nodes", dest="nnodes", type=int,
+                        help="Number of simulation nodes to use for batch simulations (can be larger than the number of cpus).")
+    batch.add_argument("--results", dest="results",
+                        help="File to store batch results in (default: <log_path>/<batchname>_results.jsonl). "
+                        "Batches started with a results file resume from the results stored in it.")
+
     cmdargs = parser.parse_args()
 
+    # The batch runner is a headless server
+    if cmdargs.batchfile:
+        cmdargs.mode = "server"
+        cmdargs.gui = None
+
     return vars(cmdargs)
@@ -7,9 +7,24 @@ except ImportError:
     # In python <3.3 collections.abc doesn't exist
     from collections import Collection
 import numpy as np
+from bluesky import settings
+
+# Register settings defaults
+# traf_prealloc: Keep traffic arrays in over-allocated storage that grows
+#                geometrically, instead of reallocating on each create/delete.
+#                Arrays that are rebound by an update (e.g., self.tas = np.where(...))
+#                are copied back into their storage on the next create/delete, so
+#                create/delete is only amortised O(1) for arrays that are updated
+#                in place. Combine with traffic_inplace=True to update the
+#                kinematic state in place.
+settings.set_variable_defaults(traf_prealloc=False)
 
 defaults = {"float": 0.0, "int": 0, "uint":0, "bool": False, "S": "", "str": ""}
 
+# Geometric growth factor and minimum capacity of preallocated storage
+growthfac = 1.5
+mincapacity = 64
+
 
 class RegisterElementParameters:
     """ Class to use in 'with'-syntax. This class automatically
@@ -51,6 +66,9 @@ class TrafficArrays:
         self._children = []
         self._ArrVars  = []
         self._LstVars  = []
+        # Preallocated storage per array, and the live views handed out
+        self._storage  = dict()
+        self._views    = dict()
 
     def reparent(self, newparent):
         ''' Give TrafficArrays object a new parent. '''
@@ -86,11 +104,75 @@ class TrafficArrays:
             vartype = type(lst[0]).__name__ if lst else 'str'
             lst.extend([defaults.get(vartype)] * n)
 
+        if settings.traf_prealloc:
+            for v in self._ArrVars:
+                self._grow(v, n)
+            return
+
         for v in self._ArrVars:  # Numpy array
             # Get type without byte length
             vartype = ''.join(c for c in str(self.__dict__[v].dtype) if c.isalpha())
             self.__dict__[v] = np.append(self.__dict__[v], [defaults.get(vartype, 0)] * n)
 
+    def _owned(self, v):
+        ''' Returns true if array v is still the view on its own storage
+            (i.e., it hasn't been rebound since the last create/delete). '''
+        return self.__dict__[v] is self._views.get(v)
+
+    def _adopt(self, v):
+        ''' Copy array v into its own storage when it was rebound (e.g.,
+            self.tas = np.where(...)), and make it a view on that storage.
+            This copy is O(n) for each rebound array, which is why
+            traf_prealloc only pays off together with traffic_inplace. '''
+        if self._owned(v):
+            return
+        arr = self.__dict__[v]
+        storage = self._storage.get(v)
+        if storage is None or storage.dtype != arr.dtype or len(storage) < len(arr):
+            storage = np.empty(max(mincapacity, int(growthfac * len(arr))), dtype=arr.dtype)
+            self._storage[v] = storage
+        storage[:len(arr)] = arr
+        self.__dict__[v] = self._views[v] = storage[:len(arr)]
+
+    def _grow(self, v, n):
+        ''' Append n default elements to preallocated array v, growing its
+            storage geometrically when capacity is exceeded. '''
+        self._adopt(v)
+        arr = self.__dict__[v]
+        nold = len(arr)
+        storage = self._storage[v]
+        if nold + n > len(storage):
+            storage = np.empty(max(mincapacity, int(growthfac * (nold + n))), dtype=arr.dtype)
+            storage[:nold] = arr
+            self._storage[v] = storage
+        vartype = ''.join(c for c in str(storage.dtype) if c.isalpha())
+        storage[nold:nold + n] = defaults.get(vartype, 0)
+        self.__dict__[v] = self._views[v] = storage[:nold + n]
+
+    def _compact(self, v, idx):
+        ''' Remove element(s) idx from preallocated array v in place. '''
+        self._adopt(v)
+        arr = self.__dict__[v]
+        if isinstance(idx, Collection):
+            keep = np.ones(len(arr), dtype=bool)
+            keep[idx] = False
+            nkeep = np.count_nonzero(keep)
+            arr[:nkeep] = arr[keep]
+        else:
+            idx = idx % len(arr)
+            nkeep = len(arr) - 1
+            arr[idx:nkeep] = arr[idx + 1:]
+        self.__dict__[v] = self._views[v] = self._storage[v][:nkeep]
+
+    def _adopt_tree(self):
+        ''' Give all preallocated arrays in this tree their own storage.
+            Rebound arrays can alias arrays of other objects, so this is done
+            for the whole tree before any array is compacted in place. '''
+        for v in self._ArrVars:
+            self._adopt(v)
+        for child in self._children:
+            child._adopt_tree()
+
     def istrafarray(self, name):
         ''' Returns true if parameter 'name' is a traffic array. '''
         return name in self._LstVars or name in self._ArrVars
@@ -103,12 +185,19 @@ class TrafficArrays:
 
     def delete(self, idx):
         ''' Aircraft delete. '''
+        if settings.traf_prealloc and self is TrafficArrays.root:
+            self._adopt_tree()
+
         # Remove element (aircraft) idx from all lists and arrays
         for child in self._children:
             child.delete(idx)
 
-        for v in self._ArrVars:
-            self.__dict__[v] = np.delete(self.__dict__[v], idx)
+        if settings.traf_prealloc:
+            for v in self._ArrVars:
+                self._compact(v, idx)
+        else:
+            for v in self._ArrVars:
+                self.__dict__[v] = np.delete(self.__dict__[v], idx)
 
         if self._LstVars:
             if isinstance(idx, Collection):
@@ -125,7 +214,12 @@ class TrafficArrays:
             child.reset()
 
         for v in self._ArrVars:
-            self.__dict__[v] = np.array([], dtype=self.__dict__[v].dtype)
+            storage = self._storage.get(v)
+            if settings.traf_prealloc and storage is not None and \
+                    storage.dtype == self.__dict__[v].dtype:
+                self.__dict__[v] = self._views[v] = storage[:0]
+            else:
+                self.__dict__[v] = np.array([], dtype=self.__dict__[v].dtype)
 
         for v in self._LstVars:
             self.__dict__[v] = []
@@ -1,40 +1,89 @@
 ''' Loader functions for navigation data. '''
-import pickle
+from pathlib import Path
+import numpy as np
 
+import bluesky as bs
 from bluesky import settings
 from bluesky.tools import cachefile
 from .loadnavdata_txt import loadnavdata_txt, loadthresholds_txt
 
 
-# Cache versions: increment these to the current date if the source data is updated
-# or other reasons why the cache needs to be updated
-navdb_version = 'v20170101'
+# Cache format version: increment this when the structure of the cached data changes.
+# Changes in the source data or in the loaders are detected from file modification times.
+navdb_version = 'c20240101'
 
 ## Default settings
 settings.set_variable_defaults(navdata_path='navdata')
 
 
+def navdata_sources():
+    ''' Return the files the navigation database is loaded from. '''
+    path = bs.resource(settings.navdata_path)
+    files = [path / fname for fname in ('nav.dat', 'fix.dat', 'awy.dat', 'airports.dat',
+                                        'icao-countries.dat', 'apt.zip')]
+    files += sorted(f for f in (path / 'fir').iterdir() if f.suffix == '.txt')
+    # Also invalidate the cache when the loaders change
+    files += [Path(__file__), Path(__file__).with_name('loadnavdata_txt.py')]
+    return files
+
+
 def load_navdata():
     ''' Load navigation database. '''
-    with cachefile.openfile('navdata.p', navdb_version) as cache:
-        try:
-            wptdata       = cache.load()
-            awydata       = cache.load()
-            aptdata       = cache.load()
-            firdata       = cache.load()
-            codata        = cache.load()
-            rwythresholds = cache.load()
-        except (pickle.PickleError, cachefile.CacheError) as e:
-            print(e.args[0])
-
-            wptdata, aptdata, awydata, firdata, codata = loadnavdata_txt()
-            rwythresholds = loadthresholds_txt()
-
-            cache.dump(wptdata)
-            cache.dump(awydata)
-            cache.dump(aptdata)
-            cache.dump(firdata)
-            cache.dump(codata)
-            cache.dump(rwythresholds)
+    cache = cachefile.ColumnCache('navdata', navdata_sources(), navdb_version)
+    try:
+        return from_columns(cache.load())
+    except cachefile.CacheError as e:
+        print(e.args[0])
+
+    wptdata, aptdata, awydata, firdata, codata = loadnavdata_txt()
+    rwythresholds = loadthresholds_txt()
+
+    cache.dump(to_columns(wptdata, aptdata, awydata, firdata, codata, rwythresholds))
 
     return wptdata, aptdata, awydata, firdata, codata, rwythresholds
+
+
+def to_columns(wptdata, aptdata, awydata, firdata, codata, rwythresholds):
+    ''' Flatten the navigation data to a dict of columns for the cache. '''
+    columns = dict()
+    for group, data in (('wpt', wptdata), ('apt', aptdata), ('awy', awydata), ('co', codata)):
+        columns.update({f'{group}.{key}': value for key, value in data.items()})
+
+    # FIR borders: lat/lon lines, and concatenated border points per FIR
+    columns.update({f'fir.{key}': value for key, value in firdata.items() if key != 'fir'})
+    columns['fir.name'] = [fir[0] for fir in firdata['fir']]
+    columns['fir.npoints'] = np.array([len(fir[1]) for fir in firdata['fir']], dtype=int)
+    columns['fir.lat'] = np.array([lat for fir in firdata['fir'] for lat in fir[1]], dtype=float)
+    columns['fir.lon'] = np.array([lon for fir in firdata['fir'] for lon in fir[2]], dtype=float)
+
+    # Runway thresholds: also keep airports without (paved) runways
+    columns['rwy.apt'] = list(rwythresholds.keys())
+    columns['rwy.nrwy'] = np.array([len(rwys) for rwys in rwythresholds.values()], dtype=int)
+    columns['rwy.rwy'] = [rwy for rwys in rwythresholds.values() for rwy in rwys]
+    thr = np.array([thr for rwys in rwythresholds.values() for thr in rwys.values()],
+                   dtype=float).reshape(-1, 3)
+    columns['rwy.lat'], columns['rwy.lon'], columns['rwy.hdg'] = thr.T.copy()
+
+    return columns
+
+
+def from_columns(columns):
+    ''' Rebuild the navigation data from a dict of cached columns. '''
+    groups = dict(wpt=dict(), apt=dict(), awy=dict(), fir=dict(), co=dict(), rwy=dict())
+    for col, value in columns.items():
+        group, key = col.split('.', 1)
+        groups[group][key] = value
+
+    fir = groups['fir']
+    bounds = np.cumsum(fir.pop('npoints'))[:-1]
+    lats = np.split(fir.pop('lat'), bounds)
+    lons = np.split(fir.pop('lon'), bounds)
+    fir['fir'] = [[name, lat.tolist(), lon.tolist()] for name, lat, lon in
+                  zip(fir.pop('name'), lats, lons)]
+
+    rwy = groups['rwy']
+    thr = iter(zip(rwy['rwy'], zip(rwy['lat'].tolist(), rwy['lon'].tolist(), rwy['hdg'].tolist())))
+    rwythresholds = {apt: dict(next(thr) for _ in range(nrwy))
+                     for apt, nrwy in zip(rwy['apt'], rwy['nrwy'].tolist())}
+
+    return groups['wpt'], groups['apt'], groups['awy'], fir, groups['co'], rwythresholds
@@ -1,5 +1,6 @@
 from math import *
 import numpy as np
+from scipy.spatial import cKDTree
 
 from .loadnavdata import load_navdata
 from bluesky.tools import geo
@@ -95,6 +96,20 @@ class Navdatabase:
 
         self.rwythresholds = rwythresholds
 
+        # Hashed lookup: waypoint name -> list of indices, airport name -> first index
+        self.wpidx = dict()
+        for i, name in enumerate(self.wpid):
+            self.wpidx.setdefault(name, []).append(i)
+        self.aptidx = dict()
+        for i, name in enumerate(self.aptid):
+            self.aptidx.setdefault(name, i)
+
+        # Spatial indices, built on first use
+        self.wptree = None
+        self.apttree = None
+        self.wpsorted = None
+        self.aptsorted = None
+
     def defwpt(self,name=None,lat=None,lon=None,wptype=None):
 
         # Prevent polluting the database: check arguments
@@ -106,7 +121,7 @@ class Navdatabase:
         # No data: give info on waypoint
         elif lat==None or lon==None:
             reflat, reflon = bs.scr.getviewctr()
-            if self.wpid.count(name.upper()) > 0:
+            if name.upper() in self.wpidx:
                 i = self.getwpidx(name.upper(),reflat,reflon)
                 txt = self.wpid[i]+" : "+str(self.wplat[i])+","+str(self.wplon[i])
                 if len(self.wptype[i]+self.wpco[i])>0:
@@ -118,9 +133,11 @@ class Navdatabase:
                 return True,"Waypoint "+name.upper()+" does not yet exist."
 
         # Still here? So there is data, then we add this waypoint
+        self.wpidx.setdefault(name.upper(), []).append(len(self.wpid))
         self.wpid.append(name.upper())
         self.wplat = np.append(self.wplat,lat)
         self.wplon = np.append(self.wplon,lon)
+        self.wptree = self.wpsorted = None
 
         if wptype == None:
             self.wptype.append("")
@@ -139,82 +156,51 @@ class Navdatabase:
 
     def getwpidx(self, txt, reflat=999999., reflon=999999):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpidx.get(txt.upper())
+        if idx is None:
             return -1
 
         # if no pos is specified, get first occurence
-        if not reflat < 99999.:
-            return i
-
-        # If pos is specified check for more and return closest
-        else:
-            idx = []
-            idx.append(i)
-            found = True
-            while i < len(self.wpid) - 1 and found:
-                try:
-                    i = self.wpid.index(name, i + 1)
-                    idx.append(i)
-                except:
-                    found = False
-            if len(idx) == 1:
-                return idx[0]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                return imin
+        if not reflat < 99999. or len(idx) == 1:
+            return idx[0]
+
+        # If pos is specified return closest
+        imin = idx[0]
+        dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
+        for i in idx[1:]:
+            d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
+            if d < dmin:
+                imin = i
+                dmin = d
+        return imin
 
     def getwpindices(self, txt, reflat=999999., reflon=999999,crit=1852.0):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpidx.get(txt.upper())
+        if idx is None:
             return [-1]
 
         # if no pos is specified, get first occurence
-        if not reflat < 99999.:
-            return [i]
+        if not reflat < 99999. or len(idx) == 1:
+            return [idx[0]]
 
         # If pos is specified check for more and return closest
-        else:
-            idx = findall(self.wpid,name) # find indices of al occurences
+        imin = self.getwpidx(txt, reflat, reflon)
 
-            if len(idx) == 1:
-                return [idx[0]]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                # Find co-located
-                indices = [imin]
-                for i in idx:
-                    if i!=imin:
-                        dist = nm*geo.kwikdist(self.wplat[i], self.wplon[i], \
-                                            self.wplat[imin], self.wplon[imin])
-                        if dist<=crit:
-                            indices.append(i)
-
-                return indices
+        # Find co-located
+        indices = [imin]
+        for i in idx:
+            if i!=imin:
+                dist = nm*geo.kwikdist(self.wplat[i], self.wplon[i], \
+                                    self.wplat[imin], self.wplon[imin])
+                if dist<=crit:
+                    indices.append(i)
+
+        return indices
 
     def getaptidx(self, txt):
         """Get waypoint index to access data"""
-        try:
-            return self.aptid.index(txt.upper())
-        except:
-            return -1
+        return self.aptidx.get(txt.upper(), -1)
 
     def getinear(self, wlat, wlon, lat, lon):  # lat,lon in degrees
         # t0 = time.clock()
@@ -227,19 +213,49 @@ class Navdatabase:
         # print dt
         return idx
 
+    @staticmethod
+    def maketree(wlat, wlon):
+        """Build a k-d tree of positions as unit vectors, which is valid
+           across the dateline and near the poles"""
+        lat = np.radians(wlat)
+        lon = np.radians(wlon)
+        return cKDTree(np.column_stack((np.cos(lat) * np.cos(lon),
+                                        np.cos(lat) * np.sin(lon),
+                                        np.sin(lat))))
+
+    @staticmethod
+    def querytree(tree, lat, lon):
+        """Get index of the position closest to lat,lon in a tree"""
+        lat = radians(lat)
+        lon = radians(lon)
+        _, idx = tree.query((cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat)))
+        return idx
+
     def getwpinear(self, lat, lon):  # lat,lon in degrees
         """Get closest waypoint index"""
-        return self.getinear(self.wplat, self.wplon, lat, lon)
+        if self.wptree is None:
+            self.wptree = self.maketree(self.wplat, self.wplon)
+        return self.querytree(self.wptree, lat, lon)
 
     def getapinear(self, lat, lon):  # lat,lon in degrees
         """Get closest airport index"""
-        return self.getinear(self.aptlat, self.aptlon, lat, lon)
+        if self.apttree is None:
+            self.apttree = self.maketree(self.aptlat, self.aptlon)
+        return self.querytree(self.apttree, lat, lon)
 
-    def getinside(self, wlat, wlon, lat0, lat1, lon0, lon1):
-        """Get indices inside given box"""
+    def getinside(self, wlat, wlon, lat0, lat1, lon0, lon1, order=None):
+        """Get indices inside given box. When the indices that sort wlat
+           are passed in order, only the latitude band is searched."""
         # t0 = time.clock()
         if lat0 < lat1:
-            arr = np.where((wlat > lat0) * (wlat < lat1) * (wlon > lon0) * (wlon < lon1))
+            if order is None:
+                arr = np.where((wlat > lat0) * (wlat < lat1) * (wlon > lon0) * (wlon < lon1))
+            else:
+                sortedlat = wlat[order]
+                band = order[np.searchsorted(sortedlat, lat0, side='right'):
+                             np.searchsorted(sortedlat, lat1, side='left')]
+                band = np.sort(band)
+                arr = (band[(wlon[band] > lon0) * (wlon[band] < lon1)],)
         else:
             arr = np.where((wlat > lat1) + (wlat < lat0) * (wlon > lon0) * (wlon < lon1))
 
@@ -249,11 +265,15 @@ class Navdatabase:
 
     def getwpinside(self, lat0, lat1, lon0, lon1):
         """Get waypoint indices inside box"""
-        return self.getinside(self.wplat, self.wplon, lat0, lat1, lon0, lon1)
+        if self.wpsorted is None:
+            self.wpsorted = np.argsort(self.wplat, kind='stable')
+        return self.getinside(self.wplat, self.wplon, lat0, lat1, lon0, lon1, self.wpsorted)
 
     def getapinside(self, lat0, lat1, lon0, lon1):
         """Get airport indicex inside box"""
-        return self.getinside(self.aptlat, self.aptlon, lat0, lat1, lon0, lon1)
+        if self.aptsorted is None:
+            self.aptsorted = np.argsort(self.aptlat, kind='stable')
+        return self.getinside(self.aptlat, self.aptlon, lat0, lat1, lon0, lon1, self.aptsorted)
 
     # returns all runways of given airport
     def listairway(self, airwayid):
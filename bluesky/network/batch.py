@@ -0,0 +1,141 @@
+''' Batch scenario queue for the BlueSky simulation server.
+
+    A batch file contains a list of scenarios (each starting with a SCEN
+    command), which the server distributes over its simulation nodes.
+    The BatchQueue keeps track of which scenario runs on which node, requeues
+    scenarios of nodes that crash or time out, and appends the result of each
+    finished scenario to a results file (one JSON object per line). Because
+    results are written as soon as they arrive, an interrupted batch can be
+    resumed: when resuming, scenarios that already have a result are skipped.
+'''
+import csv
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+
+def split_scenarios(scentime, scencmd):
+    ''' Split the contents of a batch file into individual scenarios. '''
+    start = 0
+    for i in range(1, len(scencmd) + 1):
+        if i == len(scencmd) or scencmd[i][:4] == 'SCEN':
+            scenname = scencmd[start].split()[1].strip()
+            yield dict(name=scenname, scentime=scentime[start:i], scencmd=scencmd[start:i])
+            start = i
+
+
+class BatchQueue:
+    ''' Queue of batch scenarios, with bookkeeping of running scenarios
+        and results.
+
+        Arguments:
+        - scenarios: List of scenario dicts (see split_scenarios)
+        - results: Path of the results file (JSON lines)
+        - retries: Number of times a scenario is requeued after its node
+          failed, before it is recorded as failed
+        - timeout: Maximum wall time [s] for one scenario (None: no limit)
+        - resume: When True, scenarios that already have a result in the
+          results file are not run again
+    '''
+    def __init__(self, scenarios, results, retries=2, timeout=None, resume=True):
+        self.results = Path(results)
+        self.retries = retries
+        self.timeout = timeout
+        # Running scenarios per node: node_id -> (scenario, start time)
+        self.running = dict()
+        # Number of failed attempts per scenario name
+        self.attempts = Counter()
+
+        # Skip scenarios that were already finished in a previous run
+        finished = Counter(row['name'] for row in self.read()) if resume else Counter()
+        self.nskipped = sum(finished.values())
+        self.pending = list()
+        for scen in scenarios:
+            if finished[scen['name']] > 0:
+                finished[scen['name']] -= 1
+            else:
+                self.pending.append(scen)
+        self.ntotal = len(self.pending)
+        self.ndone = 0
+
+    @property
+    def finished(self):
+        ''' True when all scenarios in this batch have a result. '''
+        return not self.pending and not self.running
+
+    def read(self):
+        ''' Read all results stored in the results file. '''
+        if not self.results.exists():
+            return []
+        with open(self.results) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def write(self, row):
+        ''' Append one result to the results file. '''
+        self.results.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.results, 'a') as f:
+            f.write(json.dumps(row) + '\n')
+        self.ndone += 1
+
+    def next(self, node_id):
+        ''' Take the next scenario from the queue, and register it as
+            running on node node_id. '''
+        scen = self.pending.pop(0)
+        self.running[node_id] = (scen, time.time())
+        return scen
+
+    def done(self, node_id, result):
+        ''' Store the result sent by node node_id for its running scenario. '''
+        scen, tstart = self.running.pop(node_id, (None, 0.0))
+        if scen is None:
+            # Result of a scenario that was already requeued
+            return
+        row = dict(name=scen['name'], status='ok',
+                   attempts=self.attempts[scen['name']] + 1,
+                   walltime=time.time() - tstart)
+        row.update(result)
+        self.write(row)
+
+    def failed(self, node_id, reason):
+        ''' Requeue the scenario of a failed node, or record it as failed
+            when it has already been retried too often. '''
+        scen, tstart = self.running.pop(node_id, (None, 0.0))
+        if scen is None:
+            return
+        self.attempts[scen['name']] += 1
+        if self.attempts[scen['name']] <= self.retries:
+            self.pending.insert(0, scen)
+        else:
+            self.write(dict(name=scen['name'], status=reason,
+                            attempts=self.attempts[scen['name']],
+                            walltime=time.time() - tstart))
+
+    def timedout(self):
+        ''' Return the ids of nodes of which the scenario ran too long. '''
+        if self.timeout is None:
+            return []
+        tmax = time.time() - self.timeout
+        return [node_id for node_id, (_, tstart) in self.running.items() if tstart < tmax]
+
+    def progress(self):
+        ''' Return a one-line progress summary. '''
+        return f'Batch: {self.ndone}/{self.ntotal} finished, {len(self.running)} running, ' + \
+            f'{len(self.pending)} pending' + \
+            (f' ({self.nskipped} skipped from previous run)' if self.nskipped else '')
+
+    def write_table(self, fname=None):
+        ''' Aggregate all results into one CSV table, with one row per
+            scenario, and one column per result field. '''
+        fname = Path(fname) if fname else self.results.with_suffix('.csv')
+        rows = self.read()
+        columns = list()
+        for row in rows:
+            columns.extend(key for key in row if key not in columns)
+        with open(fname, 'w', newline='') as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({key: ';'.join(val) if isinstance(val, list) else val
+                                 for key, val in row.items()})
+        return fname
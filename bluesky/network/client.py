@@ -7,7 +7,7 @@ from bluesky import settings
 from bluesky.core import Signal
 from bluesky.stack.clientstack import stack, process
 from bluesky.network.discovery import Discovery
-from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, decode_frames
 
 
 class Client:
@@ -169,14 +169,16 @@ class Client:
                     self.event(eventname, pydata, self.sender_id)
 
             if socks.get(self.stream_in) == zmq.POLLIN:
-                msg = self.stream_in.recv_multipart()
+                # Receive without copying: arrays are reconstructed on the received frames
+                msg = self.stream_in.recv_multipart(copy=False)
 
-                strmname = msg[0][:-5]
-                sender_id = msg[0][-5:]
+                topic = msg[0].bytes
+                strmname = topic[:-5]
+                sender_id = topic[-5:]
                 if self._getroute(sender_id) is None:
                     print('Client: Skipping stream data from unknown node')
                     return False
-                pydata = msgpack.unpackb(msg[1], object_hook=decode_ndarray, raw=False)
+                pydata = decode_frames(msg[1:])
                 self.stream(strmname, pydata, sender_id)
 
             # If we are in discovery mode, parse this message
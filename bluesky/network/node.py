@@ -5,12 +5,14 @@ import msgpack
 import bluesky as bs
 from bluesky import stack
 from bluesky.core.walltime import Timer
-from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, encode_frames
 
 
 class Node:
     def __init__(self, event_port, stream_port):
-        self.node_id = b'\x00' + os.urandom(4)
+        # Nodes spawned by a server get their id from that server
+        node_id = os.environ.get('BLUESKY_NODE_ID')
+        self.node_id = bytes.fromhex(node_id) if node_id else b'\x00' + os.urandom(4)
         self.host_id = b''
         self.running = True
         ctx = zmq.Context.instance()
@@ -78,4 +80,6 @@ class Node:
         self.event_io.send_multipart(target + [eventname, pydata])
 
     def send_stream(self, name, data):
-        self.stream_out.send_multipart([name + self.node_id, msgpack.packb(data, default=encode_ndarray, use_bin_type=True)])
+        # Arrays are sent as separate frames: zmq sends the snapshots made by
+        # encode_frames without copying them again
+        self.stream_out.send_multipart([name + self.node_id] + encode_frames(data), copy=False)
@@ -4,7 +4,7 @@ import zmq
 import msgpack
 from bluesky import stack
 from bluesky.core.walltime import Timer
-from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, encode_frames
 
 class IOThread(Thread):
     ''' Separate thread for node I/O. '''
@@ -39,7 +39,7 @@ class IOThread(Thread):
                     break
                 fe_event.send_multipart(msg)
             if poll_socks.get(be_stream) == zmq.POLLIN:
-                fe_stream.send_multipart(be_stream.recv_multipart())
+                fe_stream.send_multipart(be_stream.recv_multipart(copy=False), copy=False)
 
 
 class Node:
@@ -122,4 +122,6 @@ class Node:
         self.event_io.send_multipart([stack.sender() or b'*', name, msgpack.packb(data, default=encode_ndarray, use_bin_type=True)])
 
     def send_stream(self, name, data):
-        self.stream_out.send_multipart([name + self.node_id, msgpack.packb(data, default=encode_ndarray, use_bin_type=True)])
+        # Arrays are sent as separate frames: zmq sends the snapshots made by
+        # encode_frames without copying them again
+        self.stream_out.send_multipart([name + self.node_id] + encode_frames(data), copy=False)
@@ -1,3 +1,4 @@
+import msgpack
 import numpy as np
 
 def encode_ndarray(o):
@@ -12,5 +13,44 @@ def encode_ndarray(o):
 def decode_ndarray(o):
     '''Msgpack decoder for numpy arrays.'''
     if o.get(b'numpy'):
-        return np.fromstring(o[b'data'], dtype=np.dtype(o[b'type'])).reshape(o[b'shape'])
+        return np.frombuffer(o[b'data'], dtype=np.dtype(o[b'type'])).reshape(o[b'shape'])
     return o
+
+
+def encode_frames(data):
+    ''' Encode data as a list of message frames for zero-copy transport.
+
+        The first frame is a small msgpack header that contains the data
+        with each numpy array replaced by its dtype, shape and frame number.
+        The array buffers themselves follow as separate frames, which can be
+        sent with copy=False. Each array is copied once into a buffer that
+        is owned by the message: the arrays passed in are often live
+        simulation state that changes in place in the next timestep, while
+        zmq may still be sending the original buffer. '''
+    buffers = []
+
+    def encode(o):
+        if isinstance(o, np.ndarray):
+            o = np.array(o, order='C')
+            buffers.append(o)
+            return {b'numpy': True,
+                    b'type': o.dtype.str,
+                    b'shape': o.shape,
+                    b'frame': len(buffers)}
+        return o
+
+    header = msgpack.packb(data, default=encode, use_bin_type=True)
+    return [header] + buffers
+
+
+def decode_frames(frames):
+    ''' Decode a list of message frames created with encode_frames.
+        Frames can be bytes or (zero-copy) zmq.Frame objects. Arrays are
+        reconstructed with np.frombuffer on the received buffers. '''
+    def decode(o):
+        if o.get(b'numpy'):
+            buf = frames[o[b'frame']] if b'frame' in o else o[b'data']
+            return np.frombuffer(buf, dtype=np.dtype(o[b'type'])).reshape(o[b'shape'])
+        return o
+
+    return msgpack.unpackb(frames[0], object_hook=decode, raw=False)
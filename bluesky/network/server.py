@@ -1,5 +1,6 @@
 ''' BlueSky simulation server. '''
 import os
+import time
 from multiprocessing import cpu_count
 from threading import Thread
 import sys
@@ -10,33 +11,30 @@ import msgpack
 # Local imports
 import bluesky as bs
 from .discovery import Discovery
+from .batch import BatchQueue, split_scenarios
 
 
 # Register settings defaults
 bs.settings.set_variable_defaults(max_nnodes=cpu_count(),
                                   event_port=9000, stream_port=9001,
                                   simevent_port=10000, simstream_port=10001,
-                                  enable_discovery=False)
-
-def split_scenarios(scentime, scencmd):
-    ''' Split the contents of a batch file into individual scenarios. '''
-    start = 0
-    for i in range(1, len(scencmd) + 1):
-        if i == len(scencmd) or scencmd[i][:4] == 'SCEN':
-            scenname = scencmd[start].split()[1].strip()
-            yield dict(name=scenname, scentime=scentime[start:i], scencmd=scencmd[start:i])
-            start = i
+                                  enable_discovery=False, log_path='output',
+                                  batch_retries=2, batch_timeout=0.0)
 
 
 class Server(Thread):
     ''' Implementation of the BlueSky simulation server. '''
 
-    def __init__(self, discovery, altconfig=None, startscn=None):
+    def __init__(self, discovery, altconfig=None, startscn=None,
+                 batchfile=None, nnodes=None, results=None):
         super().__init__()
-        self.spawned_processes = list()
+        # Spawned simulation node processes: node_id -> Popen
+        self.spawned_processes = dict()
         self.running = True
-        self.max_nnodes = min(cpu_count(), bs.settings.max_nnodes)
-        self.scenarios = []
+        # The number of nodes is not limited to the cpu count: batch
+        # simulations can also be spread over more (e.g., I/O bound) nodes
+        self.max_nnodes = nnodes or bs.settings.max_nnodes
+        self.batch = None
         self.host_id = b'\x00' + os.urandom(4)
         self.clients = []
         self.workers = []
@@ -47,6 +45,10 @@ class Server(Thread):
         self.altconfig = altconfig
         self.startscn = startscn
 
+        # Batch file and results file when running as command-line batch runner
+        self.batchfile = batchfile
+        self.batchresults = results
+
         if bs.settings.enable_discovery or discovery:
             self.discovery = Discovery(self.host_id, is_client=False)
         else:
@@ -54,7 +56,7 @@ class Server(Thread):
 
     def sendscenario(self, worker_id):
         # Send a new scenario to the target sim process
-        scen = self.scenarios.pop(0)
+        scen = self.batch.next(worker_id)
         data = msgpack.packb(scen)
         self.be_event.send_multipart([worker_id, self.host_id, b'BATCH', data])
 
@@ -66,8 +68,97 @@ class Server(Thread):
                 args.extend(['--configfile', self.altconfig])
             if startscn:
                 args.extend(['--scenfile', startscn])
-            p = Popen(args)
-            self.spawned_processes.append(p)
+            # Pass the node id to the new node, so that its process
+            # can be found when the node needs to be replaced
+            node_id = b'\x00' + os.urandom(4)
+            env = dict(os.environ, BLUESKY_NODE_ID=node_id.hex())
+            self.spawned_processes[node_id] = Popen(args, env=env)
+
+    def removenode(self, node_id):
+        ''' Remove a node that stopped or was stopped by the server. '''
+        self.spawned_processes.pop(node_id, None)
+        self.avail_workers.pop(node_id, None)
+        if node_id in self.workers:
+            self.workers.remove(node_id)
+
+    def startbatch(self, scentime, scencmd, batchname):
+        ''' Start a new batch of scenarios. Returns an echo message. '''
+        # Only resume an earlier run of this batch when running as batch runner,
+        # or when a results file was given. Interactive BATCH commands always
+        # start with a new results file.
+        resume = bool(self.batchresults or self.batchfile)
+        if resume:
+            fresults = self.batchresults or \
+                bs.resource(bs.settings.log_path) / f'{batchname}_results.jsonl'
+        else:
+            timestamp = time.strftime('%Y%m%d_%H-%M-%S')
+            fresults = bs.resource(bs.settings.log_path) / f'{batchname}_{timestamp}_results.jsonl'
+        self.batch = BatchQueue(split_scenarios(scentime, scencmd), fresults,
+                                bs.settings.batch_retries,
+                                bs.settings.batch_timeout or None, resume)
+        # Check if the batch list contains scenarios
+        if not self.batch.ntotal:
+            echomsg = 'No scenarios to run in batch file!' if not self.batch.nskipped else \
+                f'All {self.batch.nskipped} scenarios in batch were already finished'
+            self.checkbatch()
+            return echomsg
+
+        # Send scenario to available nodes (nodes that are in init or hold mode):
+        while self.avail_workers and self.batch.pending:
+            worker_id = next(iter(self.avail_workers))
+            self.sendscenario(worker_id)
+            self.avail_workers.pop(worker_id)
+
+        # If there are still scenarios left, determine and
+        # start the required number of local nodes
+        reqd_nnodes = min(len(self.batch.pending), max(0, self.max_nnodes - len(self.workers)))
+        self.addnodes(reqd_nnodes)
+        return f'Found {self.batch.ntotal} scenarios in batch, results are stored in {fresults}'
+
+    def checkbatch(self):
+        ''' Check for crashed and timed-out nodes in a running batch, and
+            aggregate the results when the batch is finished. '''
+        if self.batch is None:
+            return
+        # Stop nodes that exceed the batch timeout, and requeue their scenario.
+        # Only nodes spawned by this server can be stopped.
+        for node_id in self.batch.timedout():
+            proc = self.spawned_processes.get(node_id)
+            if proc is not None:
+                print(f'Batch: node {node_id.hex()} timed out, stopping it')
+                proc.kill()
+                proc.wait()
+                self.removenode(node_id)
+                self.batch.failed(node_id, 'timeout')
+                self.addnodes()
+
+        # Requeue the scenarios of nodes that are no longer running,
+        # and start replacement nodes
+        for node_id, proc in list(self.spawned_processes.items()):
+            if proc.poll() is None:
+                continue
+            self.removenode(node_id)
+            if node_id in self.batch.running:
+                print(f'Batch: node {node_id.hex()} crashed, requeueing scenario')
+                self.batch.failed(node_id, 'crashed')
+                self.addnodes()
+
+        if self.batch.finished:
+            fname = self.batch.write_table()
+            print(f'Batch finished, results written to {fname}')
+            self.batch = None
+            if self.batchfile:
+                # Batch runner mode: quit when the batch is done
+                self.quit()
+
+    def quit(self):
+        ''' Stop this server, and send quit to all nodes and clients. '''
+        self.running = False
+        msg = [self.host_id, b'QUIT', msgpack.packb(None)]
+        for connid in self.workers:
+            self.be_event.send_multipart([connid] + msg)
+        for connid in self.clients:
+            self.fe_event.send_multipart([connid] + msg)
 
     def run(self):
         ''' The main loop of this server. '''
@@ -103,10 +194,17 @@ class Server(Thread):
 
         # Start the first simulation node
         self.addnodes(startscn=self.startscn)
+        tcheck = 0.0
 
         while self.running:
+            # Periodically check the progress of batch simulations
+            if self.batch is not None and time.time() >= tcheck:
+                self.checkbatch()
+                tcheck = time.time() + 1.0
+                if not self.running:
+                    break
             try:
-                events = dict(poller.poll(None))
+                events = dict(poller.poll(None if self.batch is None else 1000))
             except zmq.ZMQError:
                 print('ERROR while polling')
                 break  # interrupted
@@ -128,17 +226,28 @@ class Server(Thread):
                         self.discovery.send_reply(bs.settings.event_port,
                             bs.settings.stream_port)
                     continue
+                # Check if this is a stream message: these should be forwarded
+                # unprocessed, and without copying the (array) frames.
+                if sock == self.be_stream:
+                    self.fe_stream.send_multipart(sock.recv_multipart(copy=False), copy=False)
+                    continue
+
                 # Receive the message
                 msg = sock.recv_multipart()
                 if not msg:
                     # In the rare case that a message is empty, skip remaning processing
                     continue
 
-                # Check if this is a stream message: these should be forwarded unprocessed.
-                if sock == self.be_stream:
-                    self.fe_stream.send_multipart(msg)
-                elif sock == self.fe_stream:
+                if sock == self.fe_stream:
                     self.be_stream.send_multipart(msg)
+                    # A client unsubscribes from its ACDATA2 stream when it
+                    # leaves (also when it disconnects without notice):
+                    # drop its aircraft data subscription in all nodes
+                    if msg[0].startswith(b'\x00ACDATA2'):
+                        client_id = msg[0][8:13]
+                        data = msgpack.packb(None)
+                        for connid in self.workers:
+                            self.be_event.send_multipart([connid, client_id, b'ACDATASUB', data])
                 else:
                     # Select the correct source and destination
                     srcisclient = (sock == self.fe_event)
@@ -160,6 +269,10 @@ class Server(Thread):
                             src.send_multipart([sender_id, self.host_id, b'NODESCHANGED', data])
                         else:
                             self.workers.append(sender_id)
+                            if self.batchfile and len(self.workers) == 1:
+                                # Batch runner mode: let the first node read the batch file
+                                cmd = msgpack.packb(f'BATCH {self.batchfile}', use_bin_type=True)
+                                src.send_multipart([sender_id, self.host_id, b'STACK', cmd])
                             data = msgpack.packb({self.host_id : self.servers[self.host_id]}, use_bin_type=True)
                             for client_id in self.clients:
                                 dest.send_multipart([client_id, self.host_id, b'NODESCHANGED', data])
@@ -190,7 +303,7 @@ class Server(Thread):
                             # If we have batch scenarios waiting, send
                             # the worker a new scenario, otherwise store it in
                             # the available worker list
-                            if self.scenarios:
+                            if self.batch and self.batch.pending:
                                 self.sendscenario(sender_id)
                             else:
                                 self.avail_workers[sender_id] = route
@@ -199,33 +312,21 @@ class Server(Thread):
                         continue
 
                     elif eventname == b'QUIT':
-                        self.running = False
                         # Send quit to all nodes and clients
-                        msg = [self.host_id, eventname, data]
-                        for connid in self.workers:
-                            self.be_event.send_multipart([connid] + msg)
-                        for connid in self.clients:
-                            self.fe_event.send_multipart([connid] + msg)
+                        self.quit()
+                        continue
+
+                    elif eventname == b'BATCHRESULT':
+                        # A node finished its batch scenario: store its results
+                        if self.batch is not None:
+                            self.batch.done(sender_id, msgpack.unpackb(data, raw=False))
+                            print(self.batch.progress())
+                            self.checkbatch()
                         continue
 
                     elif eventname == b'BATCH':
-                        scentime, scencmd = msgpack.unpackb(data, raw=False)
-                        self.scenarios = [scen for scen in split_scenarios(scentime, scencmd)]
-                        # Check if the batch list contains scenarios
-                        if not self.scenarios:
-                            echomsg = 'No scenarios defined in batch file!'
-                        else:
-                            echomsg = f'Found {len(self.scenarios)} scenarios in batch'
-                            # Send scenario to available nodes (nodes that are in init or hold mode):
-                            while self.avail_workers and self.scenarios:
-                                worker_id = next(iter(self.avail_workers))
-                                self.sendscenario(worker_id)
-                                self.avail_workers.pop(worker_id)
-
-                            # If there are still scenarios left, determine and
-                            # start the required number of local nodes
-                            reqd_nnodes = min(len(self.scenarios), max(0, self.max_nnodes - len(self.workers)))
-                            self.addnodes(reqd_nnodes)
+                        scentime, scencmd, batchname = msgpack.unpackb(data, raw=False)
+                        echomsg = self.startbatch(scentime, scencmd, batchname)
                         # ECHO the results to the calling client
                         eventname = b'ECHO'
                         data = msgpack.packb(dict(text=echomsg, flags=0), use_bin_type=True)
@@ -236,7 +337,12 @@ class Server(Thread):
                     # (or the destination)
                     route.append(route.pop(0))
                     msg = route + [eventname, data]
-                    if route[0] == b'*':
+                    if route[0] == self.host_id:
+                        # This message is addressed to this server (e.g., the
+                        # echo of a BATCH command sent by the batch runner)
+                        if eventname == b'ECHO':
+                            print(msgpack.unpackb(data, raw=False)['text'])
+                    elif route[0] == b'*':
                         # This is a send-to-all message
                         msg.insert(0, b'')
                         for connid in self.workers if srcisclient else self.clients:
@@ -246,5 +352,5 @@ class Server(Thread):
                         dest.send_multipart(msg)
 
         # Wait for all nodes to finish
-        for n in self.spawned_processes:
+        for n in self.spawned_processes.values():
             n.wait()
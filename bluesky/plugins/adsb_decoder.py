@@ -2,11 +2,16 @@
 This is a decoder of ABS-D date from Mode-S receiver. The inputs
     of most functions are the Hexdecial strings.
 
+    The functions at the end of this module decode binary Mode-S Beast
+    data in batches instead: messages are stored as rows of bytes in a
+    numpy array, and fields are decoded with integer operations.
+
 Created by  : Junzi Sun (TU Delft)
 Date        : March 2015
 """
 
 import math
+import numpy as np
 
 MODES_CHECKSUM_TABLE = [
     0x3935ea, 0x1c9af5, 0xf1b77e, 0x78dbbf,
@@ -253,3 +258,164 @@ def cprNL(lat):
     except:
         # happens when latitude is +/-90 degree
         return 1
+
+
+# ---------------------------------------------------------------------------
+# Batch decoding of binary Mode-S Beast data
+# ---------------------------------------------------------------------------
+# Mode-S Beast frame types and their length (excluding <esc> and type byte):
+# 6 byte MLAT timestamp, 1 byte signal level, and the message
+BEAST_ESC = 0x1a
+BEAST_FRAMELEN = {0x31: 9, 0x32: 14, 0x33: 21}
+
+# CRC-24 generator polynomial of Mode-S, and byte-wise lookup table
+MODES_GENERATOR = 0xfff409
+CRC24_TABLE = np.zeros(256, dtype=np.uint32)
+for _i in range(256):
+    _crc = _i << 16
+    for _ in range(8):
+        _crc = ((_crc << 1) ^ MODES_GENERATOR) if _crc & 0x800000 else (_crc << 1)
+    CRC24_TABLE[_i] = _crc & 0xffffff
+
+CALLSIGN_CHARS = np.array(list('#ABCDEFGHIJKLMNOPQRSTUVWXYZ#####_###############0123456789######'))
+
+
+def beast_frames(data):
+    """Split a buffer of Mode-S Beast data into long (14 byte) Mode-S messages.
+
+       Returns the messages as an (n, 14) uint8 array, and the number of bytes
+       of data that were processed. The data from the last frame onwards is
+       not processed, as this frame may not be complete yet."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    esc = buf == BEAST_ESC
+    if not esc.any():
+        return np.zeros((0, 14), dtype=np.uint8), 0
+
+    # Within each run of <esc> bytes, pairs encode a literal 0x1a byte. When
+    # the length of a run is odd, its last <esc> starts a new frame.
+    idx = np.flatnonzero(esc)
+    runstart = np.ones(len(idx), dtype=bool)
+    runstart[1:] = np.diff(idx) > 1
+    startidx = np.maximum.accumulate(np.where(runstart, np.arange(len(idx)), 0))
+    posinrun = np.arange(len(idx)) - startidx
+    runend = np.ones(len(idx), dtype=bool)
+    runend[:-1] = runstart[1:]
+    # A run at the end of the buffer may still continue: leave it unprocessed
+    if esc[-1]:
+        runend &= startidx != startidx[-1]
+        posinrun[startidx == startidx[-1]] = 1
+    markers = idx[runend & (posinrun % 2 == 0)]
+    if len(markers) < 2:
+        return np.zeros((0, 14), dtype=np.uint8), 0
+
+    # Remove the frame markers, and the first <esc> of each escaped pair
+    keep = np.ones(len(buf), dtype=bool)
+    keep[idx[posinrun % 2 == 0]] = False
+    unesc = buf[keep]
+    # Positions of the frame type bytes in the unescaped data
+    ftype = np.cumsum(keep)[markers + 1] - 1
+    flen = np.diff(np.append(ftype, len(unesc)))[:-1] - 1
+    ftype = ftype[:-1]
+
+    # Select the complete long Mode-S frames
+    islong = (unesc[ftype] == 0x33) & (flen == BEAST_FRAMELEN[0x33])
+    msgstart = ftype[islong] + 8
+    msgs = unesc[msgstart[:, np.newaxis] + np.arange(14)]
+    return msgs, int(markers[-1])
+
+
+def crc24(msgs):
+    """Compute the Mode-S CRC remainder of each message in an (n, nbytes)
+       uint8 array. For a valid DF17 message the remainder is zero."""
+    crc = np.zeros(len(msgs), dtype=np.uint32)
+    for i in range(msgs.shape[1]):
+        crc = ((crc << 8) & 0xffffff) ^ CRC24_TABLE[((crc >> 16) ^ msgs[:, i]) & 0xff]
+    return crc
+
+
+def df17_fields(msgs):
+    """Decode the common fields of (n, 14) uint8 messages.
+
+       Returns the downlink format, the ICAO address (as integer), the type
+       code, and the 56-bit ME field (as uint64) of each message."""
+    m = msgs.astype(np.uint64)
+    df = msgs[:, 0] >> 3
+    icao = (m[:, 1] << 16) | (m[:, 2] << 8) | m[:, 3]
+    me = np.zeros(len(msgs), dtype=np.uint64)
+    for i in range(4, 11):
+        me = (me << np.uint64(8)) | m[:, i]
+    tc = (me >> np.uint64(51)).astype(int)
+    return df, icao.astype(int), tc, me
+
+
+def mebits(me, start, end):
+    """Return bits [start, end) (counted from the first bit) of ME fields."""
+    return ((me >> np.uint64(56 - end)) & np.uint64((1 << (end - start)) - 1)).astype(int)
+
+
+def me_callsign(me):
+    """Decode the callsigns of aircraft identification ME fields."""
+    chars = CALLSIGN_CHARS[np.stack([mebits(me, 8 + 6 * i, 14 + 6 * i)
+                                     for i in range(8)], axis=-1)]
+    return [''.join(c).replace('_', '').replace('#', '') for c in chars]
+
+
+def me_position(me):
+    """Decode altitude, odd/even flag, and CPR latitude and longitude
+       of airborne position ME fields."""
+    alt = mebits(me, 8, 15) * 16 + mebits(me, 16, 20)
+    alt = alt * 25 - 1000
+    oe = mebits(me, 21, 22)
+    return alt, oe, mebits(me, 22, 39), mebits(me, 39, 56)
+
+
+def me_velocity(me):
+    """Decode speed [kts] and heading [deg] of airborne velocity ME fields.
+       The velocity components are encoded with an offset of one (zero means
+       that no velocity is available)."""
+    v_ew = np.where(mebits(me, 13, 14), -1, 1) * (mebits(me, 14, 24) - 1)
+    v_ns = np.where(mebits(me, 24, 25), -1, 1) * (mebits(me, 25, 35) - 1)
+    speed = np.sqrt(v_ns * v_ns + v_ew * v_ew)
+    heading = np.degrees(np.arctan2(v_ew, v_ns)) % 360.0
+    return speed, heading
+
+
+def vcprNL(lat):
+    """Number of longitude zones at latitude lat (vectorised cprNL)."""
+    nz = 60
+    a = 1 - np.cos(np.pi * 2 / nz)
+    b = np.cos(np.radians(np.abs(lat))) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nl = np.floor(2 * np.pi / np.arccos(1 - a / b))
+    return np.where(np.isfinite(nl), nl, 1).astype(int)
+
+
+def vcpr2position(cprlat0, cprlat1, cprlon0, cprlon1, t0, t1):
+    """Vectorised version of cpr2position. Returns arrays of latitude and
+       longitude, which are NaN when the even and odd frames are in
+       different latitude zones."""
+    cprlat_even = cprlat0 / 131072.0
+    cprlat_odd = cprlat1 / 131072.0
+    cprlon_even = cprlon0 / 131072.0
+    cprlon_odd = cprlon1 / 131072.0
+
+    j = np.floor(59 * cprlat_even - 60 * cprlat_odd + 0.5)
+    lat_even = (360.0 / 60) * (j % 60 + cprlat_even)
+    lat_odd = (360.0 / 59) * (j % 59 + cprlat_odd)
+    lat_even = np.where(lat_even >= 270, lat_even - 360, lat_even)
+    lat_odd = np.where(lat_odd >= 270, lat_odd - 360, lat_odd)
+
+    nl_even = vcprNL(lat_even)
+    nl_odd = vcprNL(lat_odd)
+
+    # Use the most recent frame
+    even = t0 > t1
+    lat = np.where(even, lat_even, lat_odd)
+    nl = np.where(even, nl_even, nl_odd)
+    ni = np.maximum(nl - np.where(even, 0, 1), 1)
+    m = np.floor(cprlon_even * (nl - 1) - cprlon_odd * nl + 0.5)
+    lon = (360.0 / ni) * (m % ni + np.where(even, cprlon_even, cprlon_odd))
+    lon = np.where(lon > 180, lon - 360, lon)
+
+    valid = nl_even == nl_odd
+    return np.where(valid, lat, np.nan), np.where(valid, lon, np.nan)
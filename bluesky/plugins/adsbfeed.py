@@ -1,6 +1,8 @@
 """ BlueSky ADS-B datafeed plugin. Reads the feed from a Mode-S Beast server,
     and visualizes traffic in BlueSky."""
 import time
+import threading
+import numpy as np
 from bluesky import stack, settings, traf
 from bluesky.tools.network import TcpSocket
 from bluesky.tools import aero
@@ -13,6 +15,10 @@ settings.set_variable_defaults(modeS_host='', modeS_port=0)
 # Global data
 reader = None
 
+# Decoded state that is stored per aircraft
+STATEKEYS = ('alt', 'cprlat0', 'cprlon0', 't0', 'cprlat1', 'cprlon1', 't1',
+             'speed', 'heading', 'ts')
+
 ### Initialization function of the adsbfeed plugin.
 def init_plugin():
     # Initialize Modesbeast reader
@@ -39,229 +45,145 @@ def init_plugin():
 
 
 class Modesbeast(TcpSocket):
+    """ Mode-S Beast client. Received data is buffered by the receiver
+        thread, and decoded in batches in the simulation thread. The state
+        of all received aircraft is stored in arrays, one element per ICAO
+        address, which are used to update the simulated traffic at once. """
     def __init__(self):
         super().__init__()
-        self.acpool         = {}
+        self.lock           = threading.Lock()
         self.buffer         = b''
         self.default_ac_mdl = "B738"
 
-    def processData(self, data):
-        self.buffer += data
-
-        if len(self.buffer) > 2048:
-            # process the buffer until the last divider <esc> 0x1a
-            # then, reset the buffer with the remainder
-
-            bfdata = self.buffer
-            n = (len(bfdata) - 1) - bfdata[::-1].index(0x1a)
-            data = bfdata[:n - 1]
-            self.buffer = self.buffer[n:]
+        # Aircraft state per ICAO address
+        self.addrmap  = dict()
+        self.callsign = np.array([], dtype=object)
+        self.state    = {key: np.array([]) for key in STATEKEYS}
 
-            messages = self.read_mode_s(data)
-
-            if not messages:
+    def processData(self, data):
+        # Called from the receiver thread: only store the data
+        with self.lock:
+            self.buffer += data
+
+    def read_buffer(self):
+        """ Decode all complete messages in the receive buffer. """
+        with self.lock:
+            data = self.buffer
+            if len(data) <= 2048:
                 return
-
-            for msg, ts in messages:
-                self.read_message(msg, ts)
-        return
-
-    def read_mode_s(self, data):
-        '''
-        <esc> "1" : 6 byte MLAT timestamp, 1 byte signal level,
-            2 byte Mode-AC
-        <esc> "2" : 6 byte MLAT timestamp, 1 byte signal level,
-            7 byte Mode-S short frame
-        <esc> "3" : 6 byte MLAT timestamp, 1 byte signal level,
-            14 byte Mode-S long frame
-        <esc> "4" : 6 byte MLAT timestamp, status data, DIP switch
-            configuration settings (not on Mode-S Beast classic)
-        <esc><esc>: true 0x1a
-        <esc> is 0x1a, and "1", "2" and "3" are 0x31, 0x32 and 0x33
-
-        timestamp:
-        wiki.modesbeast.com/Radarcape:Firmware_Versions#The_GPS_timestamp
-        '''
-
-        # split raw data into chunks
-        chunks    = []
-        separator = 0x1a
-        piece     = []
-        for d in data:
-            if d == separator:
-                # shortest msgs are 11 chars
-                if len(piece) > 10:
-                    chunks.append(piece)
-                piece = []
-            piece.append(d)
-
-        # extract messages
-        messages = []
-        for cnk in chunks:
-            msgtype = cnk[1]
-
-            # Mode-S Short Message, 7 byte
-            if msgtype == 0x32:
-                msg = ''.join('%02X' % i for i in cnk[9:16])
-
-            # Mode-S Short Message, 14 byte
-            elif msgtype == 0x33:
-                msg = ''.join('%02X' % i for i in cnk[9:23])
-
-            # Other message tupe
-            else:
-                continue
-
-            ts = time.time()
-
-            messages.append([msg, ts])
-        return messages
-
-    def read_message(self, msg, ts):
-        """
-        Process ADSB messages
-        """
-
-        if len(msg) < 28:
+            msgs, nbytes = decoder.beast_frames(data)
+            self.buffer = data[nbytes:]
+        self.read_messages(msgs, time.time())
+
+    def getslots(self, addrs):
+        """ Get the state array indices of ICAO addresses, and add new addresses. """
+        n = len(self.addrmap)
+        slots = np.array([self.addrmap.setdefault(a, len(self.addrmap)) for a in addrs.tolist()],
+                         dtype=int)
+        nnew = len(self.addrmap) - n
+        if nnew:
+            self.callsign = np.append(self.callsign, np.full(nnew, '', dtype=object))
+            for key, arr in self.state.items():
+                self.state[key] = np.append(arr, np.full(nnew, np.nan))
+        return slots
+
+    def read_messages(self, msgs, ts):
+        """ Process a batch of long Mode-S messages. """
+        # Only keep ADS-B messages (DF17) with a valid checksum
+        msgs = msgs[decoder.crc24(msgs) == 0]
+        df, icao, tc, me = decoder.df17_fields(msgs)
+        is17 = df == 17
+        if not is17.any():
             return
-
-        df = decoder.get_df(msg)
-
-        if df == 17:
-            addr = decoder.get_icao_addr(msg)
-            tc = decoder.get_tc(msg)
-
-            if tc >= 1 and tc <= 4:
-                # aircraft identification
-                callsign = decoder.get_callsign(msg)
-                self.update_callsign(addr, callsign)
-            if tc >= 9 and tc <= 18:
-                # airbone postion frame
-                alt = decoder.get_alt(msg)
-                oe = decoder.get_oe_flag(msg)  # odd or even frame
-                cprlat = decoder.get_cprlat(msg)
-                cprlon = decoder.get_cprlon(msg)
-                self.update_cprpos(addr, oe, ts, alt, cprlat, cprlon)
-            elif tc == 19:        # airbone velocity frame
-                sh = decoder.get_speed_heading(msg)
-                if len(sh) == 2:
-                    spd = sh[0]
-                    hdg = sh[1]
-                    self.update_spd_hdg(addr, spd, hdg)
-        return
-
-    def update_cprpos(self, addr, oe, ts, alt, cprlat, cprlon):
-        if addr in self.acpool:
-            ac = self.acpool[addr]
-        else:
-            ac = {}
-
-        ac['alt'] = alt
-        if oe == '1':       # odd frame cpr position
-            ac['cprlat1'] = cprlat
-            ac['cprlon1'] = cprlon
-            ac['t1'] = ts
-
-        if oe == '0':       # even frame cpr position
-            ac['cprlat0'] = cprlat
-            ac['cprlon0'] = cprlon
-            ac['t0'] = ts
-
-        ac['ts'] = time.time()
-
-        self.acpool[addr] = ac
-        return
-
-    def update_spd_hdg(self, addr, spd, hdg):
-        if addr in self.acpool:
-            ac = self.acpool[addr]
-        else:
-            ac = {}
-
-        ac['speed'] = spd
-        ac['heading'] = hdg
-        ac['ts'] = time.time()
-
-        self.acpool[addr] = ac
-        return
-
-    def update_callsign(self, addr, callsign):
-        if addr not in self.acpool:
-            self.acpool[addr] = {}
-
-        self.acpool[addr]['callsign'] = callsign
-        return
-
-    def update_all_ac_postition(self):
-        keys = ('cprlat0', 'cprlat1', 'cprlon0', 'cprlon1')
-        for addr, ac in list(self.acpool.items()):
-            # check if all needed keys are in dict
-            if set(keys).issubset(ac):
-                pos = decoder.cpr2position(
-                    ac['cprlat0'], ac['cprlat1'],
-                    ac['cprlon0'], ac['cprlon1'],
-                    ac['t0'], ac['t1']
-                )
-
-                # update positions of all aircrafts in the list
-                if pos:
-                    self.acpool[addr]['lat'] = pos[0]
-                    self.acpool[addr]['lon'] = pos[1]
-        return
-
-    def stack_all_commands(self):
-        """create and stack command"""
-        params = ('lat', 'lon', 'alt', 'speed', 'heading', 'callsign')
-        for i, d in list(self.acpool.items()):
-            # check if all needed keys are in dict
-            if set(params).issubset(d):
-                acid = d['callsign']
-                # check is aircraft is already beening displayed
-                if(traf.id2idx(acid) < 0):
-                    mdl = self.default_ac_mdl
-                    v = aero.tas2cas(d['speed'], d['alt'] * aero.ft)
-                    cmdstr = 'CRE %s, %s, %f, %f, %f, %d, %d' % \
-                        (acid, mdl, d['lat'], d['lon'],
-                            d['heading'], d['alt'], v)
-                    stack.stack(cmdstr)
-                else:
-                    cmdstr = 'MOVE %s, %f, %f, %d' % \
-                        (acid, d['lat'], d['lon'], d['alt'])
-                    stack.stack(cmdstr)
-
-                    cmdstr = 'HDG %s, %f' % (acid,  d['heading'])
-                    stack.stack(cmdstr)
-
-                    v_cas = aero.tas2cas(d['speed'], d['alt'] * aero.ft)
-                    cmdstr = 'SPD %s, %f' % (acid,  v_cas)
-                    stack.stack(cmdstr)
-        return
+        icao, tc, me = icao[is17], tc[is17], me[is17]
+        slots = self.getslots(icao)
+        state = self.state
+        state['ts'][slots] = ts
+
+        # aircraft identification
+        sel = (tc >= 1) & (tc <= 4)
+        self.callsign[slots[sel]] = decoder.me_callsign(me[sel])
+
+        # airborne position frame
+        sel = (tc >= 9) & (tc <= 18)
+        alt, oe, cprlat, cprlon = decoder.me_position(me[sel])
+        state['alt'][slots[sel]] = alt
+        for flag, suffix in ((0, '0'), (1, '1')):
+            isoe = oe == flag
+            state['cprlat' + suffix][slots[sel][isoe]] = cprlat[isoe]
+            state['cprlon' + suffix][slots[sel][isoe]] = cprlon[isoe]
+            state['t' + suffix][slots[sel][isoe]] = ts
+
+        # airborne velocity frame
+        sel = tc == 19
+        state['speed'][slots[sel]], state['heading'][slots[sel]] = decoder.me_velocity(me[sel])
 
     def remove_outdated_ac(self):
         """House keeping, remove old entries (offline > 100s)"""
-        for addr, ac in list(self.acpool.items()):
-            if 'ts' in ac:
-                # threshold, remove ac after 90 seconds of no-seen
-                if (int(time.time()) - ac['ts']) > 100:
-                    del self.acpool[addr]
-                    # remove from sim traffic
-                    if 'callsign' in ac:
-                        stack.stack('DEL %s' % ac['callsign'])
-        return
+        # threshold, remove ac after 100 seconds of no-seen
+        old = time.time() - self.state['ts'] > 100
+        if not old.any():
+            return
+
+        # remove from sim traffic
+        idx = np.array([traf.id2idx(acid) for acid in self.callsign[old] if acid])
+        idx = idx[idx >= 0] if len(idx) else idx
+        if len(idx):
+            traf.delete(idx)
+
+        keep = ~old
+        self.callsign = self.callsign[keep]
+        self.state = {key: arr[keep] for key, arr in self.state.items()}
+        addrs = np.array(list(self.addrmap.keys()))[keep]
+        self.addrmap = {a: i for i, a in enumerate(addrs.tolist())}
+
+    def update_traffic(self):
+        """ Create new aircraft, and update the state of existing aircraft. """
+        state = self.state
+        lat, lon = decoder.vcpr2position(state['cprlat0'], state['cprlat1'],
+                                         state['cprlon0'], state['cprlon1'],
+                                         state['t0'], state['t1'])
+        ready = (self.callsign != '') & np.isfinite(lat) & np.isfinite(state['alt']) & \
+            np.isfinite(state['speed']) & np.isfinite(state['heading'])
+        if not ready.any():
+            return
+
+        callsign = self.callsign[ready].tolist()
+        lat, lon = lat[ready], lon[ready]
+        alt = state['alt'][ready] * aero.ft
+        hdg = state['heading'][ready]
+        cas = aero.vtas2cas(state['speed'][ready] * aero.kts, alt)
+        idx = np.array([traf.id2idx(acid) for acid in callsign])
+
+        # Create aircraft that are not yet in the simulation
+        new = np.flatnonzero(idx < 0)
+        if len(new):
+            # Only create one aircraft per callsign
+            _, first = np.unique([callsign[i] for i in new], return_index=True)
+            new = new[first]
+            traf.cre([callsign[i] for i in new], self.default_ac_mdl, lat[new], lon[new],
+                     hdg[new], alt[new], cas[new])
+
+        # Update all existing aircraft at once
+        upd = idx >= 0
+        if upd.any():
+            idx = idx[upd]
+            traf.move(idx, lat[upd], lon[upd], alt[upd])
+            traf.ap.selhdgcmd(idx, hdg[upd])
+            traf.ap.selspdcmd(idx, cas[upd])
 
     def debug(self):
-        addlist = str.join(', ', self.acpool.keys())
-        print(addlist)
+        print(', '.join(f'{a:06X}' for a in self.addrmap))
         print("")
-        print("total count: %d" % len(self.acpool.keys()))
+        print("total count: %d" % len(self.addrmap))
         return
 
     def update(self):
         if self.isConnected():
             # self.debug()
+            self.read_buffer()
             self.remove_outdated_ac()
-            self.update_all_ac_postition()
-            self.stack_all_commands()
+            self.update_traffic()
 
     def toggle(self, flag=None):
         if flag is None:
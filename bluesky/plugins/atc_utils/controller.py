@@ -14,10 +14,12 @@ class Controller(object):
     """
     This class represents the controller agent that is responsible for the centralized control.
     """
-    def __init__(self):
+    def __init__(self, prioritized: bool = False):
         """
         Initialziation of the Controller Agent. This class contains all essentials to operate the DRL based plugin in
         terms of network-related processes.
+
+        :param prioritized: sample experiences for training proportional to their temporal difference error
         """
         # Config parameters
         self.epsilon = 1.0      # exploration parameter
@@ -25,12 +27,18 @@ class Controller(object):
         self.min_epsilon = 0.1
         self.epsilon_decay = 0.1
         self.epsilons = [self.epsilon]
-        self.replay_buffer = ReplayBuffer()
+        self.replay_buffer = ReplayBuffer(prioritized=prioritized)
         # self.encoding = {"HDG_L": 0, "HDG_R": 1, "DIR": 2, "LNAV": 3}
         self.encoding = {"HDG_L": 0, "HDG_R": 1, "LNAV": 2}
         self.num_actions = len(self.encoding)
+        # action names ordered by their encoding, to decode action indices with fancy indexing
+        self.actions = np.array(sorted(self.encoding, key=self.encoding.get))
+        self.rng = np.random.default_rng()
         self.model = self._create_model()
         self.target_model = self._create_model()
+        # compiled inference path, traced once for any batch size
+        self.predict = tf.function(lambda x: self.model(x, training=False),
+                                   input_signature=[tf.TensorSpec(shape=[None, 14], dtype=tf.float32)])
 
     def decode_actions(self, ohe_action: list[int]) -> (bool, str, str):
         """
@@ -142,9 +150,9 @@ class Controller(object):
         """
         Function that allows the plugin to load the replay buffer.
 
-        :return: batch of the replay buffer
+        :return: batch of the replay buffer, with the indices and importance sampling weights of its experiences
         """
-        return self.replay_buffer.sample_batch()
+        return self.replay_buffer.sample_prioritized()
 
     def act(self, state: State) -> (str, str):
         """
@@ -153,26 +161,45 @@ class Controller(object):
         :param state: current state of the two aircraft in conflict.
         :return: two strings containing the actions to be taken.
         """
-        # exploration
-        if random.random() < self.epsilon:
-            act1 = random.choice(list(self.encoding.keys()))
-            act2 = random.choice(list(self.encoding.keys()))
-            return act1, act2
+        return self.act_batch([state])[0]
+
+    def act_batch(self, states: list[State]) -> list[tuple[str, str]]:
+        """
+        Returns actions for a batch of states, e.g. all conflict pairs of one or several environments. The model is
+        evaluated in a single forward pass for all states that are not explored.
+
+        :param states: list of current states of aircraft pairs in conflict.
+        :return: list of tuples with two strings containing the actions to be taken.
+        """
+        n = len(states)
+        if n == 0:
+            return []
+
+        # exploration: random action indices for both aircraft
+        action_idx = self.rng.integers(0, self.num_actions, (n, 2))
+        exploit = np.flatnonzero(self.rng.random(n) >= self.epsilon)
 
-        state = np.asarray(state.get_state_as_list())
-        input_state = tf.convert_to_tensor(state[None, :])
-        # DEBUG print(input_state)
-        action_q = self.model(input_state)
-        model_output = action_q.numpy().tolist()[0]
-        # print("raw output = {}".format(model_output))
-        action = self.convert_to_binary(model_output)
-        # print(action)
-        success, act1, act2 = self.decode_actions(action)
+        if len(exploit) > 0:
+            state_batch = np.array([states[i].get_state_as_list() for i in exploit], dtype=np.float32)
+            model_output = self.predict(tf.convert_to_tensor(state_batch)).numpy()
+            action_idx[exploit] = self.greedy_actions(model_output)
 
-        if not success:
-            raise Exception("Model failed to produce legitimate output")
+        actions = self.actions[action_idx]
 
-        return act1, act2
+        return list(zip(actions[:, 0].tolist(), actions[:, 1].tolist()))
+
+    def greedy_actions(self, model_output: np.ndarray) -> np.ndarray:
+        """
+        This function selects the action with the highest Q-value for both aircraft for a batch of model outputs. Ties
+        are broken randomly, like in convert_to_binary.
+
+        :param model_output: model output for a batch of states (n x 2 * number of actions)
+        :return: action indices for both aircraft (n x 2)
+        """
+        q = model_output.reshape(-1, 2, self.num_actions)
+        highest = q == np.max(q, axis=2, keepdims=True)
+
+        return np.argmax(np.where(highest, self.rng.random(q.shape), -1.0), axis=2)
 
     def save_weights(self):
         """
@@ -188,6 +215,30 @@ class Controller(object):
         self.model.save_weights(path + "training_weights_mse_exploration.h5")
         return
 
+    def save_replay_buffer(self):
+        """
+        This function saves the replay buffer to an npz file, so that a training run can be resumed.
+        """
+
+        workdir = os.getcwd()
+        path = os.path.join(workdir, "results/replay_buffer/")
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self.replay_buffer.save(path + "replay_buffer.npz")
+        return
+
+    def load_replay_buffer(self):
+        """
+        This function loads the replay buffer from a file, if it is present.
+        """
+        file = os.path.join(os.getcwd(), "results/replay_buffer/replay_buffer.npz")
+
+        if os.path.isfile(file):
+            self.replay_buffer.load(file)
+        return
+
     def load_weights(self):
         """
         This function loads the model weights from a file. If the file is not present, it will initialize the model
@@ -225,27 +276,25 @@ class Controller(object):
         """
         Function responsible for training the network. WORK ON THIS!!!!!!
 
-        :param batch: a batch of experiences
+        :param batch: a batch of experiences with their indices and weights, as returned by load_experiences
         :return: loss of the network
         """
-        state_batch, action_batch, reward_batch, next_state_batch = batch
+        (state_batch, action_batch, reward_batch, next_state_batch, _), indices, weights = batch
         current_q = self.model(state_batch).numpy()
-        target_q = np.copy(current_q)
         next_q = self.target_model(next_state_batch).numpy()
         max_next_q = np.amax(next_q, axis=1)
 
-        for i in range(state_batch.shape[0]):
-            target_q_val = reward_batch[i]
+        # the Q-values of the actions taken by both aircraft are set to the discounted target
+        # TODO: alter this to fit needs (e.g. no future reward when the episode is done)
+        target_q_val = reward_batch + 0.95 * max_next_q
+        target_q = np.where(np.asarray(action_batch, dtype=bool), target_q_val[:, None], current_q)
 
-            # if not done_batch[i]:
-            # TODO: alter this to fit needs
-            target_q_val += 0.95 * max_next_q[i]
-
-            target_q[i][action_batch[i]] = target_q_val
-
-        training_history = self.model.fit(x=state_batch, y=target_q, verbose=0)
+        training_history = self.model.fit(x=state_batch, y=target_q, sample_weight=weights, verbose=0)
         loss = training_history.history['loss']
 
+        # the new priorities of the experiences are their largest temporal difference errors
+        self.replay_buffer.update_priorities(indices, np.max(np.abs(target_q - current_q), axis=1))
+
         # apply exploration decay
         self.epsilon = max(self.min_epsilon, self.epsilon - (self.max_epsilon - self.min_epsilon) * self.epsilon_decay)
         self.epsilons.append(self.epsilon)
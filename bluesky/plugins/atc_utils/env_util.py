@@ -0,0 +1,152 @@
+"""
+This file contains the functions that observe and act on a single simulated environment for the ATC agent.
+"""
+
+from bluesky import stack, traf, navdb
+
+from bluesky.plugins.atc_utils.state import State
+from bluesky.plugins.atc_utils import prox_util as pu
+
+
+HDG_CHANGE = 15.0               # HDG change instruction deviates 15 degrees from original
+
+
+def get_next_two_waypoints(idx: int) -> (str, str):
+    """
+    Function that returns the next two waypoints of an aircraft, or doubles the only waypoint if there is just one.
+
+    :param idx: index of the aircraft
+    :return:
+    """
+    if not traf.ap.route[idx].wpname:
+        # TODO: remove this temporary fix when up and running!
+        return "EH007", "EH007"
+    else:
+        cur = traf.ap.route[idx].wpname[0]
+
+    if len(traf.ap.route[idx].wpname) > 1:
+        nxt = traf.ap.route[idx].wpname[1]
+    else:
+        nxt = traf.ap.route[idx].wpname[0]
+
+    return cur, nxt
+
+
+def load_state_data(ac: str) -> (float, float, int, int, int, int, int):
+    """
+    This function gathers all data from one single aircraft that are required for a state definition.
+
+    :param ac: string containing aircraft id
+    :return: tuple of all data for one aircraft's state
+    """
+    idx = traf.idmap[ac]
+
+    lat = traf.lat[idx]
+    lon = traf.lon[idx]
+    alt = traf.alt[idx]
+    tas = traf.tas[idx]
+    hdg = traf.hdg[idx]
+
+    cur_id, nxt_id = get_next_two_waypoints(idx)
+    cur = navdb.wpidx[cur_id][0]
+    nxt = navdb.wpidx[nxt_id][0]
+
+    return lat, lon, alt, tas, hdg, cur, nxt
+
+
+def get_current_state(ac1: str, ac2: str) -> State:
+    """
+    This function returns all information required to build a state.
+
+    :param ac1: string of aircraft 1's ID
+    :param ac2: string of aircraft 2's ID
+    :param prev_state: State object of the previous state
+    :return: current state given the two aircraft
+    """
+
+    lat1, lon1, alt1, tas1, hdg1, cur1, nxt1 = load_state_data(ac1)
+    lat2, lon2, alt2, tas2, hdg2, cur2, nxt2 = load_state_data(ac2)
+
+    return State(lat1, lon1, alt1, tas1, hdg1, cur1, nxt1,
+                 lat2, lon2, alt2, tas2, hdg2, cur2, nxt2)
+
+
+def has_reached_goal(ac: str) -> bool:
+    """
+    This function determines when an aircraft has reached its goal position (the last waypoint in its route).
+
+    :param ac: aircraft in question
+    :return: boolean of reached goal status
+    """
+
+    # TODO: is this still necessary?
+
+    idx = traf.idmap[ac]
+
+    lat = traf.lat[idx]
+    lon = traf.lon[idx]
+    dest = traf.ap.dest[idx]
+
+    if dest == "":
+        # print(f"{ac} has no destination defined")
+        return False
+
+    # destination = "EH007"
+    wplat = navdb.wplat[navdb.wpidx[dest][0]]
+    wplon = navdb.wplon[navdb.wpidx[dest][0]]
+
+    if wplat == lat and wplon == lon:
+        return True
+    else:
+        return False
+
+
+def get_reward(ac1: str, ac2: str) -> int:
+    """
+    This function returns the reward obtained from the action that was taken.
+
+    :param ac1: first aircraft in the conflict
+    :param ac2: second aircraft in the conflict
+    :return: integer reward
+    """
+
+    # TODO: make more complex
+    if pu.is_loss_of_separation(ac1, ac2):
+        return -1
+    elif has_reached_goal(ac1) or has_reached_goal(ac2):
+        return 1
+    else:
+        return 0
+
+
+def engage_lnav(ac: str):
+    stack.stack(f"LNAV {ac} ON")
+    stack.stack(f"VNAV {ac} ON")
+    return
+
+
+# def direct_to_wpt(ac: str, wpt: str):
+#     stack.stack(f"LNAV {ac} ON")
+#     stack.stack(f"DIRECT {ac} {wpt}")
+#     stack.stack(f"VNAV {ac} ON")
+#     return
+
+
+def change_heading(ac: str, right: bool):
+    """
+    This function alters the heading of an aircraft by HDG_CHANGE degrees, keeping between 0 and 360 degrees.
+
+    :param ac: aircraft id string
+    :param right: boolean that is true when a right turn is required
+    """
+    if right:
+        hdg_change = HDG_CHANGE
+    else:
+        hdg_change = -1 * HDG_CHANGE
+
+    current_hdg = traf.hdg[traf.idmap[ac]]
+
+    hdg = (current_hdg + hdg_change) % 360
+
+    stack.stack(f"HDG {ac} {hdg}")
+    return
@@ -3,8 +3,11 @@ This file contains all functions used for anything regarding aircraft proximity.
 """
 
 from math import sqrt
+import numpy as np
 from bluesky import traf
 from bluesky.tools import geo
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas import ConflictDetection
 
 
 FT_NM_FACTOR = 0.000164578834   # ft * factor converts to nm
@@ -25,17 +28,17 @@ def ft_to_nm(alt: int) -> float:
 
 
 def get_lat(ac):
-    idx = traf.id.index(ac)
+    idx = traf.idmap[ac]
     return traf.lat[idx]
 
 
 def get_lon(ac):
-    idx = traf.id.index(ac)
+    idx = traf.idmap[ac]
     return traf.lon[idx]
 
 
 def get_alt(ac):
-    idx = traf.id.index(ac)
+    idx = traf.idmap[ac]
     return m_to_ft(traf.alt[idx])
 
 
@@ -47,7 +50,7 @@ def both_aircraft_exits(ac1: str, ac2: str) -> bool:
     :param ac2: string of id of ac2
     :return: bool indicating whether both exits
     """
-    if ac1 in traf.id and ac2 in traf.id:
+    if ac1 in traf.idmap and ac2 in traf.idmap:
         return True
     else:
         print("one or both aircraft despawned!")
@@ -140,25 +143,127 @@ def get_conflict_pairs(position_list: dict) -> list[tuple[str, str]]:
     :return: list of aircraft ID pairs (strings)
     """
 
-    conflict_list = []
-    conflict_dist = []
-    all_pairs = [(a, b) for idx, a in enumerate(list(position_list.keys())) for b in list(position_list.keys())[idx+1:]]
+    if not position_list:
+        return []
 
-    for a, b in all_pairs:
-        lat_a, lon_a, alt_a = position_list[a]  # alt in ft
-        lat_b, lon_b, alt_b = position_list[b]  # alt in ft
+    ids = list(position_list.keys())
+    lat, lon, alt = np.array(list(position_list.values()), dtype=float).T  # alt in ft
 
-        _, dist_h = geo.qdrdist(lat_a, lon_a, lat_b, lon_b)   # bearing, distance (nm)
-        dist_v = abs(alt_a - alt_b)
+    idx1, idx2 = candidate_pairs(lat, lon, alt)
+    pairs, _ = alert_pairs(ids, lat, lon, alt, idx1, idx2)
 
-        # distance checks out, bearing is weird
-        # print(f"Distance between {a} and {b} is {dist_h}nm horizontally and {dist_v}ft vertically.")
+    return pairs
 
-        if dist_h < SEP_REP_HOR and dist_v < SEP_REP_VER:
-            # print(f"{a} and {b} are within the notification range of each other")
-            conflict_list.append((str(a), str(b)))
-            conflict_dist.append(direct_distance(dist_h, dist_v))
 
-    sorted_conflicts = [x for _, x in sorted(zip(conflict_dist, conflict_list))]
+def get_alert_pairs() -> (list[tuple[str, str]], list[bool]):
+    """
+    This function returns all aircraft pairs within the notification area, sorted by their direct distance, together
+    with a flag per pair indicating whether a loss of separation has occurred.
+
+    When conflict detection is active with a protected zone that covers the notification area, only the conflict
+    pairs of the conflict detection are screened, as these contain every pair that is currently within the zone.
+
+    :return: list of aircraft ID pairs (strings), list of loss of separation booleans
+    """
+    if traf.ntraf < 2:
+        return [], []
+
+    lat = traf.lat
+    lon = traf.lon
+    alt = np.trunc(traf.alt * M_FT_FACTOR)  # ft, truncated like m_to_ft
+
+    if cd_covers_alert_area():
+        # The conflict pairs are only updated every asas_dt: skip pairs with aircraft deleted since then
+        idx = np.array([(traf.idmap.get(a, -1), traf.idmap.get(b, -1)) for a, b in traf.cd.confpairs],
+                       dtype=int).reshape(-1, 2)
+        idx = np.unique(np.sort(idx[np.all(idx >= 0, axis=1)], axis=1), axis=0)
+        idx1, idx2 = idx[:, 0], idx[:, 1]
+    else:
+        idx1, idx2 = candidate_pairs(lat, lon, alt)
+
+    return alert_pairs(traf.id, lat, lon, alt, idx1, idx2)
+
+
+def cd_covers_alert_area() -> bool:
+    """
+    This function checks whether the conflict pairs of the active conflict detection include all pairs that are within
+    the notification area. Every pair inside the protected zone is a conflict, so this is the case when the protected
+    zone of all aircraft is (with a small margin) larger than the notification area.
+
+    :return: boolean indicating whether the conflict detection outputs can be reused
+    """
+    cd = traf.cd
+    if ConflictDetection.selected() is ConflictDetection or len(cd.rpz) != traf.ntraf:
+        return False
+
+    return bool(np.all(cd.rpz >= 1.01 * SEP_REP_HOR * nm) and np.all(cd.hpz >= (SEP_REP_VER + 1) * ft)
+                and np.all(cd.dtlookahead > 0.0))
+
+
+def candidate_pairs(lat: np.ndarray, lon: np.ndarray, alt: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    This function returns the index arrays of all aircraft pairs that can be within the notification area. Aircraft are
+    sorted by latitude, so only pairs within the latitude band of the notification area need to be evaluated.
+
+    :param lat: aircraft latitudes
+    :param lon: aircraft longitudes
+    :param alt: aircraft altitudes (ft)
+    :return: index arrays (idx1, idx2) of the aircraft pairs, with idx1 < idx2
+    """
+    n = len(lat)
+    if n < 2:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    # latitude band of the notification area, with a margin for the WGS'84 earth radius
+    dlat = 1.02 * SEP_REP_HOR / 60.0
+
+    order = np.argsort(lat, kind='stable')
+    slat = lat[order]
+    end = np.searchsorted(slat, slat + dlat, side='right')
+    count = end - np.arange(n) - 1
+
+    # expand each sorted aircraft into pairs with the aircraft following it within the latitude band
+    first = np.repeat(np.arange(n), count)
+    second = first + 1 + np.arange(np.sum(count)) - np.repeat(np.cumsum(count) - count, count)
+    idx1 = np.minimum(order[first], order[second])
+    idx2 = np.maximum(order[first], order[second])
+
+    # coarse longitude and altitude filters, exact distances are only computed for the remaining pairs
+    dlon = np.abs((lon[idx2] - lon[idx1] + 180.0) % 360.0 - 180.0)
+    maxlat = np.minimum(np.maximum(np.abs(lat[idx1]), np.abs(lat[idx2])) + dlat, 90.0)
+    keep = (dlon * np.cos(np.radians(maxlat)) <= dlat) & (np.abs(alt[idx1] - alt[idx2]) < SEP_REP_VER)
+
+    return idx1[keep], idx2[keep]
+
+
+def alert_pairs(ids: list, lat: np.ndarray, lon: np.ndarray, alt: np.ndarray,
+                idx1: np.ndarray, idx2: np.ndarray) -> (list[tuple[str, str]], list[bool]):
+    """
+    This function selects the candidate pairs that are within the notification area, sorts them by their direct
+    distance and determines which of them have lost separation.
+
+    :param ids: aircraft ids
+    :param lat: aircraft latitudes
+    :param lon: aircraft longitudes
+    :param alt: aircraft altitudes (ft)
+    :param idx1: index array of the first aircraft of each candidate pair
+    :param idx2: index array of the second aircraft of each candidate pair
+    :return: sorted list of aircraft ID pairs (strings), list of loss of separation booleans
+    """
+    if len(idx1) == 0:
+        return [], []
+
+    _, dist_h = geo.qdrdist(lat[idx1], lon[idx1], lat[idx2], lon[idx2])   # bearing, distance (nm)
+    dist_v = np.abs(alt[idx1] - alt[idx2])  # distance (ft)
+
+    keep = np.flatnonzero((dist_h < SEP_REP_HOR) & (dist_v < SEP_REP_VER))
+    dist_h = dist_h[keep]
+    dist_v = dist_v[keep]
+
+    dist = np.sqrt(dist_h ** 2 + (dist_v * FT_NM_FACTOR) ** 2)
+    los = (dist_h <= SEP_MIN_HOR) & (dist_v <= SEP_MIN_VER)
+
+    pairs = [(str(ids[i]), str(ids[j])) for i, j in zip(idx1[keep], idx2[keep])]
+    ordered = sorted(zip(dist.tolist(), pairs, los.tolist()))
 
-    return sorted_conflicts
+    return [pair for _, pair, _ in ordered], [flag for _, _, flag in ordered]
@@ -1,17 +1,96 @@
-import random
 import numpy as np
-from collections import deque
 from bluesky.plugins.atc_utils.state import State
 
 
+class SumTree(object):
+    """
+    This class represents a binary sum tree over the priorities of the experiences, stored in a flat array. Leaf i is
+    stored at index i + capacity, and every parent holds the sum of its two children, with the total at index 1.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity *= 2
+
+        self.tree = np.zeros(2 * self.capacity)
+
+    def total(self) -> float:
+        return self.tree[1]
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray):
+        """
+        Sets the priorities of the given leaves and updates their parents, one tree level at a time.
+
+        :param indices: leaf indices
+        :param priorities: new priorities of the leaves
+        """
+        nodes = np.asarray(indices, dtype=np.int64) + self.capacity
+        if len(nodes) == 0:
+            return
+
+        self.tree[nodes] = priorities
+
+        nodes = np.unique(nodes // 2)
+        while nodes[0] > 0:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """
+        Finds the leaves in which the given cumulative priority values fall, descending the tree for all values at once.
+
+        :param values: cumulative priority values in [0, total)
+        :return: leaf indices
+        """
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=float)
+
+        while nodes[0] < self.capacity:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+
+        return nodes - self.capacity
+
+
 class ReplayBuffer(object):
     """
-    This class represents the buffer used for experience replay.
+    This class represents the buffer used for experience replay. Experiences are stored in preallocated arrays that
+    are used as a ring buffer: when the buffer is full, the oldest experiences are overwritten.
     """
-    def __init__(self):
-        self.experience_buffer = deque(maxlen=1000000)
+    def __init__(self, capacity: int = 1000000, state_size: int = 14, action_size: int = 6,
+                 prioritized: bool = False, alpha: float = 0.6):
+        """
+        Initialization of the replay buffer.
+
+        :param capacity: maximum number of stored experiences
+        :param state_size: length of a state
+        :param action_size: length of an encoded action
+        :param prioritized: sample experiences proportional to their priority instead of uniformly
+        :param alpha: priority exponent, only used for prioritized sampling
+        """
+        self.capacity = capacity
+        self.size = 0           # number of stored experiences
+        self.position = 0       # index where the next experience is stored
+
+        self.states = np.zeros((capacity, state_size))
+        self.actions = np.zeros((capacity, action_size), dtype=np.int8)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros((capacity, state_size))
+        self.dones = np.zeros(capacity, dtype=bool)
+
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+        self.rng = np.random.default_rng()
+
+    def __len__(self):
+        return self.size
 
-    def store_experience(self, state: State, action: list, reward: int, next_state: State):
+    def store_experience(self, state: State, action: list, reward: int, next_state: State, done: bool = False):
         """
         Function for storing the experiences.
 
@@ -19,30 +98,144 @@ class ReplayBuffer(object):
         :param action: action that was performed
         :param reward: reward obtained from performing the action
         :param next_state: next state that was reached from the performed action
+        :param done: boolean indicating whether the next state ended the episode
         """
+        self.store_experiences([state.get_state_as_list()], [action], [reward], [next_state.get_state_as_list()],
+                               [done])
+
+        return
+
+    def store_experiences(self, states, actions, rewards, next_states, dones=None):
+        """
+        Function for storing a batch of experiences at once.
+
+        :param states: array of states (n x state size)
+        :param actions: array of encoded actions (n x action size)
+        :param rewards: array of rewards
+        :param next_states: array of next states (n x state size)
+        :param dones: array of booleans indicating whether the next state ended the episode
+        """
+        n = len(rewards)
+        if n == 0:
+            return
+
+        # when more experiences are stored than fit in the buffer, only the newest are kept
+        start = max(0, n - self.capacity)
+        idx = (self.position + np.arange(start, n)) % self.capacity
+
+        self.states[idx] = np.asarray(states)[start:]
+        self.actions[idx] = np.asarray(actions)[start:]
+        self.rewards[idx] = np.asarray(rewards)[start:]
+        self.next_states[idx] = np.asarray(next_states)[start:]
+        self.dones[idx] = False if dones is None else np.asarray(dones)[start:]
 
-        self.experience_buffer.append((state.get_state_as_list(), action, reward, next_state.get_state_as_list()))
+        if self.prioritized:
+            # new experiences get the highest priority so far, so they are sampled at least once
+            self.tree.update(idx, self.max_priority)
+
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
 
         return
 
-    def sample_batch(self):
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """
+        Samples the indices of a batch of experiences, uniformly without replacement or proportional to priority.
+
+        :param batch_size: number of experiences to sample
+        :return: array of indices
+        """
+        if batch_size == 0:
+            return np.array([], dtype=np.int64)
+
+        if self.prioritized:
+            # stratified sampling: one sample from each of batch_size equal segments of the total priority
+            segment = self.tree.total() / batch_size
+            values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+            return np.minimum(self.tree.find(values), self.size - 1)
+
+        return self.rng.choice(self.size, batch_size, replace=False)
+
+    def sample_batch(self, batch_size: int = 128):
         """
         Randomly samples a batch of experiences for training.
 
-        :return: a list of experiences (state, action, reward, next state)
+        :param batch_size: maximum number of experiences in the batch
+        :return: a batch of experiences (state, action, reward, next state)
         """
-        batch_size = min(128, len(self.experience_buffer))
-        sampled_experience_batch = random.sample(self.experience_buffer, batch_size)
+        idx = self.sample_indices(min(batch_size, self.size))
 
-        state_batch = []
-        action_batch = []
-        reward_batch = []
-        next_state_batch = []
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx]
+
+    def sample_prioritized(self, batch_size: int = 128, beta: float = 0.4):
+        """
+        Samples a batch of experiences proportional to their priority, together with their indices and the importance
+        sampling weights that correct for the non-uniform sampling.
 
-        for experience in sampled_experience_batch:
-            state_batch.append(experience[0])
-            action_batch.append(experience[1])
-            reward_batch.append(experience[2])
-            next_state_batch.append(experience[3])
+        :param batch_size: maximum number of experiences in the batch
+        :param beta: importance sampling exponent
+        :return: batch of experiences (state, action, reward, next state, done), indices and weights
+        """
+        idx = self.sample_indices(min(batch_size, self.size))
+
+        if self.prioritized:
+            probabilities = self.tree.tree[idx + self.tree.capacity] / self.tree.total()
+            weights = (self.size * probabilities) ** -beta
+            weights /= np.max(weights)
+        else:
+            weights = np.ones(len(idx))
+
+        batch = self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+        return batch, idx, weights
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray, eps: float = 1e-6):
+        """
+        Updates the priorities of sampled experiences with their new temporal difference errors.
+
+        :param indices: indices of the experiences, as returned by sample_prioritized
+        :param td_errors: temporal difference errors of the experiences
+        :param eps: small constant so that every experience keeps a chance of being sampled
+        """
+        if self.prioritized and len(indices) > 0:
+            priorities = (np.abs(td_errors) + eps) ** self.alpha
+            self.max_priority = max(self.max_priority, np.max(priorities))
+            self.tree.update(indices, priorities)
 
-        return np.array(state_batch), np.array(action_batch), np.array(reward_batch), np.array(next_state_batch)
+        return
+
+    def save(self, file: str):
+        """
+        Saves the stored experiences (oldest first) to an npz file, so that training can be resumed later.
+
+        :param file: filename of the npz file
+        """
+        order = (self.position - self.size + np.arange(self.size)) % self.capacity
+
+        data = {"states": self.states[order], "actions": self.actions[order], "rewards": self.rewards[order],
+                "next_states": self.next_states[order], "dones": self.dones[order]}
+        if self.prioritized:
+            data["priorities"] = self.tree.tree[order + self.tree.capacity]
+
+        np.savez(file, **data)
+
+        return
+
+    def load(self, file: str):
+        """
+        Loads experiences from an npz file created with save, and appends them to the buffer.
+
+        :param file: filename of the npz file
+        """
+        with np.load(file) as data:
+            n = len(data["rewards"])
+            self.store_experiences(data["states"], data["actions"], data["rewards"], data["next_states"],
+                                   data["dones"])
+
+            if self.prioritized and "priorities" in data:
+                start = max(0, n - self.capacity)
+                idx = (self.position - (n - start) + np.arange(n - start)) % self.capacity
+                self.tree.update(idx, data["priorities"][start:])
+                self.max_priority = max(self.max_priority, np.max(data["priorities"], initial=0.0))
+
+        return
@@ -0,0 +1,249 @@
+"""
+This file contains a training harness that runs the ATC agent on several detached BlueSky simulations in parallel.
+
+Every environment runs in its own worker process, which steps the simulation and reports the states of its current
+conflict pairs together with the experiences of the previous update. The harness gathers these experiences in the
+replay buffer of a single controller, and evaluates the states of all environments in one batched forward pass.
+"""
+
+import time
+import multiprocessing as mp
+
+import bluesky as bs
+
+
+SCENARIO = "trainingEnv.scn"    # scenario that is loaded at the start of every episode
+UPDATE_INTERVAL = 5.0           # simulated time between two updates of the agent [s]
+TIME_LIMIT = 720                # number of updates per episode
+CONFLICT_LIMIT = 50             # episode ends when this number of conflicts is reached
+TRAIN_INTERVAL = 2              # train the network every n finished episodes
+TARGET_INTERVAL = 100           # update the target network every n finished episodes
+WORKER_TIMEOUT = 300.0          # maximum wall time to wait for a message of a worker [s]
+PRIORITIZED_REPLAY = True       # sample experiences for training proportional to their temporal difference error
+
+
+def run_env(conn, scenario: str = SCENARIO, update_interval: float = UPDATE_INTERVAL,
+            time_limit: int = TIME_LIMIT, conflict_limit: int = CONFLICT_LIMIT):
+    """
+    Main function of an environment worker process. It runs a detached simulation and exchanges states, actions and
+    experiences with the harness through the given connection.
+
+    Messages sent to the harness are tuples (kind, states, experiences, stats), with kind either "step" or "done".
+    The harness answers a "step" with a list of action pairs, and a "done" with either "episode" or "stop".
+
+    :param conn: connection to the harness
+    :param scenario: scenario file loaded at the start of every episode
+    :param update_interval: simulated time between two updates of the agent [s]
+    :param time_limit: number of updates per episode
+    :param conflict_limit: number of conflicts that ends an episode
+    """
+    bs.init(mode="sim", detached=True)
+
+    # these modules bind the simulation objects on import, so they can only be imported after initialisation
+    from bluesky import stack
+    from bluesky.plugins.atc_utils import prox_util as pu
+    from bluesky.plugins.atc_utils import env_util as eu
+
+    command = conn.recv()
+
+    while command == "episode":
+        stack.stack(f"IC {scenario}")
+        bs.sim.step()
+        bs.sim.op()
+
+        conflict_pairs = set()
+        los_pairs = set()
+        instructed = set()
+        previous_actions = []
+        stats = {"conflicts": 0, "LoS": 0, "reward": 0, "HDG_L": 0, "HDG_R": 0, "LNAV": 0}
+
+        for _ in range(time_limit):
+            # advance the simulation to the next update of the agent
+            tnext = bs.sim.simt + update_interval
+            while bs.sim.simt < tnext and bs.sim.state == bs.OP:
+                bs.sim.step()
+
+            if bs.sim.state != bs.OP or stats["conflicts"] >= conflict_limit:
+                break
+
+            # the reward is based on the current state, so can be taken directly from info of the simulator
+            experiences = []
+            for prev_state, action1, action2, ac1, ac2 in previous_actions:
+                if ac1 in bs.traf.idmap and ac2 in bs.traf.idmap:
+                    reward = eu.get_reward(ac1, ac2)
+                    stats["reward"] += reward
+                    experiences.append((prev_state, action1, action2, reward, eu.get_current_state(ac1, ac2)))
+
+            current_pairs, current_los = pu.get_alert_pairs()
+
+            current_conflicts = {frozenset(pair) for pair in current_pairs}
+            current_los_pairs = {frozenset(pair) for pair, los in zip(current_pairs, current_los) if los}
+            stats["conflicts"] += len(current_conflicts - conflict_pairs)
+            stats["LoS"] += len(current_los_pairs - los_pairs)
+            conflict_pairs = current_conflicts
+            los_pairs = current_los_pairs
+
+            # aircraft that received a heading change resume their own navigation when out of conflict
+            for ac in instructed:
+                if ac in bs.traf.idmap and not any(ac in pair for pair in current_conflicts):
+                    eu.engage_lnav(ac)
+            instructed = set()
+
+            states = [eu.get_current_state(ac1, ac2) for ac1, ac2 in current_pairs]
+            conn.send(("step", states, experiences, None))
+            actions = conn.recv()
+
+            previous_actions = []
+            for state, (ac1, ac2), (action1, action2) in zip(states, current_pairs, actions):
+                for ac, action in ((ac1, action1), (ac2, action2)):
+                    stats[action] += 1
+                    if action == "LNAV":
+                        eu.engage_lnav(ac)
+                    else:
+                        eu.change_heading(ac, action == "HDG_R")
+                        instructed.add(ac)
+
+                previous_actions.append((state, action1, action2, ac1, ac2))
+
+        conn.send(("done", [], [], stats))
+        command = conn.recv()
+
+    conn.close()
+
+
+class TrainingHarness(object):
+    """
+    This class runs the controller agent on several simulations in parallel, one per worker process.
+    """
+    def __init__(self, nenvs: int = None, scenario: str = SCENARIO, controller=None, resume: bool = False):
+        """
+        Initialization of the harness. The worker processes are started when training is run.
+
+        :param nenvs: number of parallel environments, defaults to the number of cores
+        :param scenario: scenario file loaded at the start of every episode
+        :param controller: controller agent to train, a new one is created when not given
+        :param resume: continue with the replay buffer saved by an earlier training run
+        """
+        if controller is None:
+            from bluesky.plugins.atc_utils.controller import Controller
+            controller = Controller(prioritized=PRIORITIZED_REPLAY)
+        if resume:
+            controller.load_replay_buffer()
+
+        self.nenvs = nenvs or mp.cpu_count()
+        self.scenario = scenario
+        self.controller = controller
+        self.episode_stats = []
+        self.losses = []
+
+    def run(self, episodes: int) -> list[dict]:
+        """
+        Train the controller for the given number of episodes, divided over all environments.
+
+        :param episodes: total number of episodes
+        :return: list of statistics for each finished episode
+        """
+        # spawn fresh interpreters, the simulation objects are process-wide singletons
+        ctx = mp.get_context("spawn")
+        conns = []
+        workers = []
+
+        for _ in range(min(self.nenvs, episodes)):
+            conn, child_conn = ctx.Pipe()
+            worker = ctx.Process(target=run_env, args=(child_conn, self.scenario), daemon=True)
+            worker.start()
+            # only the worker keeps its end open, so that a crashed worker closes the pipe
+            child_conn.close()
+            conns.append(conn)
+            workers.append(worker)
+
+        started = 0
+        for conn in conns:
+            conn.send("episode")
+            started += 1
+
+        start = time.time()
+        active = list(conns)
+
+        try:
+            while active:
+                stepping = []
+                states = []
+
+                for conn in list(active):
+                    kind, env_states, experiences, stats = self.receive(conn, workers[conns.index(conn)])
+
+                    for state, action1, action2, reward, next_state in experiences:
+                        self.controller.store_experiences(state, action1, action2, reward, next_state)
+
+                    if kind == "done":
+                        stats["duration"] = round(time.time() - start, 2)
+                        self.finish_episode(stats)
+
+                        if started < episodes:
+                            conn.send("episode")
+                            started += 1
+                        else:
+                            conn.send("stop")
+                            active.remove(conn)
+                    else:
+                        stepping.append((conn, len(env_states)))
+                        states.extend(env_states)
+
+                # evaluate the conflict pairs of all environments at once
+                actions = self.controller.act_batch(states) if states else []
+
+                offset = 0
+                for conn, nstates in stepping:
+                    conn.send(actions[offset:offset + nstates])
+                    offset += nstates
+        finally:
+            for worker in workers:
+                worker.join(timeout=10.0)
+                if worker.is_alive():
+                    worker.terminate()
+
+        return self.episode_stats
+
+    @staticmethod
+    def receive(conn, worker):
+        """
+        Receive the next message of an environment worker. Raises an error when the worker stopped, or didn't send a
+        message within the timeout, instead of waiting forever.
+
+        :param conn: connection to the worker
+        :param worker: worker process
+        :return: message of the worker
+        """
+        if not conn.poll(WORKER_TIMEOUT):
+            raise RuntimeError(f"Environment worker {worker.name} did not respond within {WORKER_TIMEOUT} s")
+        try:
+            return conn.recv()
+        except EOFError:
+            worker.join(timeout=1.0)
+            raise RuntimeError(f"Environment worker {worker.name} stopped (exit code {worker.exitcode})") from None
+
+    def finish_episode(self, stats: dict):
+        """
+        Store the statistics of a finished episode, and train the network when enough episodes have passed.
+
+        :param stats: statistics of the finished episode
+        """
+        self.episode_stats.append(stats)
+        nepisodes = len(self.episode_stats)
+
+        if nepisodes % TRAIN_INTERVAL == 0 and len(self.controller.replay_buffer) > 0:
+            loss = self.controller.train(self.controller.load_experiences())
+            self.losses.append(loss[0])
+            self.controller.save_weights()
+            self.controller.save_replay_buffer()
+
+        if nepisodes % TARGET_INTERVAL == 0:
+            self.controller.update_target_model()
+
+        print(f"Episode {nepisodes} finished: {stats}")
+
+
+if __name__ == "__main__":
+    harness = TrainingHarness()
+    harness.run(episodes=2000)
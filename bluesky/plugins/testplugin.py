@@ -10,12 +10,11 @@ from bluesky import stack, traf, navdb  #, settings, sim, scr, tools
 from bluesky.tools.aero import ft
 from bluesky.tools import geo, areafilter
 
-from bluesky.plugins.atc_utils.state import State
 from bluesky.plugins.atc_utils.controller import Controller
 from bluesky.plugins.atc_utils import prox_util as pu
+from bluesky.plugins.atc_utils.env_util import get_current_state, get_reward, engage_lnav, change_heading
 
 
-HDG_CHANGE = 15.0               # HDG change instruction deviates 15 degrees from original
 TOTAL_REWARD = 0                # storage for total obtained reward this episode
 
 EPISODE_COUNTER = 0             # counter to keep track of how many episodes have passed
@@ -98,149 +97,6 @@ def init_plugin():
 ### this by anything, so long as you communicate this in init_plugin
 
 
-def get_next_two_waypoints(idx: int) -> (str, str):
-    """
-    Function that returns the next two waypoints of an aircraft, or doubles the only waypoint if there is just one.
-
-    :param idx: index of the aircraft
-    :return:
-    """
-    if not traf.ap.route[idx].wpname:
-        # TODO: remove this temporary fix when up and running!
-        return "EH007", "EH007"
-    else:
-        cur = traf.ap.route[idx].wpname[0]
-
-    if len(traf.ap.route[idx].wpname) > 1:
-        nxt = traf.ap.route[idx].wpname[1]
-    else:
-        nxt = traf.ap.route[idx].wpname[0]
-
-    return cur, nxt
-
-
-def load_state_data(ac: str) -> (float, float, int, int, int, int, int):
-    """
-    This function gathers all data from one single aircraft that are required for a state definition.
-
-    :param ac: string containing aircraft id
-    :return: tuple of all data for one aircraft's state
-    """
-    idx = traf.id.index(ac)
-
-    lat = traf.lat[idx]
-    lon = traf.lon[idx]
-    alt = traf.alt[idx]
-    tas = traf.tas[idx]
-    hdg = traf.hdg[idx]
-
-    cur_id, nxt_id = get_next_two_waypoints(idx)
-    cur = navdb.wpid.index(cur_id)
-    nxt = navdb.wpid.index(nxt_id)
-
-    return lat, lon, alt, tas, hdg, cur, nxt
-
-
-def get_current_state(ac1: str, ac2: str) -> State:
-    """
-    This function returns all information required to build a state.
-
-    :param ac1: string of aircraft 1's ID
-    :param ac2: string of aircraft 2's ID
-    :param prev_state: State object of the previous state
-    :return: current state given the two aircraft
-    """
-
-    lat1, lon1, alt1, tas1, hdg1, cur1, nxt1 = load_state_data(ac1)
-    lat2, lon2, alt2, tas2, hdg2, cur2, nxt2 = load_state_data(ac2)
-
-    return State(lat1, lon1, alt1, tas1, hdg1, cur1, nxt1,
-                 lat2, lon2, alt2, tas2, hdg2, cur2, nxt2)
-
-
-def has_reached_goal(ac: str) -> bool:
-    """
-    This function determines when an aircraft has reached its goal position (the last waypoint in its route).
-
-    :param ac: aircraft in question
-    :return: boolean of reached goal status
-    """
-
-    # TODO: is this still necessary?
-
-    idx = traf.id.index(ac)
-
-    lat = traf.lat[idx]
-    lon = traf.lon[idx]
-    dest = traf.ap.dest[idx]
-
-    if dest == "":
-        # print(f"{ac} has no destination defined")
-        return False
-
-    # destination = "EH007"
-    wplat = navdb.wplat[navdb.wpid.index(dest)]
-    wplon = navdb.wplon[navdb.wpid.index(dest)]
-
-    if wplat == lat and wplon == lon:
-        return True
-    else:
-        return False
-
-
-def get_reward(ac1: str, ac2: str) -> int:
-    """
-    This function returns the reward obtained from the action that was taken.
-
-    :param ac1: first aircraft in the conflict
-    :param ac2: second aircraft in the conflict
-    :return: integer reward
-    """
-
-    global N_LoS
-
-    # TODO: make more complex
-    if pu.is_loss_of_separation(ac1, ac2):
-        return -1
-    elif has_reached_goal(ac1) or has_reached_goal(ac2):
-        return 1
-    else:
-        return 0
-
-
-def engage_lnav(ac: str):
-    stack.stack(f"LNAV {ac} ON")
-    stack.stack(f"VNAV {ac} ON")
-    return
-
-
-# def direct_to_wpt(ac: str, wpt: str):
-#     stack.stack(f"LNAV {ac} ON")
-#     stack.stack(f"DIRECT {ac} {wpt}")
-#     stack.stack(f"VNAV {ac} ON")
-#     return
-
-
-def change_heading(ac: str, right: bool):
-    """
-    This function alters the heading of an aircraft by HDG_CHANGE degrees, keeping between 0 and 360 degrees.
-
-    :param ac: aircraft id string
-    :param right: boolean that is true when a right turn is required
-    """
-    if right:
-        hdg_change = HDG_CHANGE
-    else:
-        hdg_change = -1 * HDG_CHANGE
-
-    current_hdg = traf.hdg[traf.id.index(ac)]
-
-    hdg = (current_hdg + hdg_change) % 360
-
-    stack.stack(f"HDG {ac} {hdg}")
-    return
-
-
 def handle_instruction(ac: str, action: str, wpt: str = None):
     """
     This function checks what instruction was given and calls the appropriate functions to handle these instructions.
@@ -280,7 +136,7 @@ def resume_navigation(collision_pairs):
     global INSTRUCTED_AIRCRAFT
 
     for ac in INSTRUCTED_AIRCRAFT:
-        if not [pair for pair in collision_pairs if ac in pair] and ac in traf.id:
+        if not [pair for pair in collision_pairs if ac in pair] and ac in traf.idmap:
             # print("{} is resuming own navigation!".format(ac))
             engage_lnav(ac)
 
@@ -369,7 +225,7 @@ def update():
             prev_state, action1, action2, ac1, ac2 = PREVIOUS_ACTIONS.pop()
 
             # DONE: what if ac despawned? --> currently we remove this case
-            if ac1 in traf.id and ac2 in traf.id:
+            if ac1 in traf.idmap and ac2 in traf.idmap:
                 current_state = get_current_state(ac1, ac2)
 
                 # the reward is based on the current state, so can be taken directly from info of the simulator
@@ -378,38 +234,32 @@ def update():
 
                 CONTROLLER.store_experiences(prev_state, action1, action2, reward, current_state)
 
-    positions = {}
-
-    # gather aircraft positions
-    for acid, lat, lon, alt_m in zip(traf.id, traf.lat, traf.lon, traf.alt):
-        alt = pu.m_to_ft(alt_m)
-        positions[acid] = (lat, lon, alt)
-
     # there is a possibility of not having any aircraft
-    if not positions:
+    if not traf.ntraf:
         return
 
-    current_conflict_pairs = pu.get_conflict_pairs(positions)     # list of tuples
+    # sorted pairs within notification range, together with their loss of separation flags
+    current_conflict_pairs, current_los = pu.get_alert_pairs()
+    current_los_pairs = {pair for pair, los in zip(current_conflict_pairs, current_los) if los}
+    current_conflict_set = set(current_conflict_pairs)
 
     # remove old conflict pairs that are no longer in conflict
-    for (ac1, ac2) in CONFLICT_PAIRS:
-        if (ac1, ac2) not in current_conflict_pairs and (ac2, ac1) not in current_conflict_pairs:
-            CONFLICT_PAIRS.remove((ac1, ac2))
+    CONFLICT_PAIRS[:] = [(ac1, ac2) for (ac1, ac2) in CONFLICT_PAIRS
+                         if (ac1, ac2) in current_conflict_set or (ac2, ac1) in current_conflict_set]
 
     # remove old LoS pairs that are no longer in LoS
-    for (ac1, ac2) in LoS_PAIRS:
-        if not pu.is_loss_of_separation(ac1, ac2):
-            LoS_PAIRS.remove((ac1, ac2))
+    LoS_PAIRS[:] = [(ac1, ac2) for (ac1, ac2) in LoS_PAIRS
+                    if (ac1, ac2) in current_los_pairs or (ac2, ac1) in current_los_pairs]
 
     # add new collision pairs to conflict pairs and new LoS pairs to stored pairs
-    for (ac1, ac2) in current_conflict_pairs:
+    for (ac1, ac2), los in zip(current_conflict_pairs, current_los):
         if (ac1, ac2) not in CONFLICT_PAIRS and (ac2, ac1) not in CONFLICT_PAIRS:
             CONFLICT_PAIRS.append((ac1, ac2))
             N_CONFLICTS += 1
-        if pu.is_loss_of_separation(ac1, ac2) and (ac1, ac2) not in LoS_PAIRS and (ac2, ac1) not in LoS_PAIRS:
+        if los and (ac1, ac2) not in LoS_PAIRS and (ac2, ac1) not in LoS_PAIRS:
             LoS_PAIRS.append((ac1, ac2))
             N_LoS += 1
-            
+
     # print("This timestep, there are {} conflicts and {} losses of separation".format(len(CONFLICT_PAIRS), len(LoS_PAIRS)))
 
     # TODO: is this correct
@@ -419,12 +269,12 @@ def update():
     if not current_conflict_pairs:
         return
 
-    # give instructions to the aircraft and save the state, actions and corresponding aircraft id's
-    for ac1, ac2 in current_conflict_pairs:
-        current_state = get_current_state(ac1, ac2)
-
-        action1, action2 = CONTROLLER.act(current_state)
+    # determine the actions for all conflict pairs at once
+    current_states = [get_current_state(ac1, ac2) for ac1, ac2 in current_conflict_pairs]
+    actions = CONTROLLER.act_batch(current_states)
 
+    # give instructions to the aircraft and save the state, actions and corresponding aircraft id's
+    for (ac1, ac2), current_state, (action1, action2) in zip(current_conflict_pairs, current_states, actions):
         # waypoint in state is the index of its id in the navdb
         handle_instruction(ac1, action1, navdb.wpid[current_state.get_next_waypoint(1)])
         handle_instruction(ac2, action2, navdb.wpid[current_state.get_next_waypoint(2)])
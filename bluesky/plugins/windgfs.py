@@ -189,17 +189,8 @@ class WindGFS(WindSim):
         # add new wind field
         data = self.extract_wind(grb, self.lat0, self.lon0, self.lat1, self.lon1).T
 
-        data = data[np.lexsort((data[:, 2], data[:, 1], data[:, 0]))] # Sort by lat, lon, alt
-        reshapefactor = int((1 + max(self.lat0, self.lat1) - min(self.lat0, self.lat1)) * \
-                            (1 + max(self.lon0, self.lon1) - min(self.lon0, self.lon1)))
-
-        lat     = np.reshape(data[:,0], (reshapefactor, -1)).T[0,:]
-        lon     = np.reshape(data[:,1], (reshapefactor, -1)).T[0,:]
-        veast   = np.reshape(data[:,3], (reshapefactor, -1)).T
-        vnorth  = np.reshape(data[:,4], (reshapefactor, -1)).T
-        windalt = np.reshape(data[:,2], (reshapefactor, -1)).T[:,0]
-
-        self.addpointvne(lat, lon, vnorth, veast, windalt)        
+        # Grid of wind vectors: columns lat, lon, alt, veast, vnorth
+        self.addgridpoints(data[:, 0], data[:, 1], data[:, 2], data[:, 4], data[:, 3])
 
         return True, "Wind field updated in area [%d, %d], [%d, %d]. " \
             % (self.lat0, self.lat1, self.lon0, self.lon1) \
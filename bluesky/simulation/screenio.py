@@ -4,10 +4,97 @@ import numpy as np
 
 # Local imports
 import bluesky as bs
-from bluesky import stack
+from bluesky import settings, stack
 from bluesky.tools import areafilter, aero
 from bluesky.core.walltime import Timer
 
+
+# Register settings defaults
+# acdata_legacy: Also send the full legacy ACDATA stream (for clients that
+#               don't subscribe to ACDATA2)
+settings.set_variable_defaults(acdata_legacy=False, acdata_keyframe=25)
+
+# Per-aircraft data that can be sent in the ACDATA streams
+ACFIELDS = {
+    'lat': lambda: bs.traf.lat,
+    'lon': lambda: bs.traf.lon,
+    'alt': lambda: bs.traf.alt,
+    'tas': lambda: bs.traf.tas,
+    'cas': lambda: bs.traf.cas,
+    'gs': lambda: bs.traf.gs,
+    'ingroup': lambda: bs.traf.groups.ingroup,
+    'inconf': lambda: bs.traf.cd.inconf,
+    'tcpamax': lambda: bs.traf.cd.tcpamax,
+    'rpz': lambda: bs.traf.cd.rpz,
+    'trk': lambda: bs.traf.trk,
+    'vs': lambda: bs.traf.vs,
+    'vmin': lambda: bs.traf.perf.vmin,
+    'vmax': lambda: bs.traf.perf.vmax,
+    # ASAS resolutions for visualization
+    'asastas': lambda: bs.traf.cr.tas,
+    'asastrk': lambda: bs.traf.cr.trk
+}
+
+
+def acscalars():
+    ''' Return the non-per-aircraft data of the ACDATA streams. '''
+    return dict(simt=bs.sim.simt,
+                nconf_cur=len(bs.traf.cd.confpairs_unique),
+                nconf_tot=len(bs.traf.cd.confpairs_all),
+                nlos_cur=len(bs.traf.cd.lospairs_unique),
+                nlos_tot=len(bs.traf.cd.lospairs_all),
+                # Transition level as defined in traf
+                translvl=bs.traf.translvl,
+                # Send casmachthr for route visualization
+                casmachthr=aero.casmach_thr)
+
+
+class ACDataSubscription:
+    ''' Subscription of a client to the ACDATA2 stream.
+
+        ACDATA2 frames contain only the requested fields, with floating-point
+        arrays quantized to float32. Keyframes contain all aircraft, and
+        their callsigns, so that a client that missed a frame is in sync
+        again at the next keyframe. When viewport is True, frames in between
+        keyframes are delta frames that only contain the aircraft within the
+        client's view, with their indices in 'idx'. A keyframe is sent at
+        least every 'keyframe' frames, and whenever the set of aircraft
+        changes.
+    '''
+    def __init__(self, fields=None, viewport=False, keyframe=None):
+        self.fields = [f for f in (fields or ACFIELDS) if f in ACFIELDS]
+        self.viewport = viewport
+        self.keyframe = keyframe or settings.acdata_keyframe
+        self.nframe = 0
+        self.ids = None
+
+    def frame(self, bounds=None):
+        ''' Return the next frame for this subscription, with bounds the
+            (lat0, lat1, lon0, lon1) view of the client for delta frames. '''
+        data = acscalars()
+        if self.ids != bs.traf.id:
+            self.ids = list(bs.traf.id)
+            self.nframe = 0
+        data['key'] = not self.viewport or self.nframe % self.keyframe == 0
+        if data['key']:
+            data['id'] = self.ids
+        self.nframe += 1
+
+        idx = None
+        if not data['key']:
+            lat0, lat1, lon0, lon1 = bounds
+            idx = data['idx'] = np.flatnonzero(
+                (bs.traf.lat >= lat0) & (bs.traf.lat <= lat1) &
+                (bs.traf.lon >= lon0) & (bs.traf.lon <= lon1)).astype(np.int32)
+
+        for name in self.fields:
+            value = np.asarray(ACFIELDS[name]())
+            if idx is not None and value.ndim:
+                value = value[idx]
+            data[name] = value.astype(np.float32) if value.dtype == np.float64 else value
+        return data
+
+
 class ScreenIO:
     """Class within sim task which sends/receives data to/from GUI task"""
 
@@ -39,6 +126,9 @@ class ScreenIO:
         self.custacclr = dict()
         self.custgrclr = dict()
 
+        # ACDATA2 subscriptions per client
+        self.acdata_subs = dict()
+
         # Timing bookkeeping counters
         self.prevtime    = 0.0
         self.samplecount = 0
@@ -74,6 +164,10 @@ class ScreenIO:
         self.def_pan = (0.0, 0.0)
         self.def_zoom = 1.0
 
+        # Make sure subscribed clients get a new list of aircraft
+        for sub in self.acdata_subs.values():
+            sub.ids = None
+
         # Communicate reset to gui
         bs.net.send_event(b'RESET', b'ALL', target=[b'*'])
 
@@ -86,9 +180,9 @@ class ScreenIO:
     def getviewctr(self):
         return self.client_pan.get(stack.sender()) or self.def_pan
 
-    def getviewbounds(self):
+    def getviewbounds(self, sender=None):
         # Get appropriate lat/lon/zoom/aspect ratio
-        sender   = stack.sender()
+        sender   = sender or stack.sender()
         lat, lon = self.client_pan.get(sender) or self.def_pan
         zoom     = self.client_zoom.get(sender) or self.def_zoom
         ar       = self.client_ar.get(sender) or 1.0
@@ -119,7 +213,7 @@ class ScreenIO:
             groupmask = bs.traf.groups.groups[name]
             data['groupid'] = groupmask
             self.custgrclr[groupmask] = (r, g, b)
-        elif name in bs.traf.id:
+        elif name in bs.traf.idmap:
             data['acid'] = name
             self.custacclr[name] = (r, g, b)
         elif areafilter.hasArea(name):
@@ -216,6 +310,16 @@ class ScreenIO:
             self.client_ar[sender_rte[-1]]   = eventdata['ar']
             return True
 
+        if eventname == b'ACDATASUB':
+            # Subscribe to ACDATA2 with dict(fields, viewport, keyframe),
+            # or unsubscribe with None. The server sends the latter on behalf
+            # of clients that leave.
+            if eventdata is None:
+                self.acdata_subs.pop(sender_rte[-1], None)
+            else:
+                self.acdata_subs[sender_rte[-1]] = ACDataSubscription(**eventdata)
+            return True
+
         return False
 
     # =========================================================================
@@ -232,51 +336,25 @@ class ScreenIO:
 
     def send_trails(self):
         # Trails, send only new line segments to be added
-        if bs.traf.trails.active and len(bs.traf.trails.newlat0) > 0:
+        if bs.traf.trails.active and bs.traf.trails.nseg > bs.traf.trails.isent:
+            lat0, lon0, lat1, lon1 = bs.traf.trails.getnew()
             data = dict(swtrails=bs.traf.trails.active,
-                        traillat0=bs.traf.trails.newlat0,
-                        traillon0=bs.traf.trails.newlon0,
-                        traillat1=bs.traf.trails.newlat1,
-                        traillon1=bs.traf.trails.newlon1)#,
-                        # traillastlat=bs.traf.trails.lastlat,
-                        # traillastlon=bs.traf.trails.lastlon)
-            bs.traf.trails.clearnew()
+                        traillat0=lat0,
+                        traillon0=lon0,
+                        traillat1=lat1,
+                        traillon1=lon1)
             bs.net.send_stream(b'TRAILS', data)
 
     def send_aircraft_data(self):
-        data = dict()
-        data['simt']       = bs.sim.simt
-        data['id']         = bs.traf.id
-        data['lat']        = bs.traf.lat
-        data['lon']        = bs.traf.lon
-        data['alt']        = bs.traf.alt
-        data['tas']        = bs.traf.tas
-        data['cas']        = bs.traf.cas
-        data['gs']         = bs.traf.gs
-        data['ingroup']    = bs.traf.groups.ingroup
-        data['inconf'] = bs.traf.cd.inconf
-        data['tcpamax'] = bs.traf.cd.tcpamax
-        data['rpz'] = bs.traf.cd.rpz
-        data['nconf_cur'] = len(bs.traf.cd.confpairs_unique)
-        data['nconf_tot'] = len(bs.traf.cd.confpairs_all)
-        data['nlos_cur'] = len(bs.traf.cd.lospairs_unique)
-        data['nlos_tot'] = len(bs.traf.cd.lospairs_all)
-        data['trk']        = bs.traf.trk
-        data['vs']         = bs.traf.vs
-        data['vmin']       = bs.traf.perf.vmin
-        data['vmax']       = bs.traf.perf.vmax
-
-        # Transition level as defined in traf
-        data['translvl']   = bs.traf.translvl
-
-        # Send casmachthr for route visualization
-        data['casmachthr']    = aero.casmach_thr
-
-        # ASAS resolutions for visualization. Only send when evaluated
-        data['asastas']  = bs.traf.cr.tas
-        data['asastrk']  = bs.traf.cr.trk
-
-        bs.net.send_stream(b'ACDATA', data)
+        if settings.acdata_legacy:
+            data = acscalars()
+            data['id'] = bs.traf.id
+            data.update((name, get()) for name, get in ACFIELDS.items())
+            bs.net.send_stream(b'ACDATA', data)
+
+        for client, sub in self.acdata_subs.items():
+            bounds = self.getviewbounds(client) if sub.viewport else None
+            bs.net.send_stream(b'ACDATA2' + client, sub.frame(bounds))
 
     def send_route_data(self):
         ''' Send route data to client(s) '''
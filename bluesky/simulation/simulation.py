@@ -1,6 +1,7 @@
 ''' BlueSky simulation control object. '''
 import time
 import datetime
+from pathlib import Path
 import numpy as np
 from random import seed
 
@@ -9,7 +10,7 @@ import bluesky as bs
 import bluesky.core as core
 from bluesky.core import plugin, simtime
 from bluesky.stack import simstack, recorder
-from bluesky.tools import datalog, areafilter, plotter
+from bluesky.tools import datalog, areafilter, plotter, profiler
 
 # Minimum sleep interval
 MINSLEEP = 1e-3
@@ -52,6 +53,10 @@ class Simulation:
         # Keep track of known clients
         self.clients = set()
 
+        # Name and wall-clock start time of the running batch scenario
+        self.batchscen = None
+        self.batchstart = 0.0
+
     def step(self, dt_increment=0):
         ''' Perform one simulation timestep.
         
@@ -126,6 +131,9 @@ class Simulation:
 
         # Inform main of our state change
         if self.state != self.prevstate:
+            # A batch scenario is finished when the simulation stops running
+            if self.batchscen and self.state < bs.OP:
+                self.send_batchresult()
             bs.net.send_event(b'STATECHANGE', self.state)
             self.prevstate = self.state
 
@@ -182,6 +190,7 @@ class Simulation:
         areafilter.reset()
         bs.scr.reset()
         plotter.reset()
+        profiler.reset()
 
     def set_dtmult(self, mult):
         ''' Set simulation speed multiplier. '''
@@ -214,12 +223,26 @@ class Simulation:
         self.reset()
         try:
             scentime, scencmd = zip(*[tc for tc in simstack.readscn(fname)])
-            bs.net.send_event(b'BATCH', (scentime, scencmd))
+            bs.net.send_event(b'BATCH', (scentime, scencmd, Path(fname).stem))
         except FileNotFoundError:
             return False, f'BATCH: File not found: {fname}'
 
         return True
 
+    def send_batchresult(self):
+        ''' Send summary metrics and log files of the finished batch
+            scenario to the server. '''
+        logfiles = list()
+        for logger in datalog.allloggers.values():
+            if logger.file:
+                logger.file.flush()
+                logfiles.append(str(logger.fname))
+        result = dict(simt=self.simt, runtime=time.time() - self.batchstart,
+                      ntraf=bs.traf.ntraf, nconf=len(bs.traf.cd.confpairs_all),
+                      nlos=len(bs.traf.cd.lospairs_all), logfiles=logfiles)
+        bs.net.send_event(b'BATCHRESULT', result)
+        self.batchscen = None
+
     def event(self, eventname, eventdata, sender_rte):
         ''' Handle events coming from the network. '''
         # Keep track of event processing
@@ -235,6 +258,8 @@ class Simulation:
             self.reset()
             bs.stack.set_scendata(eventdata['scentime'], eventdata['scencmd'])
             self.op()
+            self.batchscen = eventdata['name']
+            self.batchstart = time.time()
             event_processed = True
 
         elif eventname == b'GETSIMSTATE':
@@ -2,9 +2,11 @@
 import inspect
 import re
 from types import SimpleNamespace
+import numpy as np
 from matplotlib import colors
 from bluesky.tools.misc import txt2bool, txt2lat, txt2lon, txt2alt, txt2tim, \
-    txt2hdg, txt2vs, txt2spd
+    txt2hdg, txt2vs, txt2spd, tim2txt
+from bluesky.tools.aero import ft, kts, fpm
 from bluesky.tools.position import Position, islat
 import bluesky as bs
 
@@ -70,26 +72,55 @@ class Parameter:
         # processing a stack command line.
         self.valid = bool(self.parsers) and self.canwrap(param)
 
+        # The parsed values of this parameter only depend on the parsed text
+        # when all its alternative parsers are pure
+        self.pure = all(p.pure for p in self.parsers)
+
     def __call__(self, argstring):
+        return self.parse(argstring)[1]
+
+    def parse(self, argstring):
+        ''' Parse this parameter from argstring. Returns the parser that was
+            used (None when the argument was omitted), and the parsed
+            result followed by the remaining argument string. '''
         # First check if argument is omitted and default value is needed
         if not argstring or argstring[0] == ',':
             _, argstring = re_getarg.match(argstring).groups()
             if self.hasdefault():
-                return self.default, argstring
+                return None, (self.default, argstring)
             if self.optional:
-                return (None, argstring) if argstring else ('',)
+                return None, ((None, argstring) if argstring else ('',))
             raise ArgumentError(f'Missing argument {self.name}')
         # Try available parsers
         error = ''
         for parser in self.parsers:
             try:
-                return parser.parse(argstring)
+                return parser, parser.parse(argstring)
             except (ValueError, ArgumentError) as e:
                 error += ('\n' + e.args[0])
 
         # If all fail, raise error
         raise ArgumentError(error)
 
+    def validate(self, *values):
+        ''' Check and convert already-parsed (non-text) values of this
+            parameter. Returns a tuple with the converted values. '''
+        error = ''
+        for parser in self.parsers:
+            try:
+                return parser.validate(*values)
+            except (ValueError, ArgumentError) as e:
+                error += ('\n' + e.args[0])
+        raise ArgumentError(error)
+
+    def totext(self, *values):
+        ''' Format parsed values of this parameter as stack text. '''
+        for annot in str(self.annotation).split('/'):
+            fmt = argformatters.get(annot)
+            if fmt is not None:
+                return fmt(*values)
+        return ' '.join(str(v) for v in values)
+
     def __str__(self):
         return f'{self.name}:{self.annotation}'
 
@@ -123,14 +154,24 @@ class Parser:
     # Output size of this parser
     size = 1
 
-    def __init__(self, parsefun=None):
+    # A parser is pure when its result only depends on the parsed text,
+    # and not on the simulation state (such as aircraft or reference positions)
+    pure = True
+
+    def __init__(self, parsefun=None, pure=None):
         self.parsefun = parsefun
+        if pure is not None:
+            self.pure = pure
 
     def parse(self, argstring):
         ''' Parse the next argument from argstring. '''
         curarg, argstring = re_getarg.match(argstring).groups()
         return self.parsefun(curarg), argstring
 
+    def validate(self, *values):
+        ''' Check already-parsed values. Returns a tuple of (converted) values. '''
+        return values
+
 
 class StringArg(Parser):
     ''' Argument parser that simply consumes the entire remaining text string. '''
@@ -140,6 +181,27 @@ class StringArg(Parser):
 
 class AcidArg(Parser):
     ''' Argument parser for aircraft callsigns and group ids. '''
+    pure = False
+
+    def validate(self, idx):
+        ''' Check aircraft indices: an index, an array of indices, or a boolean
+            mask over all aircraft. '''
+        arr = np.asarray(idx)
+        if arr.dtype.kind == 'b' and arr.shape == (bs.traf.ntraf,):
+            arr = np.flatnonzero(arr)
+        elif arr.dtype.kind not in 'iu':
+            raise ArgumentError(f'Aircraft index should be an integer, not {idx}')
+        if arr.size and (arr.min() < 0 or arr.max() >= bs.traf.ntraf):
+            raise ArgumentError('Aircraft index out of range')
+        if arr.ndim == 0:
+            idx = int(arr)
+            # Update ref position for navdb lookup
+            refdata.lat = bs.traf.lat[idx]
+            refdata.lon = bs.traf.lon[idx]
+            refdata.acidx = idx
+            return (idx,)
+        return (arr,)
+
     def parse(self, argstring):
         arg, argstring = re_getarg.match(argstring).groups()
         acid = arg.upper()
@@ -159,6 +221,8 @@ class AcidArg(Parser):
 
 class WpinrouteArg(Parser):
     ''' Argument parser for waypoints in an aircraft route. '''
+    pure = False
+
     def parse(self, argstring):
         arg, argstring = re_getarg.match(argstring).groups()
         wpname = arg.upper()
@@ -177,6 +241,8 @@ class WptArg(Parser):
         runway:    "EHAM/RW06" "LFPG/RWY23"
         Default values
     '''
+    pure = False
+
     def parse(self, argstring):
         arg, argstring = re_getarg.match(argstring).groups()
         name = arg.upper()
@@ -214,6 +280,8 @@ class PosArg(Parser):
     # This parser's output size is 2 (lat, lon)
     size = 2
 
+    pure = False
+
     def parse(self, argstring):
         arg, argstring = re_getarg.match(argstring).groups()
         argu = arg.upper()
@@ -294,6 +362,25 @@ argparsers = {
     'spd': Parser(txt2spd),
     'vspd': Parser(txt2vs),
     'alt': Parser(txt2alt),
-    'hdg': Parser(lambda txt: txt2hdg(txt, refdata.lat, refdata.lon)),
+    'hdg': Parser(lambda txt: txt2hdg(txt, refdata.lat, refdata.lon), pure=False),
     'time': Parser(txt2tim),
     'color': ColorArg()}
+
+
+# Text formatters per argument type, used to write stack commands that are
+# called with already-parsed values to a scenario file
+argformatters = {
+    'txt': str,
+    'word': str,
+    'string': str,
+    'onoff': lambda flag: 'ON' if flag else 'OFF',
+    'bool': lambda flag: 'ON' if flag else 'OFF',
+    'acid': lambda idx: bs.traf.id[idx],
+    'latlon': lambda lat, lon: f'{lat},{lon}',
+    'lat': lambda lat, lon: f'{lat},{lon}',
+    'spd': lambda spd: f'M{spd:.3f}' if 0.1 < spd < 1.0 else f'{spd / kts:.2f}',
+    'vspd': lambda vs: f'{vs / fpm:.1f}',
+    'alt': lambda alt: f'{alt / ft:.1f}',
+    'hdg': lambda hdg: f'{hdg:.2f}',
+    'time': tim2txt,
+    'color': lambda r, g, b: f'{r} {g} {b}'}
@@ -1,7 +1,22 @@
 ''' Stack Command implementation. '''
 import inspect
+import traceback
 import sys, os
+from collections import OrderedDict
+import numpy as np
+import bluesky as bs
+from bluesky import settings
 from bluesky.stack.argparser import Parameter, getnextarg, ArgumentError
+from bluesky.stack.stackbase import Stack
+
+
+# Register settings defaults
+settings.set_variable_defaults(stack_parse_cache=4096)
+
+# LRU cache of parsed argument templates: (command, argstring) -> template
+# A template is a list of (parameter, parser, text, values) tuples. The values
+# of pure parameters are reused, the text of other parameters is parsed again.
+argcache = OrderedDict()
 
 
 class Command:
@@ -55,13 +70,48 @@ class Command:
         self.callback = func
 
     def __call__(self, argstring):
+        # Use a cached template of this argument string when available
+        key = (self, argstring)
+        template = argcache.get(key)
+        args = None
+        if template is not None:
+            try:
+                args = self.replay(template)
+                argcache.move_to_end(key)
+            except (ValueError, ArgumentError):
+                # Parse the full string again to get the correct error message
+                del argcache[key]
+        if args is None:
+            args, template = self.parse(argstring)
+            argcache[key] = template
+            if len(argcache) > settings.stack_parse_cache:
+                argcache.popitem(last=False)
+
+        return self.callwithargs(*args)
+
+    def parse(self, argstring):
+        ''' Parse the arguments in argstring. Returns the list of parsed
+            arguments, and the template for the argument cache. '''
         args = []
+        template = []
         param = None
+
+        def parseparam(param, argstring):
+            parser, result = param.parse(argstring)
+            rest = result[-1]
+            values = result[:-1]
+            args.extend(values)
+            if parser is None or param.pure:
+                template.append((None, None, None, values))
+            else:
+                # An earlier, state-dependent alternative can succeed next
+                # time: store the consumed text to parse it again
+                template.append((param, parser, argstring[:len(argstring) - len(rest)], None))
+            return rest
+
         # Use callback-specified parameter parsers to generate param list from strings
         for param in self.params:
-            result = param(argstring)
-            argstring = result[-1]
-            args.extend(result[:-1])
+            argstring = parseparam(param, argstring)
 
         # Parse repeating final args
         while argstring:
@@ -75,11 +125,71 @@ class Command:
                     count += 1
                 msg += f', but {count} were given'
                 raise ArgumentError(msg)
-            result = param(argstring)
-            argstring = result[-1]
-            args.extend(result[:-1])
+            argstring = parseparam(param, argstring)
+
+        return args, template
 
-        # Call callback function with parsed parameters
+    @staticmethod
+    def replay(template):
+        ''' Generate the list of arguments from a cached template. '''
+        args = []
+        for param, parser, text, values in template:
+            if param is None:
+                args.extend(values)
+            else:
+                used, (*values, rest) = param.parse(text)
+                if used is not parser or rest:
+                    # Another alternative parses this argument now, or the
+                    # parser consumes fewer arguments than before
+                    raise ArgumentError('Cached argument template is invalid')
+                args.extend(values)
+        return args
+
+    def validate(self, *values):
+        ''' Check and convert already-parsed argument values, which are passed
+            in the units of the callback function. Text values are parsed as
+            in a stack command line.
+            Returns the list of arguments, and a list of (parameter, values)
+            pairs. '''
+        args = []
+        parts = []
+        values = list(values)
+        param = None
+        for param in self.params:
+            if not values:
+                if param.hasdefault():
+                    args.append(param.default)
+                    continue
+                if param.optional:
+                    break
+                raise ArgumentError(f'Missing argument {param.name}')
+            values = self.validateparam(param, values, args, parts)
+
+        # Repeating final args
+        while values:
+            if param is None or not param.gobble:
+                raise ArgumentError(f'{self.name} takes {len(self.params)} argument' +
+                                    ('s' if len(self.params) > 1 else '') +
+                                    f', but {len(self.params) + len(values)} were given')
+            values = self.validateparam(param, values, args, parts)
+        return args, parts
+
+    @staticmethod
+    def validateparam(param, values, args, parts):
+        ''' Validate the first value(s) in values for parameter param.
+            Returns the remaining values. '''
+        if isinstance(values[0], str):
+            result = param(values[0])[:-1]
+            nvalues = 1
+        else:
+            nvalues = param.size()
+            result = param.validate(*values[:nvalues])
+        args.extend(result)
+        parts.append((param, result))
+        return values[nvalues:]
+
+    def callwithargs(self, *args):
+        ''' Call the callback function with parsed arguments. '''
         ret = self.callback(*args)
         # Always return a tuple with a success value and a message string
         if ret is None:
@@ -91,6 +201,11 @@ class Command:
             ret = ret[0]
         return ret, ''
 
+    def getcommand(self, *values):
+        ''' Return the (sub)command object and remaining values, when
+            this command is called with already-parsed values. '''
+        return self, values
+
     def __repr__(self):
         if self.valid:
             return f'<Stack Command {self.name}, callback={self.callback}>'
@@ -202,6 +317,15 @@ class CommandGroup(Command):
                 return subcmdobj(subargs)
         return super().__call__(strargs)
 
+    def getcommand(self, *values):
+        ''' Return the (sub)command object and remaining values, when
+            this command is called with already-parsed values. '''
+        if values and isinstance(values[0], str):
+            subcmdobj = self.subcmds.get(values[0].upper())
+            if subcmdobj:
+                return subcmdobj.getcommand(*values[1:])
+        return self, values
+
     def helptext(self, subcmd=''):
         ''' Return complete help text. '''
         if subcmd:
@@ -267,6 +391,77 @@ def get_commands():
     return Command.cmddict
 
 
+def call(cmd, *args):
+    """ Call stack command cmd directly with already-parsed arguments,
+        without constructing and parsing a command line.
+
+        Arguments are passed in the units of the command's implementation
+        (e.g., SI units), and are checked in the same way as parsed text
+        arguments. Aircraft can be passed as an index, an array of indices,
+        or a boolean mask, which makes it possible to call a command for many
+        aircraft at once. Text arguments are parsed as in a stack command line.
+        When SAVEIC is recording, the call is saved as text, one line per
+        aircraft.
+
+        Example: stack.call('HDG', idx, hdg)
+
+        Returns a tuple with the success value and echo text of the command.
+    """
+    from bluesky.stack import recorder
+    cmdobj = Command.cmddict.get(cmd.upper())
+    if cmdobj is None:
+        raise KeyError(f'Unknown stack command: {cmd}')
+
+    cmdobj, args = cmdobj.getcommand(*args)
+    echoflags = bs.BS_OK
+    # Commands called directly have no sender, as with scenario commands
+    sender_rte, Stack.sender_rte = Stack.sender_rte, None
+    try:
+        args, parts = cmdobj.validate(*args)
+        success, echotext = cmdobj.callwithargs(*args)
+        if not success:
+            echoflags = bs.BS_FUNERR
+            echotext = f'Syntax error: {echotext or cmdobj.brieftext()}'
+    except ArgumentError as e:
+        success = False
+        echoflags = bs.BS_ARGERR
+        header = e.args[0] if e.args else 'Argument error.'
+        echotext = f'{header}\nUsage:\n{cmdobj.brieftext()}'
+    except Exception as e:
+        success = False
+        echoflags = bs.BS_FUNERR
+        header = e.args[0] if e.args else 'Function error.'
+        echotext = f'Error calling function implementation of {cmdobj.name}: {header}\n' + \
+            'Traceback printed to terminal.'
+        traceback.print_exc()
+    finally:
+        Stack.sender_rte = sender_rte
+
+    # Record the command as text when SAVEIC is on
+    if success and recorder.savefile is not None and cmdobj.name not in recorder.saveexcl:
+        for line in calltotext(cmdobj, parts):
+            recorder.savecmd(cmdobj.name, line)
+
+    if echotext:
+        bs.scr.echo(echotext, echoflags)
+    return success, echotext
+
+
+def calltotext(cmdobj, parts):
+    """ Generate stack command lines from the validated arguments of a direct
+        stack call. Array-valued arguments give one command line per element. """
+    name = cmdobj.name
+    if cmdobj.parent is not None:
+        name = f'{cmdobj.parent.name} {name}'
+    n = max((np.size(v) for _, values in parts for v in values
+             if isinstance(v, np.ndarray)), default=0)
+    if not n:
+        return [' '.join([name] + [param.totext(*values) for param, values in parts])]
+    return [' '.join([name] + [param.totext(*(v[i] if isinstance(v, np.ndarray) and v.ndim and
+                                               len(v) == n else v for v in values))
+                               for param, values in parts]) for i in range(n)]
+
+
 def get_annot(annotations):
     ''' Get annotations from string, or tuple/list. '''
     if isinstance(annotations, (tuple, list)):
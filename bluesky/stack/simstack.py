@@ -1,7 +1,11 @@
 ''' Main simulation-side stack functions. '''
+import os
 import math
+import zipfile
+import hashlib
 from pathlib import Path
 import traceback
+import numpy as np
 import bluesky as bs
 from bluesky.stack.stackbase import Stack, stack, checkscen, forward
 from bluesky.stack.cmdparser import Command, command
@@ -12,7 +16,11 @@ from bluesky import settings
 
 
 # Register settings defaults
-settings.set_variable_defaults(start_location="EHAM", scenario_path="scenario")
+settings.set_variable_defaults(start_location="EHAM", scenario_path="scenario",
+                               cache_path='cache', scenario_cache=True)
+
+# Version of the compiled scenario format
+SCNCACHE_VERSION = 1
 
 # List of TMX commands not yet implemented in BlueSky
 tmxlist = ("BGPASAS", "DFFLEVEL", "FFLEVEL", "FILTCONF", "FILTTRED", "FILTTAMB",
@@ -65,7 +73,7 @@ def process(from_pcall=None):
         cmdobj = Command.cmddict.get(cmdu)
 
         # If no function is found for 'cmd', check if cmd is actually an aircraft id
-        if not cmdobj and cmdu in bs.traf.id:
+        if not cmdobj and cmdu in bs.traf.idmap:
             cmd, argstring = argparser.getnextarg(argstring)
             argstring = cmdu + " " + argstring
             # When no other args are parsed, command is POS
@@ -135,14 +143,20 @@ def process(from_pcall=None):
         Stack.clear()
 
 
-def readscn(fname):
-    ''' Read a scenario file. '''
-    if not fname:
-        return
+def scnpath(fname):
+    ''' Return the full path of a scenario file. '''
     # Ensure .scn suffix and specify path if necessary
     fname = Path(fname).with_suffix('.scn')
     if not fname.is_absolute():
         fname = bs.resource(settings.scenario_path) / fname
+    return fname
+
+
+def readscn(fname):
+    ''' Read a scenario file. '''
+    if not fname:
+        return
+    fname = scnpath(fname)
 
     with open(fname, "r") as fscen:
         prevline = ''
@@ -176,6 +190,93 @@ def readscn(fname):
                     print("except this:" + line)
 
 
+def loadscn(fname):
+    ''' Load a scenario file, using its compiled version when available.
+
+        Returns the command times as a sorted numpy array, and the
+        corresponding list of command lines. Commands with equal times
+        keep the order in which they appear in the scenario file.
+
+        The compiled scenario is stored next to the scenario file (or in
+        the cache folder when the scenario folder is not writable), and
+        contains the sorted times, and the commands as indices in a table
+        of unique command strings. It is recompiled when the modification
+        time or size of the scenario file changes, and its contents differ. '''
+    fname = scnpath(fname)
+    stat = os.stat(fname)
+    if not settings.scenario_cache:
+        return compilescn(fname)[:2]
+    for cachename in scncachepaths(fname):
+        try:
+            with np.load(cachename) as cache:
+                if int(cache['version']) != SCNCACHE_VERSION:
+                    continue
+                if (int(cache['mtime']), int(cache['size'])) != (stat.st_mtime_ns, stat.st_size):
+                    # Modified or copied file: check if its contents changed
+                    if str(cache['hash']) != scnhash(fname):
+                        continue
+                    writescncache(cachename, stat, str(cache['hash']), cache['times'],
+                                  cache['index'], cache['table'])
+                table = cache['table'].tobytes().decode('utf-8').split('\0')
+                return cache['times'], [table[i] for i in cache['index'].tolist()]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            continue
+
+    times, cmds, table, index = compilescn(fname)
+    blob = np.frombuffer('\0'.join(table).encode('utf-8'), dtype=np.uint8)
+    for cachename in scncachepaths(fname):
+        try:
+            writescncache(cachename, stat, scnhash(fname), times, index, blob)
+            break
+        except OSError:
+            continue
+    return times, cmds
+
+
+def compilescn(fname):
+    ''' Parse a scenario file, and sort its commands by time.
+        Returns the times, command lines, table of unique command lines,
+        and the index of each command line in this table. '''
+    lines = list(readscn(fname))
+    times = np.array([t for t, _ in lines], dtype=float)
+    order = np.argsort(times, kind='stable')
+    # Store each unique command line only once
+    strings = dict()
+    index = np.array([strings.setdefault(lines[i][1], len(strings)) for i in order.tolist()],
+                     dtype=np.int32)
+    table = list(strings)
+    cmds = [table[i] for i in index.tolist()]
+    return times[order], cmds, table, index
+
+
+def scnhash(fname):
+    ''' Return the hash of the contents of a scenario file. '''
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def scncachepaths(fname):
+    ''' Candidate locations of the compiled version of a scenario file:
+        next to the scenario file, or in the cache folder. '''
+    yield fname.with_suffix('.scnc')
+    key = hashlib.sha1(str(fname.resolve()).encode()).hexdigest()[:8]
+    yield bs.resource(settings.cache_path) / f'{fname.stem}-{key}.scnc'
+
+
+def writescncache(cachename, stat, srchash, times, index, table):
+    ''' Write a compiled scenario file. '''
+    tmpname = cachename.with_name(f'{cachename.name}.tmp{os.getpid()}')
+    try:
+        with open(tmpname, 'wb') as f:
+            np.savez(f, version=SCNCACHE_VERSION, mtime=stat.st_mtime_ns,
+                     size=stat.st_size, hash=srchash, times=times,
+                     index=index, table=table)
+        os.replace(tmpname, cachename)
+    finally:
+        if tmpname.exists():
+            tmpname.unlink()
+
+
 @command(aliases=('CALL',), brief="PCALL filename [REL/ABS/args]")
 def pcall(fname, *pcall_arglst):
     """ PCALL: Import another scenario file into the current scenario.
@@ -190,7 +291,7 @@ def pcall(fname, *pcall_arglst):
     """
     # Check for a/c id as first argument (use case: procedure files)
     # CALL KL204 myproc should have effect as if: CALL myproc KL204
-    if pcall_arglst and fname in bs.traf.id:
+    if pcall_arglst and fname in bs.traf.idmap:
         acid = fname
         fname = pcall_arglst[0]
         pcall_arglst = [acid] + list(pcall_arglst[1:])
@@ -202,7 +303,8 @@ def pcall(fname, *pcall_arglst):
         pcall_arglst = pcall_arglst[1:]
 
     try:
-        merge(readscn(fname), *pcall_arglst, isrelative=isrelative)
+        times, cmds = loadscn(fname)
+        merge(zip(times.tolist(), cmds), *pcall_arglst, isrelative=isrelative)
 
     except FileNotFoundError as e:
         return False, f"PCALL: File not found'{e.filename}'"
@@ -215,12 +317,10 @@ def merge(source, *args, isrelative=True):
     # the current simtime to every timestamp
     t_offset = bs.sim.simt if isrelative else 0.0
 
-    # Read the scenario file
-    insidx = 0
-    instime = bs.sim.simt
-
     # All commands with timestamps at the current sim time or earlier should be called immediately
     callnow = []
+    times = []
+    cmds = []
     for (cmdtime, cmdline) in source:
 
         # Time offset correction
@@ -233,18 +333,11 @@ def merge(source, *args, isrelative=True):
 
         if cmdtime <= bs.sim.simt:
             callnow.append((cmdline, None))
-        elif not Stack.scentime or cmdtime >= Stack.scentime[-1]:
-            Stack.scentime.append(cmdtime)
-            Stack.scencmd.append(cmdline)
         else:
-            if cmdtime > instime:
-                insidx, instime = next(
-                    ((j, t) for j, t in enumerate(Stack.scentime) if t >= cmdtime),
-                    (len(Stack.scentime), Stack.scentime[-1]),
-                )
-            Stack.scentime.insert(insidx, cmdtime)
-            Stack.scencmd.insert(insidx, cmdline)
-            insidx += 1
+            times.append(cmdtime)
+            cmds.append(cmdline)
+
+    Stack.scen.merge(times, cmds)
 
     # execute any commands that are already due
     if callnow:
@@ -274,9 +367,8 @@ def ic(filename : 'string' = ''):
 
     # Reset sim and open new scenario file
     try:
-        for (cmdtime, cmd) in readscn(filename):
-            Stack.scentime.append(cmdtime)
-            Stack.scencmd.append(cmd)
+        times, cmds = loadscn(filename)
+        Stack.scen.merge(times.tolist(), cmds)
         Stack.scenname = filename.stem
 
         # Remember this filename in IC.scn in scenario folder
@@ -311,10 +403,7 @@ def schedule(time: 'time', cmdline: 'string'):
         Arguments:
         - time: the time at which the command should be executed
         - cmdline: the command line to be executed """
-    # Get index of first scentime greater than 'time' as insert position
-    idx = next((i for i, t in enumerate(Stack.scentime) if t > time), len(Stack.scentime))
-    Stack.scentime.insert(idx, time)
-    Stack.scencmd.insert(idx, cmdline)
+    Stack.scen.insert(time, cmdline)
     return True
 
 
@@ -325,11 +414,7 @@ def delay(time: 'time', cmdline: 'string'):
         Arguments:
         - time: the time with which the command should be delayed
         - cmdline: the command line to be executed after the delay """
-    # Get index of first scentime greater than 'time' as insert position
-    time += bs.sim.simt
-    idx = next((i for i, t in enumerate(Stack.scentime) if t > time), len(Stack.scentime))
-    Stack.scentime.insert(idx, time)
-    Stack.scencmd.insert(idx, cmdline)
+    Stack.scen.insert(time + bs.sim.simt, cmdline)
     return True
 
 
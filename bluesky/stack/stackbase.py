@@ -1,7 +1,58 @@
 ''' BlueSky Stack base data and functions. '''
+import heapq
 import bluesky as bs
 
 
+class Timeline:
+    ''' Time-ordered buffer of scenario commands.
+
+        Commands are stored in a min-heap of (time, sequence number, command)
+        entries. The sequence number ensures that commands with equal times
+        are released in the order in which they were added. '''
+    def __init__(self, times=(), cmds=()):
+        self.heap = []
+        self.seq = 0
+        self.merge(times, cmds)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def clear(self):
+        ''' Remove all commands. '''
+        self.heap = []
+        self.seq = 0
+
+    def insert(self, time, cmd):
+        ''' Insert a command, after all commands with the same or an earlier time. '''
+        heapq.heappush(self.heap, (time, self.seq, cmd))
+        self.seq += 1
+
+    def merge(self, times, cmds):
+        ''' Merge a list of commands with the existing commands. '''
+        entries = [(time, self.seq + i, cmd) for i, (time, cmd) in enumerate(zip(times, cmds))]
+        if len(entries) < 16:
+            for entry in entries:
+                heapq.heappush(self.heap, entry)
+        else:
+            self.heap.extend(entries)
+            heapq.heapify(self.heap)
+        self.seq += len(entries)
+
+    def release(self, time):
+        ''' Return the commands with a timestamp at or before time,
+            and remove them from the timeline. '''
+        cmds = []
+        while self.heap and self.heap[0][0] <= time:
+            cmds.append(heapq.heappop(self.heap)[2])
+        return cmds
+
+    def data(self):
+        ''' Return lists of the times and commands in the timeline. '''
+        # A sorted list is also a valid heap
+        self.heap.sort()
+        return [e[0] for e in self.heap], [e[2] for e in self.heap]
+
+
 class Stack:
     ''' Stack static-only namespace. '''
 
@@ -11,8 +62,7 @@ class Stack:
 
     # Scenario details
     scenname = ""  # Currently used scenario name (for reading)
-    scentime = []  # Times of the commands from the read scenario file
-    scencmd = []  # Commands from the scenario file
+    scen = Timeline()  # Timed commands from the scenario file
 
     # Current command details
     sender_rte = None  # bs net route to sender
@@ -22,8 +72,7 @@ class Stack:
         ''' Reset stack variables. '''
         cls.cmdstack = []
         cls.scenname = ""
-        cls.scentime = []
-        cls.scencmd = []
+        cls.scen.clear()
         cls.sender_rte = None
 
     @classmethod
@@ -40,14 +89,9 @@ class Stack:
 
 def checkscen():
     """ Check if commands from the scenario buffer need to be stacked. """
-    if Stack.scencmd:
-        # Find index of first timestamp exceeding bs.sim.simt
-        idx = next((i for i, t in enumerate(
-            Stack.scentime) if t > bs.sim.simt), None)
-        # Stack all commands before that time, and remove from scenario
-        stack(*Stack.scencmd[:idx])
-        del Stack.scencmd[:idx]
-        del Stack.scentime[:idx]
+    if Stack.scen:
+        # Stack all commands up to the current time, and remove from scenario
+        stack(*Stack.scen.release(bs.sim.simt))
 
 
 def stack(*cmdlines, sender_id=None):
@@ -93,10 +137,9 @@ def get_scenname():
 
 def get_scendata():
     """ Return the scenario data that was loaded from a scenario file. """
-    return Stack.scentime, Stack.scencmd
+    return Stack.scen.data()
 
 
 def set_scendata(newtime, newcmd):
     """ Set the scenario data. This is used by the batch logic. """
-    Stack.scentime = newtime
-    Stack.scencmd = newcmd
+    Stack.scen = Timeline(newtime, newcmd)
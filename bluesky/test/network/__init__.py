@@ -0,0 +1,3 @@
+"""
+Tests of the BlueSky network server and nodes.
+"""
@@ -0,0 +1,104 @@
+"""
+Tests the batch scenario queue of the simulation server
+"""
+import csv
+import json
+from bluesky.network.batch import BatchQueue, split_scenarios
+
+
+def make_scenarios(names):
+    scentime, scencmd = [], []
+    for name in names:
+        scentime.extend([0.0, 0.0, 10.0])
+        scencmd.extend([f'SCEN {name}', f'CRE {name}1 B744 52 4 90 FL100 250', 'HOLD'])
+    return list(split_scenarios(scentime, scencmd))
+
+
+def test_batch_split():
+    """
+    Split a batch file into its scenarios.
+    Expect one scenario per SCEN command, with its own commands.
+    """
+    scens = make_scenarios(['A', 'B', 'C'])
+    assert [scen['name'] for scen in scens] == ['A', 'B', 'C']
+    assert scens[1]['scencmd'] == ['SCEN B', 'CRE B1 B744 52 4 90 FL100 250', 'HOLD']
+    assert scens[1]['scentime'] == [0.0, 0.0, 10.0]
+
+
+def test_batch_requeue(tmp_path):
+    """
+    Run a batch in which one node fails more often than it is retried.
+    Expect the scenario to be requeued up to the retry count, and then
+    recorded as failed.
+    """
+    batch = BatchQueue(make_scenarios(['A', 'B']), tmp_path / 'res.jsonl', retries=1)
+    assert batch.ntotal == 2 and not batch.finished
+
+    assert batch.next(b'n1')['name'] == 'A'
+    assert batch.next(b'n2')['name'] == 'B'
+    batch.done(b'n2', dict(ntraf=1))
+    batch.failed(b'n1', 'crashed')
+    # Results of requeued scenarios are ignored
+    batch.done(b'n1', dict(ntraf=1))
+    assert batch.next(b'n3')['name'] == 'A'
+    batch.failed(b'n3', 'crashed')
+    assert batch.finished
+
+    rows = batch.read()
+    assert [(row['name'], row['status'], row['attempts']) for row in rows] == \
+        [('B', 'ok', 1), ('A', 'crashed', 2)]
+    assert rows[0]['ntraf'] == 1
+
+
+def test_batch_resume(tmp_path):
+    """
+    Start a batch again with the results of an interrupted run.
+    Expect finished scenarios to be skipped only when resuming.
+    """
+    fresults = tmp_path / 'res.jsonl'
+    scens = make_scenarios(['A', 'B', 'A'])
+    batch = BatchQueue(scens, fresults)
+    batch.next(b'n1')
+    batch.done(b'n1', dict())
+
+    batch = BatchQueue(scens, fresults)
+    assert batch.nskipped == 1 and batch.ntotal == 2
+    assert [scen['name'] for scen in batch.pending] == ['B', 'A']
+
+    batch = BatchQueue(scens, fresults, resume=False)
+    assert batch.nskipped == 0 and batch.ntotal == 3
+
+
+def test_batch_timeout(tmp_path):
+    """
+    Run scenarios for longer than the batch timeout.
+    Expect only the nodes of scenarios that ran too long to time out.
+    """
+    batch = BatchQueue(make_scenarios(['A', 'B']), tmp_path / 'res.jsonl', timeout=60.0)
+    batch.next(b'n1')
+    batch.next(b'n2')
+    assert batch.timedout() == []
+    scen, tstart = batch.running[b'n1']
+    batch.running[b'n1'] = (scen, tstart - 61.0)
+    assert batch.timedout() == [b'n1']
+    assert BatchQueue(make_scenarios(['A']), tmp_path / 'res2.jsonl').timedout() == []
+
+
+def test_batch_table(tmp_path):
+    """
+    Aggregate the results of a batch.
+    Expect one row per scenario, with the union of all result fields.
+    """
+    batch = BatchQueue(make_scenarios(['A', 'B']), tmp_path / 'res.jsonl')
+    batch.next(b'n1')
+    batch.next(b'n2')
+    batch.done(b'n1', dict(nconf=3, logfiles=['a.log', 'b.log']))
+    batch.done(b'n2', dict(nlos=1))
+    fname = batch.write_table()
+    assert fname == tmp_path / 'res.csv'
+    with open(fname) as f:
+        rows = list(csv.DictReader(f))
+    assert [row['name'] for row in rows] == ['A', 'B']
+    assert rows[0]['logfiles'] == 'a.log;b.log' and rows[0]['nlos'] == ''
+    assert rows[1]['nlos'] == '1'
+    assert json.loads((tmp_path / 'res.jsonl').read_text().splitlines()[0])['nconf'] == 3
@@ -0,0 +1,105 @@
+"""
+Tests the batch decoder of Mode-S Beast data with known DF17 messages
+"""
+import numpy as np
+import pytest
+from bluesky.plugins import adsb_decoder as decoder
+
+
+# Known DF17 messages: identification, even and odd airborne position, and velocity
+MSG_IDENT = '8D4840D6202CC371C32CE0576098'
+MSG_POS_EVEN = '8D40621D58C382D690C8AC2863A7'
+MSG_POS_ODD = '8D40621D58C386435CC412692AD6'
+MSG_VEL = '8D485020994409940838175B284F'
+
+
+def tomsgs(*hexmsgs):
+    return np.array([list(bytes.fromhex(msg)) for msg in hexmsgs], dtype=np.uint8)
+
+
+def beast(*hexmsgs):
+    ''' Wrap messages in Mode-S Beast long frames, escaping 0x1a bytes. '''
+    data = b''
+    for i, msg in enumerate(hexmsgs):
+        frame = bytes([0, 0, 0, 0, 0, i]) + b'\x80' + bytes.fromhex(msg)
+        data += b'\x1a\x33' + frame.replace(b'\x1a', b'\x1a\x1a')
+    return data
+
+
+def test_beast_frames():
+    """
+    Split Beast data with an escaped 0x1a byte, a short frame, and an
+    incomplete last frame.
+    Expect all complete long frames, and the last frame to be left unprocessed.
+    """
+    # The ICAO address of this message contains a 0x1a byte
+    msgesc = '8D1A2B3C' + MSG_IDENT[8:]
+    short = b'\x1a\x32' + bytes(7) + bytes.fromhex('5D4840D6A8E2F1')
+    data = beast(MSG_IDENT, msgesc) + short + beast(MSG_VEL) + b'\x1a\x33\x00\x00'
+    msgs, nbytes = decoder.beast_frames(data)
+    assert [bytes(msg).hex().upper() for msg in msgs] == [MSG_IDENT, msgesc, MSG_VEL]
+    assert data[nbytes:] == b'\x1a\x33\x00\x00'
+
+    # Without a following frame marker the last frame is not processed
+    msgs, nbytes = decoder.beast_frames(beast(MSG_IDENT))
+    assert len(msgs) == 0 and nbytes == 0
+
+
+def test_crc24():
+    """
+    Compute the CRC remainder of valid and corrupted messages.
+    Expect zero only for the valid messages, as with the string decoder.
+    """
+    valid = [MSG_IDENT, MSG_POS_EVEN, MSG_POS_ODD, MSG_VEL]
+    corrupt = MSG_IDENT[:10] + 'FF' + MSG_IDENT[12:]
+    crc = decoder.crc24(tomsgs(*valid, corrupt))
+    assert np.array_equal(crc == 0, [True] * 4 + [False])
+    assert all(decoder.checksum(msg) for msg in valid)
+
+
+def test_df17_fields():
+    """
+    Decode the fields of known DF17 messages.
+    Expect the known callsign, altitude, position, speed and heading.
+    """
+    df, icao, tc, me = decoder.df17_fields(tomsgs(MSG_IDENT, MSG_POS_EVEN, MSG_POS_ODD, MSG_VEL))
+    assert np.all(df == 17)
+    assert icao.tolist() == [0x4840D6, 0x40621D, 0x40621D, 0x485020]
+    assert tc.tolist() == [4, 11, 11, 19]
+
+    assert decoder.me_callsign(me[:1]) == ['KLM1023']
+
+    alt, oe, cprlat, cprlon = decoder.me_position(me[1:3])
+    assert alt.tolist() == [38000, 38000]
+    assert oe.tolist() == [0, 1]
+    assert cprlat.tolist() == [decoder.get_cprlat(MSG_POS_EVEN), decoder.get_cprlat(MSG_POS_ODD)]
+    assert cprlon.tolist() == [decoder.get_cprlon(MSG_POS_EVEN), decoder.get_cprlon(MSG_POS_ODD)]
+
+    speed, heading = decoder.me_velocity(me[3:])
+    assert speed[0] == pytest.approx(159.20, abs=0.01)
+    assert heading[0] == pytest.approx(182.88, abs=0.01)
+
+
+def test_vcpr2position():
+    """
+    Decode the position of a known even/odd message pair, with either
+    message as the most recent one, and of frames in different latitude zones.
+    Expect the known position, the same result as the scalar decoder,
+    and NaN for the different zones.
+    """
+    cprlat0, cprlat1 = decoder.get_cprlat(MSG_POS_EVEN), decoder.get_cprlat(MSG_POS_ODD)
+    cprlon0, cprlon1 = decoder.get_cprlon(MSG_POS_EVEN), decoder.get_cprlon(MSG_POS_ODD)
+    t0 = np.array([1.0, 0.0])
+    t1 = np.array([0.0, 1.0])
+    lat, lon = decoder.vcpr2position(np.full(2, cprlat0), np.full(2, cprlat1),
+                                     np.full(2, cprlon0), np.full(2, cprlon1), t0, t1)
+    assert lat[0] == pytest.approx(52.25720, abs=1e-5)
+    assert lon[0] == pytest.approx(3.91937, abs=1e-5)
+    for i in range(2):
+        ref = decoder.cpr2position(cprlat0, cprlat1, cprlon0, cprlon1, t0[i], t1[i])
+        assert [lat[i], lon[i]] == pytest.approx(ref, abs=1e-9)
+
+    lat, lon = decoder.vcpr2position(np.array([cprlat0]), np.array([4985]), np.array([cprlon0]),
+                                     np.array([cprlon1]), np.array([1.0]), np.array([0.0]))
+    assert decoder.cpr2position(cprlat0, 4985, cprlon0, cprlon1, 1.0, 0.0) is None
+    assert np.isnan(lat[0]) and np.isnan(lon[0])
@@ -0,0 +1,106 @@
+"""
+Tests the array-backed replay buffer of the ATC agent
+"""
+import numpy as np
+from bluesky.plugins.atc_utils.replay_buffer import ReplayBuffer, SumTree
+
+
+def store(buffer, start, n):
+    ''' Store n experiences, numbered from start in their reward. '''
+    rewards = np.arange(start, start + n, dtype=float)
+    states = np.repeat(rewards[:, None], 14, axis=1)
+    actions = np.zeros((n, 6), dtype=np.int8)
+    buffer.store_experiences(states, actions, rewards, states + 0.5)
+
+
+def test_replay_buffer_wraparound():
+    """
+    Store more experiences than fit in the buffer, in one and in several batches.
+    Expect only the newest experiences to be kept, in the order they were stored.
+    """
+    buffer = ReplayBuffer(capacity=10)
+    store(buffer, 0, 7)
+    store(buffer, 7, 7)
+    assert len(buffer) == 10 and buffer.position == 4
+    order = (buffer.position + np.arange(10)) % 10
+    assert np.array_equal(buffer.rewards[order], np.arange(4, 14))
+    assert np.array_equal(buffer.next_states[order, 0], np.arange(4, 14) + 0.5)
+
+    store(buffer, 14, 25)
+    assert len(buffer) == 10
+    order = (buffer.position + np.arange(10)) % 10
+    assert np.array_equal(buffer.rewards[order], np.arange(29, 39))
+
+
+def test_replay_buffer_sampling():
+    """
+    Sample batches uniformly, also larger than the number of stored experiences.
+    Expect distinct, stored experiences, with consistent states and rewards.
+    """
+    buffer = ReplayBuffer(capacity=100)
+    store(buffer, 0, 50)
+    states, actions, rewards, next_states = buffer.sample_batch(32)
+    assert len(np.unique(rewards)) == 32
+    assert np.all(rewards < 50)
+    assert np.array_equal(states[:, 0], rewards) and np.array_equal(next_states[:, 0], rewards + 0.5)
+    assert len(buffer.sample_batch(128)[2]) == 50
+
+    (_, _, _, _, dones), idx, weights = buffer.sample_prioritized(16)
+    assert len(idx) == 16 and np.all(weights == 1.0) and not dones.any()
+
+
+def test_replay_buffer_prioritized():
+    """
+    Sample from a prioritized buffer after updating the priorities.
+    Expect samples proportional to priority, and importance sampling weights
+    inversely proportional to the sampling probability.
+    """
+    buffer = ReplayBuffer(capacity=8, prioritized=True, alpha=1.0)
+    buffer.rng = np.random.default_rng(1)
+    store(buffer, 0, 8)
+    assert buffer.tree.total() == 8.0
+
+    buffer.update_priorities(np.arange(8), np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 3.0]), eps=0.0)
+    assert buffer.tree.total() == 4.0
+    idx = np.concatenate([buffer.sample_indices(4) for _ in range(250)])
+    assert set(np.unique(idx)) == {6, 7}
+    assert abs(np.mean(idx == 7) - 0.75) < 0.05
+
+    (_, _, rewards, _, _), idx, weights = buffer.sample_prioritized(4, beta=0.5)
+    assert np.array_equal(rewards, idx)
+    expected = np.where(idx == 6, 1.0 / 4.0, 3.0 / 4.0) ** -0.5
+    assert np.allclose(weights, expected / np.max(expected))
+
+
+def test_sumtree_find():
+    """
+    Find the leaves of cumulative priority values.
+    Expect each value to fall in the leaf whose cumulative range contains it.
+    """
+    tree = SumTree(5)
+    priorities = np.array([1.0, 0.0, 2.0, 0.5, 1.5])
+    tree.update(np.arange(5), priorities)
+    assert tree.total() == 5.0
+    bounds = np.cumsum(priorities)
+    values = np.random.default_rng(0).uniform(0.0, 5.0, 1000)
+    assert np.array_equal(tree.find(values), np.searchsorted(bounds, values, side='right'))
+
+
+def test_replay_buffer_save_load(tmp_path):
+    """
+    Save a wrapped-around prioritized buffer, and load it into a new buffer.
+    Expect the experiences in the same order, with their priorities.
+    """
+    buffer = ReplayBuffer(capacity=10, prioritized=True)
+    store(buffer, 0, 13)
+    buffer.update_priorities(np.array([0, 5]), np.array([2.0, 4.0]))
+    buffer.save(tmp_path / 'buffer.npz')
+
+    loaded = ReplayBuffer(capacity=10, prioritized=True)
+    loaded.load(tmp_path / 'buffer.npz')
+    assert len(loaded) == 10
+    assert np.array_equal(np.sort(loaded.rewards), np.arange(3, 13))
+    for i in range(10):
+        j = np.flatnonzero(loaded.rewards == buffer.rewards[i])[0]
+        assert loaded.tree.tree[j + loaded.tree.capacity] == buffer.tree.tree[i + buffer.tree.capacity]
+    assert loaded.max_priority == buffer.max_priority
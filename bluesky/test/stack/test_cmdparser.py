@@ -0,0 +1,122 @@
+"""
+Tests the cache of parsed stack arguments and direct stack calls
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import bluesky as bs
+from bluesky import stack
+from bluesky.stack import cmdparser
+
+
+class StubTraffic:
+    ''' Minimal traffic object for the acid argument parser. '''
+    def __init__(self, *acids):
+        self.id = list(acids)
+        self.groups = dict()
+        self.lat = np.zeros(len(acids))
+        self.lon = np.zeros(len(acids))
+
+    @property
+    def ntraf(self):
+        return len(self.id)
+
+    def id2idx(self, acid):
+        return self.id.index(acid) if acid in self.id else -1
+
+
+@pytest.fixture
+def stubsim(monkeypatch):
+    ''' Stub traffic and screen objects, and an empty argument cache. '''
+    echoes = []
+    monkeypatch.setattr(bs, 'traf', StubTraffic())
+    monkeypatch.setattr(bs, 'scr', SimpleNamespace(echo=lambda text, flags=0: echoes.append(text)))
+    cmdparser.argcache.clear()
+    yield echoes
+    cmdparser.argcache.clear()
+
+
+@pytest.fixture
+def testcmds():
+    ''' Stack commands that return their parsed arguments. '''
+    @stack.command(name='TESTDEL', annotations='acid/txt')
+    def testdel(target):
+        return True, repr(target)
+
+    @stack.command(name='TESTALT', annotations='txt,alt,float')
+    def testalt(name, alt, value):
+        return True, repr((name, alt, value))
+
+    @stack.command(name='TESTSPD', annotations='acid,float')
+    def testspd(idx, spd):
+        return True, repr((idx, spd))
+
+    yield cmdparser.Command.cmddict
+    stack.remove_commands(['TESTDEL', 'TESTALT', 'TESTSPD'])
+
+
+def test_argcache_pure(stubsim, testcmds):
+    """
+    Parse the same arguments twice for a command with only pure parameters.
+    Expect the same values, and a cached template with only values.
+    """
+    cmd = testcmds['TESTALT']
+    first = cmd('abc FL100 1.5')
+    assert len(cmdparser.argcache) == 1
+    template = next(iter(cmdparser.argcache.values()))
+    assert all(param is None for param, *_ in template)
+    assert cmd('abc FL100 1.5') == first
+    assert eval(first[1]) == ('ABC', 10000 * bs.tools.aero.ft, 1.5)
+
+
+def test_argcache_alternatives(stubsim, testcmds):
+    """
+    Delete an aircraft with a command that takes an aircraft or a text,
+    before and after the aircraft exists.
+    Expect the text before, and the aircraft index once the aircraft exists.
+    """
+    cmd = testcmds['TESTDEL']
+    assert cmd('AC1') == (True, repr('AC1'))
+    bs.traf.id.append('AC1')
+    bs.traf.lat = bs.traf.lon = np.zeros(1)
+    assert cmd('AC1') == (True, repr(0))
+    assert cmd('AC1') == (True, repr(0))
+    bs.traf.id.clear()
+    assert cmd('AC1') == (True, repr('AC1'))
+
+
+def test_argcache_size(stubsim, testcmds, monkeypatch):
+    """
+    Parse more different argument strings than fit in the cache.
+    Expect the least recently used templates to be dropped.
+    """
+    monkeypatch.setattr(bs.settings, 'stack_parse_cache', 3)
+    cmd = testcmds['TESTALT']
+    for i in range(5):
+        cmd(f'a {i} {i}')
+    cmd('a 2 2')
+    keys = [key[1] for key in cmdparser.argcache]
+    assert keys == ['a 3 3', 'a 4 4', 'a 2 2']
+
+
+def test_call(stubsim, testcmds, monkeypatch):
+    """
+    Call commands directly with parsed values, text and aircraft arrays,
+    and with wrong arguments.
+    Expect the parsed values to be passed on, and argument errors to be echoed.
+    """
+    monkeypatch.setattr(bs, 'traf', StubTraffic('AC1', 'AC2', 'AC3'))
+    assert stack.call('testalt', 'ABC', 3000.0, 2.0) == (True, repr(('ABC', 3000.0, 2.0)))
+    assert stack.call('TESTALT', 'abc', 'FL100', '2')[1] == \
+        repr(('ABC', 10000 * bs.tools.aero.ft, 2.0))
+
+    assert stack.call('TESTDEL', 1) == (True, repr(1))
+    success, text = stack.call('TESTDEL', np.array([True, False, True]))
+    assert success and np.array_equal(eval(text.replace('array', 'np.array')), [0, 2])
+
+    success, text = stack.call('TESTSPD', 5, 100.0)
+    assert not success and 'out of range' in text
+    assert stubsim[-1] == text
+
+    with pytest.raises(KeyError):
+        stack.call('NOTACOMMAND')
@@ -0,0 +1,107 @@
+"""
+Tests the compiled scenario cache
+"""
+import os
+import numpy as np
+import pytest
+from bluesky import settings
+from bluesky.stack import simstack
+
+
+SCENARIO = '''# Test scenario
+00:00:10.00>ECHO third
+00:00:00.00>ECHO first
+00:00:10.00>ECHO fourth
+00:00:05.00>ECHO second
+00:00:10.00>ECHO third
+'''
+
+
+@pytest.fixture
+def scnfile(tmp_path, monkeypatch):
+    ''' Scenario file in a temporary folder, with caching enabled. '''
+    monkeypatch.setattr(settings, 'scenario_cache', True, raising=False)
+    monkeypatch.setattr(settings, 'cache_path', str(tmp_path / 'cache'), raising=False)
+    fname = tmp_path / 'test.scn'
+    fname.write_text(SCENARIO)
+    return fname
+
+
+def nocompile(fname):
+    ''' Replacement of compilescn for tests that expect a cache hit. '''
+    raise AssertionError(f'{fname} was recompiled')
+
+
+def test_compilescn_sort(scnfile):
+    """
+    Compile a scenario with out-of-order and equal command times.
+    Expect commands sorted by time, with equal times in file order,
+    and each unique command line stored once.
+    """
+    times, cmds, table, index = simstack.compilescn(scnfile)
+    assert times.tolist() == [0.0, 5.0, 10.0, 10.0, 10.0]
+    assert cmds == ['ECHO first', 'ECHO second', 'ECHO third', 'ECHO fourth', 'ECHO third']
+    assert len(table) == 4
+    assert [table[i] for i in index.tolist()] == cmds
+
+
+def test_loadscn_cache_hit(scnfile, monkeypatch):
+    """
+    Load a scenario twice.
+    Expect a compiled scenario next to the scenario file after the first load,
+    and the same commands from the cache at the second load.
+    """
+    times, cmds = simstack.loadscn(scnfile)
+    assert scnfile.with_suffix('.scnc').exists()
+
+    monkeypatch.setattr(simstack, 'compilescn', nocompile)
+    ctimes, ccmds = simstack.loadscn(scnfile)
+    assert ctimes.tolist() == times.tolist()
+    assert ccmds == cmds
+
+
+def test_loadscn_touched(scnfile, monkeypatch):
+    """
+    Load a scenario, change its modification time but not its contents,
+    and load it again.
+    Expect the cached commands, and the new modification time in the cache.
+    """
+    _, cmds = simstack.loadscn(scnfile)
+    stat = os.stat(scnfile)
+    os.utime(scnfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    monkeypatch.setattr(simstack, 'compilescn', nocompile)
+    assert simstack.loadscn(scnfile)[1] == cmds
+    with np.load(scnfile.with_suffix('.scnc')) as cache:
+        assert int(cache['mtime']) == os.stat(scnfile).st_mtime_ns
+
+
+def test_loadscn_changed(scnfile):
+    """
+    Load a scenario, change its contents, and load it again.
+    Expect the commands of the changed scenario.
+    """
+    simstack.loadscn(scnfile)
+    stat = os.stat(scnfile)
+    scnfile.write_text(SCENARIO + '00:00:01.00>ECHO added\n')
+    # Make sure the change is visible, even with a coarse mtime resolution
+    os.utime(scnfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    times, cmds = simstack.loadscn(scnfile)
+    assert times.tolist() == [0.0, 1.0, 5.0, 10.0, 10.0, 10.0]
+    assert cmds[:2] == ['ECHO first', 'ECHO added']
+
+
+def test_loadscn_cache_folder(scnfile, monkeypatch):
+    """
+    Load a scenario when the compiled scenario can't be written next to it.
+    Expect the compiled scenario in the cache folder, and a cache hit from there.
+    """
+    (scnfile.parent / 'cache').mkdir()
+    # A folder in place of the compiled scenario makes it unwritable and unreadable
+    scnfile.with_suffix('.scnc').mkdir()
+    _, cmds = simstack.loadscn(scnfile)
+    assert len(list((scnfile.parent / 'cache').glob('test-*.scnc'))) == 1
+
+    monkeypatch.setattr(simstack, 'compilescn', nocompile)
+    assert simstack.loadscn(scnfile)[1] == cmds
@@ -0,0 +1,88 @@
+"""
+Tests the time-ordered buffer of scenario commands
+"""
+from types import SimpleNamespace
+import pytest
+import bluesky as bs
+from bluesky.stack import stackbase
+from bluesky.stack.stackbase import Timeline
+
+
+@pytest.fixture
+def scenstack():
+    ''' Empty command stack and scenario timeline. '''
+    stackbase.Stack.reset()
+    yield stackbase.Stack
+    stackbase.Stack.reset()
+
+
+def test_timeline_equal_times():
+    """
+    Add commands with equal times, out of order with other commands,
+    by insert and by merge.
+    Expect time order, and insertion order for equal times.
+    """
+    timeline = Timeline([5.0, 1.0, 5.0], ['A', 'B', 'C'])
+    timeline.insert(5.0, 'D')
+    timeline.insert(1.0, 'E')
+    timeline.merge([5.0, 0.0], ['F', 'G'])
+    assert len(timeline) == 7
+    assert timeline.release(10.0) == ['G', 'B', 'E', 'A', 'C', 'D', 'F']
+    assert len(timeline) == 0
+
+
+def test_timeline_release_boundary():
+    """
+    Release commands at the time of a command, and just before it.
+    Expect commands at or before the release time, and the others to remain.
+    """
+    timeline = Timeline([0.0, 1.0, 1.0, 2.0], ['A', 'B', 'C', 'D'])
+    assert timeline.release(0.999) == ['A']
+    assert timeline.release(1.0) == ['B', 'C']
+    assert timeline.release(1.0) == []
+    assert timeline.data() == ([2.0], ['D'])
+
+
+@pytest.mark.parametrize('nmerge', [3, 15, 16, 200])
+def test_timeline_merge(nmerge):
+    """
+    Merge small (pushed one by one) and large (heapified) batches of
+    commands into an existing timeline.
+    Expect the same order as a stable sort on time.
+    """
+    times = [float((7 * i) % 10) for i in range(20)]
+    timeline = Timeline(times, [f'A{i}' for i in range(20)])
+    newtimes = [float((3 * i) % 10) for i in range(nmerge)]
+    timeline.merge(newtimes, [f'B{i}' for i in range(nmerge)])
+
+    alltimes = times + newtimes
+    allcmds = [f'A{i}' for i in range(20)] + [f'B{i}' for i in range(nmerge)]
+    expected = [cmd for _, cmd in sorted(zip(alltimes, allcmds), key=lambda e: e[0])]
+    assert timeline.release(10.0) == expected
+
+
+def test_scendata_roundtrip(scenstack):
+    """
+    Set scenario data, get it back, and set it again.
+    Expect the sorted scenario data, and the same data after the round trip.
+    """
+    stackbase.set_scendata([2.0, 0.0, 2.0, 1.0], ['C', 'A', 'D', 'B'])
+    data = stackbase.get_scendata()
+    assert data == ([0.0, 1.0, 2.0, 2.0], ['A', 'B', 'C', 'D'])
+    stackbase.set_scendata(*data)
+    assert stackbase.get_scendata() == data
+
+    # Getting the data doesn't change the order of release
+    assert scenstack.scen.release(2.0) == ['A', 'B', 'C', 'D']
+
+
+def test_checkscen(scenstack, monkeypatch):
+    """
+    Check the scenario at the simulation time of a command.
+    Expect commands at or before the simulation time on the command stack.
+    """
+    stackbase.set_scendata([0.0, 1.0, 1.5], ['A', 'B;C', 'D'])
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(simt=1.0))
+    stackbase.checkscen()
+    assert [cmd for cmd, _ in scenstack.cmdstack] == ['A', 'B', 'C']
+    assert len(scenstack.scen) == 1
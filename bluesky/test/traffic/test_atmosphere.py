@@ -0,0 +1,39 @@
+"""
+Tests the memoized ISA atmosphere service
+"""
+import numpy as np
+import pytest
+from bluesky.tools import aero
+
+
+def test_atmosphere_exact_memo():
+    """
+    Get the atmosphere twice for the same altitudes.
+    Expect the exact ISA values, and the memoized arrays the second time.
+    """
+    atm = aero.Atmosphere()
+    h = np.linspace(-500.0, 24000.0, 1001)
+    p, rho, T, a = atm(h)
+    pref, rhoref, Tref = aero.vatmos(h)
+    assert np.array_equal(p, pref)
+    assert np.array_equal(rho, rhoref)
+    assert np.array_equal(T, Tref)
+    assert np.array_equal(a, np.sqrt(aero.gamma * aero.R * Tref))
+
+    assert atm(h.copy())[1] is rho
+    assert not rho.flags.writeable
+
+
+@pytest.mark.parametrize('dh', [1.0, 10.0])
+def test_atmosphere_table_error(dh):
+    """
+    Get the atmosphere in lookup-table mode, also outside of the table.
+    Expect a relative error within the documented bound.
+    """
+    atm = aero.Atmosphere(table=True, dh=dh)
+    h = np.random.default_rng(1).uniform(-2000.0, 30000.0, 10000)
+    p, rho, T, _ = atm(h)
+    pref, rhoref, Tref = aero.vatmos(h)
+    assert np.all(np.abs(rho / rhoref - 1.0) <= 3.2e-9 * dh * dh)
+    assert np.all(np.abs(p / pref - 1.0) <= 3.2e-9 * dh * dh)
+    assert np.array_equal(T, Tref)
@@ -0,0 +1,58 @@
+"""
+Tests the in-place kinematics integrator
+"""
+import numpy as np
+import pytest
+
+
+# Traffic state that is integrated by the kinematics
+STATE = ('lat', 'lon', 'alt', 'hdg', 'trk', 'tas', 'gs', 'gsnorth', 'gseast',
+         'cas', 'M', 'vs', 'ax', 'windnorth', 'windeast', 'coslat',
+         'distflown', 'work', 'swhdgsel')
+
+
+def integrate(traffic_, inplace, nsteps=100):
+    for _ in range(nsteps):
+        if inplace:
+            traffic_.kinematics.update(traffic_)
+        else:
+            traffic_.update_airspeed()
+            traffic_.update_groundspeed()
+            traffic_.update_pos()
+    return {name: getattr(traffic_, name).copy() for name in STATE + ('az', 'swaltsel')}
+
+
+@pytest.mark.parametrize('wind', [False, True])
+def test_kinematics_inplace_equivalence(traffic_, wind):
+    """
+    Integrate a set of manoeuvring aircraft with the default and the
+    in-place integrator, starting from the same state.
+    Expect bit-identical results.
+    """
+    traffic_.reset()
+    n = 50
+    rng = np.random.default_rng(42)
+    traffic_.cre([f'KIN{i}' for i in range(n)], 'B744', rng.uniform(50.0, 54.0, n),
+                 rng.uniform(2.0, 6.0, n), rng.uniform(0.0, 360.0, n),
+                 rng.uniform(0.0, 10000.0, n), rng.uniform(0.0, 250.0, n))
+    if wind:
+        traffic_.wind.add(52.0, 4.0, 270.0, 30.0)
+
+    # Give half of the aircraft new targets for speed, heading and altitude
+    apo = traffic_.aporasas
+    apo.tas = traffic_.tas + rng.normal(0.0, 20.0, n) * (np.arange(n) % 2)
+    apo.hdg = (traffic_.hdg + rng.normal(0.0, 90.0, n) * (np.arange(n) % 2)) % 360.0
+    apo.alt = traffic_.alt + rng.normal(0.0, 1000.0, n) * (np.arange(n) % 2)
+    apo.vs = np.full(n, 10.0)
+
+    initial = {name: getattr(traffic_, name).copy() for name in STATE}
+    expected = integrate(traffic_, inplace=False)
+    for name, value in initial.items():
+        setattr(traffic_, name, value.copy())
+    result = integrate(traffic_, inplace=True)
+
+    for name, value in expected.items():
+        assert np.array_equal(result[name], value, equal_nan=True), name
+
+    traffic_.wind.clear()
+    traffic_.reset()
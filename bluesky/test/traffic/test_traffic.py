@@ -8,6 +8,7 @@ Author <ahfarrell@sparkl.com> Andrew Farrell
 Tests traffic module
 """
 
+import pytest
 from bluesky.tools.aero import casormach
 
 
@@ -146,4 +147,44 @@ def test_traffic_reset(traffic_):
     validate_lengths(traffic_, 0)
 
 
+def test_traffic_id2idx(traffic_):
+    """
+    Test callsign lookup after creation and deletion.
+
+    Expects the lookup table to follow index shifts after a delete,
+    and to be cleared on reset.
+    """
+    traffic_.cre(['ID1', 'ID2', 'ID3'], 'A320', 52.0, 4.0, 90, 3000, 250)
+    assert traffic_.id2idx('ID2') == traffic_.ntraf - 2
+    assert traffic_.id2idx(['ID3', 'ID0']) == [traffic_.ntraf - 1, -1]
+
+    traffic_.delete(traffic_.id2idx('ID2'))
+    assert traffic_.id2idx('ID2') == -1
+    assert traffic_.id2idx('id3') == traffic_.ntraf - 1
+    assert traffic_.id[traffic_.id2idx('ID1')] == 'ID1'
+
+    traffic_.reset()
+    assert traffic_.id2idx('ID1') == -1
+    assert not traffic_.idmap
+
+
+def test_traffic_create_mixed_types(traffic_):
+    """
+    Create aircraft of different types in one call.
+
+    Expects each aircraft to get the performance coefficients of its own
+    type (or of the default type when the type is unknown).
+    """
+    perf = traffic_.perf
+    if not hasattr(perf, 'coeff'):
+        pytest.skip('OpenAP performance model not selected')
+    types = ['A320', 'B744', 'XXXX']
+    traffic_.cre(['MX1', 'MX2', 'MX3'], types, 52.0, 4.0, 90, 3000, 250)
+    rows = perf.coeff.typeindex(types)
+    assert list(perf.typeid[-3:]) == list(rows)
+    assert perf.mass[-3] != perf.mass[-2]
+    assert perf.mass[-1] == perf.mass[-2]
+    traffic_.reset()
+
+
 # test remaining traffic functions
@@ -142,3 +142,75 @@ def test_trafficarrays_reset(t_a):
 
     assert not root.fl_list
     assert not root.children[0].np_array_bool
+
+
+@pytest.fixture
+def t_prealloc():
+    """
+    TrafficArrays tree with preallocated (capacity-based) storage.
+    """
+    from bluesky import settings
+
+    class PreallocChild(TrafficArrays):
+        """ Child object with one float and one bool array. """
+        def __init__(self):
+            super().__init__()
+            with self.settrafarrays():
+                self.np_array_fl = np.array([])
+                self.np_array_bool = np.array([], dtype=bool)
+
+    class PreallocRoot(TrafficArrays):
+        """ Root object with an array, a list, and a child. """
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            with self.settrafarrays():
+                self.np_array_fl = np.array([])
+                self.str_list = []
+                self.child = PreallocChild()
+
+    oldroot = TrafficArrays.root
+    settings.traf_prealloc = True
+    yield PreallocRoot()
+    settings.traf_prealloc = False
+    TrafficArrays.setroot(oldroot)
+
+
+def test_trafficarrays_prealloc(t_prealloc):
+    """
+    Tests create and delete with preallocated storage: live arrays
+    should be views of length ntraf on storage that grows geometrically,
+    also when arrays are rebound in between.
+    """
+    root = t_prealloc
+    child = root.child
+    for i in range(100):
+        root.create()
+        root.create_children()
+        root.np_array_fl[-1] = i
+        child.np_array_fl[-1] = 2 * i
+        root.str_list[-1] = str(i)
+
+    assert len(root.np_array_fl) == len(child.np_array_bool) == 100
+    assert root.np_array_fl.base is not None
+    assert len(root.np_array_fl.base) >= 100
+
+    # Rebind an array, like Traffic.update does
+    root.np_array_fl = root.np_array_fl + 0.5
+    # Alias another object's array, like Trails does
+    child.np_array_fl = root.np_array_fl
+
+    root.delete(5)
+    root.delete(np.array([0, 10, 98]))
+
+    ref = np.delete(np.arange(100.0), [0, 5, 11, 99]) + 0.5
+    assert np.array_equal(root.np_array_fl, ref)
+    assert np.array_equal(child.np_array_fl, ref)
+    assert root.str_list == [str(int(v)) for v in ref - 0.5]
+    assert len(child.np_array_bool) == 96
+
+    root.reset()
+    assert len(root.np_array_fl) == len(child.np_array_fl) == 0
+    root.create(3)
+    root.create_children(3)
+    assert np.array_equal(child.np_array_fl, np.zeros(3))
@@ -0,0 +1,46 @@
+"""
+Tests the trails ring buffer
+"""
+import numpy as np
+import bluesky
+from bluesky.traffic.trails import Trails
+
+
+def test_trails_ringbuffer(traffic_):
+    """
+    Add more trail segments than fit in the buffer.
+    Expect that only the newest segments are kept, and that the
+    send cursor returns each segment once.
+    """
+    traffic_.reset()
+    traffic_.cre(['TR1', 'TR2'], 'B744', np.array([52.0, 53.0]), np.array([4.0, 5.0]),
+                 90.0, 10000.0, 250.0)
+    trails = Trails(maxsegments=100)
+    assert len(trails.seglat0) == trails.maxsegments == 100
+    assert len(trails.lastlat) == traffic_.ntraf
+    trails.setTrails(True)
+
+    nsteps = trails.maxsegments // 2 + 5
+    nsent = 0
+    for i in range(1, nsteps + 1):
+        bluesky.sim.simt = i * (trails.dt + 1.0)
+        traffic_.lat[:] += 0.001
+        trails.update()
+        nsent += len(trails.getnew()[0])
+
+    assert trails.nseg == 2 * nsteps
+    assert nsent == 2 * nsteps
+    lat0, lon0, lat1, lon1, col = trails.foreground()
+    assert len(lat0) == len(col) == trails.maxsegments
+    assert np.array_equal(lat1[-2:], traffic_.lat)
+    assert len(trails.getnew()[0]) == 0
+
+    # Foreground moves to the background on buffer
+    trails.buffer()
+    assert len(trails.foreground()[0]) == 0
+    assert len(trails.background()[0]) == trails.maxsegments
+
+    trails.setTrails(False)
+    assert len(trails.background()[0]) == 0
+    traffic_._children.remove(trails)
+    traffic_.reset()
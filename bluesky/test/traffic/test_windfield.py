@@ -0,0 +1,86 @@
+"""
+Tests the gridded wind field and the per-aircraft wind cache
+"""
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+from bluesky.traffic.windfield import Windfield
+
+
+def make_grid(rng):
+    lats = np.arange(50.0, 54.01, 0.25)
+    lons = np.arange(2.0, 6.01, 0.25)
+    alts = np.sort(rng.uniform(100.0, 12000.0, 10))
+    vnorth = rng.normal(0.0, 20.0, (len(alts), len(lats), len(lons)))
+    veast = rng.normal(0.0, 20.0, vnorth.shape)
+    return lats, lons, alts, vnorth, veast
+
+
+def test_windfield_grid_trilinear():
+    """
+    Set a gridded wind field from scattered grid points, and get the
+    wind inside and outside of the grid.
+    Expect trilinear interpolation, and zero wind outside the grid.
+    """
+    rng = np.random.default_rng(1)
+    lats, lons, alts, vnorth, veast = make_grid(rng)
+    alt, lat, lon = np.meshgrid(alts, lats, lons, indexing='ij')
+    order = rng.permutation(alt.size)
+
+    wind = Windfield()
+    wind.addgridpoints(lat.ravel()[order], lon.ravel()[order], alt.ravel()[order],
+                       vnorth.ravel()[order], veast.ravel()[order])
+    assert wind.winddim == 3
+
+    n = 1000
+    lat = rng.uniform(49.0, 55.0, n)
+    lon = rng.uniform(1.0, 7.0, n)
+    alt = rng.uniform(alts[0], alts[-1], n)
+    vn, ve = wind.getdata(lat, lon, alt)
+
+    inside = (lat >= lats[0]) & (lat <= lats[-1]) & (lon >= lons[0]) & (lon <= lons[-1])
+    fn = RegularGridInterpolator((alts, lats, lons), vnorth)
+    fe = RegularGridInterpolator((alts, lats, lons), veast)
+    pos = np.array([alt, lat, lon]).T[inside]
+    assert np.allclose(vn[inside], fn(pos), rtol=0.0, atol=1e-12)
+    assert np.allclose(ve[inside], fe(pos), rtol=0.0, atol=1e-12)
+    assert np.all(vn[~inside] == 0.0) and np.all(ve[~inside] == 0.0)
+
+    # Wind of the lowest level below the grid
+    vn, ve = wind.getdata(lats[1], lons[2], 0.0)
+    assert (vn, ve) == (vnorth[0, 1, 2], veast[0, 1, 2])
+
+    wind.clear()
+    assert wind.winddim == 0 and wind.grid is None
+
+
+def test_windfield_cache(traffic_):
+    """
+    Get the wind for all aircraft with the wind cache enabled, after
+    moving some of the aircraft.
+    Expect updated wind only for the aircraft that moved far enough, and
+    for all aircraft when the wind field changes.
+    """
+    traffic_.reset()
+    n = 20
+    traffic_.cre([f'WND{i}' for i in range(n)], 'B744', np.linspace(51.0, 53.0, n),
+                 np.linspace(3.0, 5.0, n), 90.0, 5000.0, 250.0)
+    wind = traffic_.wind
+    wind.addgrid(*make_grid(np.random.default_rng(2)))
+    wind.setcache(60.0, 1.0, 100.0)
+
+    lat, lon, alt = traffic_.lat.copy(), traffic_.lon.copy(), traffic_.alt.copy()
+    vn0 = wind.getcached(lat, lon, alt)[0].copy()
+
+    lat[:5] += 0.1
+    lat[5:10] += 0.001
+    vn = wind.getcached(lat, lon, alt)[0]
+    assert np.array_equal(vn[:5], wind.getdata(lat[:5], lon[:5], alt[:5])[0])
+    assert np.array_equal(vn[5:], vn0[5:])
+
+    wind.addgrid(*make_grid(np.random.default_rng(3)))
+    vn = wind.getcached(lat, lon, alt)[0]
+    assert np.array_equal(vn, wind.getdata(lat, lon, alt)[0])
+
+    wind.setcache(0.0)
+    wind.clear()
+    traffic_.reset()
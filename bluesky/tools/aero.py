@@ -6,7 +6,7 @@ import numpy as np
 from bluesky import settings
 
 
-settings.set_variable_defaults(casmach_threshold=2.0)
+settings.set_variable_defaults(casmach_threshold=2.0, atmos_table=False, atmos_table_dh=1.0)
 # International standard atmpshere only up to 72000 ft / 22 km
 
 #
@@ -60,6 +60,8 @@ def casmachthr(threshold:float=None):
 #  International Standard Atmosphere up to 22 km
 #
 #   p,rho,T = vatmos(h)    # atmos as function of geopotential altitude h [m]
+#   p,rho,T,a = atmosphere(h) # memoized atmosphere service, used by the
+#                          # vectorized functions below
 #   a = vvsound(h)         # speed of sound [m/s] as function of h[m]
 #   p = vpressure(h)       # calls atmos but retruns only pressure [Pa]
 #   T = vtemperature(h)    # calculates temperature [K] (saves time rel to atmos)
@@ -120,6 +122,102 @@ def vtemp(h):
     return T
 
 
+class Atmosphere:
+    """ ISA atmosphere service for numpy arrays of altitudes.
+
+        Calling the service with an altitude array returns pressure [Pa],
+        density [kg/m3], temperature [K] and speed of sound [m/s]. The
+        results of the last few altitude arrays are memoized, keyed on
+        the contents of the altitude array, so that the atmosphere is
+        evaluated only once per simulation step, even though the traffic
+        and performance models ask for it several times. The returned
+        arrays are shared between all consumers, and are therefore
+        read-only.
+
+        In lookup-table mode, density (and therefore pressure) are
+        linearly interpolated in a table with altitude step dh [m], with
+        the tropopause (11 km) as one of the table nodes. The relative
+        interpolation error is bounded by 3.2e-9 * dh**2 (dh in m). The
+        table covers -1 km to 25 km, outside of which the exact formulas
+        are used. Temperature and speed of sound are always computed
+        exactly, as these are cheap.
+
+        Arguments:
+        - table: Use lookup-table mode
+        - dh: Altitude resolution of the lookup table [m]
+        - memosize: Number of altitude arrays to memoize
+    """
+    def __init__(self, table=False, dh=1.0, memosize=4):
+        self.memosize = memosize
+        self.memo = list()
+        self.dh = dh
+        self.settable(table)
+
+    def settable(self, table=True, dh=None):
+        """ Switch lookup-table mode on or off, optionally with a new resolution. """
+        self.table = table
+        self.dh = dh or self.dh
+        if table:
+            nlow = ceil(12000.0 / self.dh)
+            nhigh = ceil(14000.0 / self.dh)
+            self.hmin = 11000.0 - nlow * self.dh
+            self.hmax = 11000.0 + nhigh * self.dh
+            _, rho, _ = vatmos(self.hmin + self.dh * np.arange(nlow + nhigh + 1))
+            self.rhotab = rho
+            self.drhotab = np.diff(rho)
+        self.memo.clear()
+
+    def __call__(self, h):
+        """ Get p, rho, T, and a for altitude(s) h [m]. """
+        if not isinstance(h, np.ndarray) or h.ndim == 0:
+            return self.compute(h, table=False)
+
+        for i, (key, value) in enumerate(self.memo):
+            if key.shape == h.shape and np.array_equal(key, h):
+                if i:
+                    self.memo.insert(0, self.memo.pop(i))
+                return value
+
+        value = self.compute(h, self.table)
+        for arr in value:
+            arr.flags.writeable = False
+        self.memo.insert(0, (h.copy(), value))
+        del self.memo[self.memosize:]
+        return value
+
+    def compute(self, h, table):
+        """ Evaluate the atmosphere without memoization. """
+        if table:
+            T = vtemp(h)
+            rho = self.lookup(h)
+            p = rho * R * T
+        else:
+            p, rho, T = vatmos(h)
+        a = np.sqrt(gamma * R * T)
+        return p, rho, T, a
+
+    def lookup(self, h):
+        """ Interpolate density in the lookup table. """
+        x = h - self.hmin
+        x *= 1.0 / self.dh
+        i = x.astype(np.intp)
+        rho = self.drhotab.take(i, mode='clip')
+        x -= i
+        rho *= x
+        rho += self.rhotab.take(i, mode='clip')
+        if h.min() < self.hmin or h.max() > self.hmax:
+            outside = (h < self.hmin) | (h > self.hmax)
+            _, rho[outside], _ = vatmos(h[outside])
+        return rho
+
+    def clear(self):
+        """ Clear the memoized results. """
+        self.memo.clear()
+
+
+atmosphere = Atmosphere(settings.atmos_table, settings.atmos_table_dh)
+
+
 # Atmos wrappings:
 def vpressure(h):
     """ Calculate atmospheric pressure for a given altitude.
@@ -130,7 +228,7 @@ def vpressure(h):
         Returns:
         - p: Pressure [Pa]
     """
-    p, _, _ = vatmos(h)
+    p, _, _, _ = atmosphere(h)
     return p
 
 
@@ -143,7 +241,7 @@ def vdensity(h):
         Returns:
         - rho: Density [kg / m3]
     """
-    _, r, _ = vatmos(h)
+    _, r, _, _ = atmosphere(h)
     return r
 
 
@@ -156,8 +254,7 @@ def vvsound(h):
         Returns:
         - a: Speed of sound [m/s]
     """
-    T = vtemp(h)
-    a = np.sqrt(gamma * R * T)
+    _, _, _, a = atmosphere(h)
     return a
 
 
@@ -232,7 +329,7 @@ def vcas2tas(cas, h):
         Returns:
         - tas: True airspeed [m/s]
     """
-    p, rho, _ = vatmos(h)
+    p, rho, _, _ = atmosphere(h)
     qdyn = p0 * ((1.0 + rho0 * cas * cas / (7.0 * p0)) ** 3.5 - 1.0)
     tas = np.sqrt(7.0 * p / rho * ((1.0 + qdyn / p) ** (2.0 / 7.0) - 1.0))
 
@@ -251,7 +348,7 @@ def vtas2cas(tas, h):
         Returns:
         cas: Calibrated airspeed [m/s]
     """
-    p, rho, _ = vatmos(h)
+    p, rho, _, _ = atmosphere(h)
     qdyn = p*((1.+rho*tas*tas/(7.*p))**3.5-1.)
     cas = np.sqrt(7.*p0/rho0*((qdyn/p0+1.)**(2./7.)-1.))
 
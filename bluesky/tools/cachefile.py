@@ -1,4 +1,9 @@
+import os
+import json
 import pickle
+import shutil
+import hashlib
+import numpy as np
 import bluesky as bs
 
 ## Default settings
@@ -57,3 +62,82 @@ class CacheFile():
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.file:
             self.file.close()
+
+
+class ColumnCache():
+    ''' Columnar cache for large tabular data, stored as one .npy file per column.
+
+        Numeric columns are memory-mapped when loading, so that processes that
+        load the same cache share its pages through the OS page cache. Lists of
+        strings are stored as string tables, and other lists as arrays that are
+        converted back to lists when loading.
+
+        The cache is invalidated automatically when any of the source files is
+        modified: its directory name is derived from the version and the
+        modification times and sizes of the source files. '''
+    def __init__(self, name, sources, version_ref='1'):
+        self.name = name
+        key = hashlib.sha1(str(version_ref).encode())
+        for source in sources:
+            try:
+                stat = os.stat(source)
+                key.update(f'{source}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+            except OSError:
+                key.update(f'{source}:missing'.encode())
+        self.root = bs.resource(bs.settings.cache_path)
+        self.path = self.root.joinpath(f'{name}-{key.hexdigest()[:16]}')
+
+    def load(self):
+        ''' Load all columns from the cache. Returns a dict with the columns. '''
+        try:
+            with open(self.path / 'columns.json') as f:
+                columns = json.load(f)
+        except (OSError, ValueError):
+            raise CacheError('Cache not found or out of date: ' + str(self.path))
+        print('Reading cache:', self.path)
+
+        data = dict()
+        for col, (kind, count) in columns.items():
+            fname = self.path / f'{col}.npy'
+            if kind == 'str':
+                table = np.load(fname).tobytes().decode('utf-8')
+                data[col] = table.split('\0') if count else []
+            elif kind == 'list':
+                data[col] = np.load(fname).tolist()
+            else:
+                # Copy-on-write mapping: pages are shared until modified
+                data[col] = np.load(fname, mmap_mode='c')
+        return data
+
+    def dump(self, data):
+        ''' Store a dict of columns (numpy arrays or lists) in the cache. '''
+        tmp = self.path.with_name(f'{self.path.name}.tmp{os.getpid()}')
+        tmp.mkdir(parents=True, exist_ok=True)
+        print('Writing cache:', self.path)
+
+        columns = dict()
+        for col, values in data.items():
+            if isinstance(values, np.ndarray):
+                kind, arr = 'array', values
+            elif all(isinstance(v, str) for v in values):
+                kind = 'str'
+                arr = np.frombuffer('\0'.join(values).encode('utf-8'), dtype=np.uint8)
+            else:
+                kind, arr = 'list', np.array(values)
+            np.save(tmp / f'{col}.npy', arr)
+            columns[col] = (kind, len(values))
+
+        with open(tmp / 'columns.json', 'w') as f:
+            json.dump(columns, f)
+
+        # Move the complete cache in place. When another process was first,
+        # keep its cache and discard ours.
+        try:
+            os.rename(tmp, self.path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        # Remove caches of older versions of the source data
+        for old in self.root.glob(f'{self.name}-*'):
+            if old.is_dir() and old.name != self.path.name and '.tmp' not in old.name:
+                shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,266 @@
+''' Sim-side profiler for the simulation step.
+
+    When switched on with the PROFILE stack command, the profiler records the
+    wall time of each timed function (simtime preupdate/update functions),
+    each sub-stage of Traffic.update, and each stack command type, in rolling
+    histograms. The statistics can be printed, written to file, and are sent
+    periodically to clients on the PROFILE stream.
+
+    The profiler works by temporarily replacing the profiled functions with
+    timed wrappers, which are removed again when profiling is switched off.
+    When off, the simulation therefore runs its normal, uninstrumented code.
+'''
+import json
+from time import perf_counter
+import numpy as np
+
+import bluesky as bs
+from bluesky import settings
+from bluesky.core import simtime
+from bluesky.stack import command
+from bluesky.stack.cmdparser import Command
+
+
+# Register settings defaults
+settings.set_variable_defaults(log_path='output', profile_window=1000,
+                               profile_stream_dt=1.0)
+
+# Histogram bin edges [s]: four bins per decade, from 1 us to 10 s
+BINS = np.logspace(-6, 1, 29)
+
+# Sub-stages of Traffic.update that are profiled: (traffic sub-object, method).
+# Nested stages (such as cd.update within update_asas) are timed separately,
+# so their times are also included in the time of the enclosing stage.
+STAGES = (
+    (None, 'update'),
+    ('adsb', 'update'),
+    ('ap', 'update'),
+    (None, 'update_asas'),
+    ('cd', 'update'),
+    ('cr', 'update'),
+    ('aporasas', 'update'),
+    ('perf', 'update'),
+    ('perf', 'limits'),
+    (None, 'update_airspeed'),
+    (None, 'update_groundspeed'),
+    ('wind', 'getdata'),
+    (None, 'update_pos'),
+    ('turbulence', 'update'),
+    ('cond', 'update'),
+    ('trails', 'update')
+)
+
+# Profiler state
+active = False
+# Rolling histograms per group ('timed', 'traffic', 'stack') and name
+histograms = dict(timed=dict(), traffic=dict(), stack=dict())
+# Original functions, stored while profiling is on
+_originals = dict()
+# Installed wrappers of traffic stages: (object, method name, wrapper, original)
+_stages = list()
+# Wall time of the next PROFILE stream update
+_tnext = 0.0
+
+
+class RollingHistogram:
+    ''' Wall-time samples of one profiled function, of which the last
+        'window' samples are used for statistics and histogram. '''
+    def __init__(self, window=None):
+        self.samples = np.zeros(window or settings.profile_window)
+        self.count = 0
+
+    def add(self, dt):
+        ''' Add a wall-time sample [s]. '''
+        self.samples[self.count % len(self.samples)] = dt
+        self.count += 1
+
+    def window(self):
+        ''' Return the samples in the rolling window. '''
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def stats(self):
+        ''' Return statistics and histogram counts over the rolling window. '''
+        window = self.window()
+        return dict(count=self.count, n=len(window), total=float(window.sum()),
+                    mean=float(window.mean()), p50=float(np.percentile(window, 50)),
+                    p95=float(np.percentile(window, 95)), max=float(window.max()),
+                    hist=np.histogram(window, BINS)[0].tolist())
+
+
+def record(group, name, dt):
+    ''' Add a wall-time sample to the histogram of name in group. '''
+    hist = histograms[group].get(name)
+    if hist is None:
+        hist = histograms[group][name] = RollingHistogram()
+    hist.add(dt)
+
+
+def timed(group, name, fun):
+    ''' Return a wrapper of fun that records the wall time of each call.
+        Manually-timed functions (such as update_asas and perf.update) return
+        immediately when their timer is not due. Only the calls in which they
+        actually ran are recorded. '''
+    timer = getattr(fun, '__manualtimer__', None)
+
+    def wrapper(*args, **kwargs):
+        if timer is not None and timer.counter != 0:
+            return fun(*args, **kwargs)
+        t0 = perf_counter()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            record(group, name, perf_counter() - t0)
+    return wrapper
+
+
+def trigger_all(funs):
+    ''' Trigger timed functions, and record the wall time of those that are
+        due in this timestep. '''
+    for name, fun in funs.items():
+        if fun.timer is None or fun.timer.counter == 0:
+            t0 = perf_counter()
+            fun.trigger()
+            record('timed', name, perf_counter() - t0)
+        else:
+            fun.trigger()
+
+
+def profiled_call(call):
+    ''' Return a profiled replacement of Command.__call__, which records
+        the wall time per stack command. '''
+    def wrapper(self, argstring):
+        t0 = perf_counter()
+        try:
+            return call(self, argstring)
+        finally:
+            record('stack', self.name, perf_counter() - t0)
+    return wrapper
+
+
+def preupdate():
+    ''' Profiled replacement of simtime.preupdate. '''
+    # Implementations of replaceable traffic objects can be selected
+    # at any time, which replaces the profiled methods. Reinstall if needed.
+    if any(vars(obj).get(method) is not wrapper for obj, method, wrapper, _ in _stages):
+        install_stages()
+    trigger_all(simtime.preupdate_funs)
+
+
+def update():
+    ''' Profiled replacement of simtime.update. '''
+    global _tnext
+    trigger_all(simtime.update_funs)
+
+    # Send profiler statistics to clients at a fixed wall-time interval
+    if perf_counter() >= _tnext:
+        _tnext = perf_counter() + settings.profile_stream_dt
+        bs.net.send_stream(b'PROFILE', getstats())
+
+
+def install_stages():
+    ''' Replace the profiled methods of Traffic and its sub-objects with
+        timed wrappers in the instance dicts of these objects.
+        For replaceable sub-objects these are the dicts of their proxies. '''
+    uninstall_stages()
+    for objname, method in STAGES:
+        obj = getattr(bs.traf, objname) if objname else bs.traf
+        objvars = vars(obj)
+        name = f'{objname}.{method}' if objname else method
+        wrapper = timed('traffic', name, getattr(obj, method))
+        _stages.append((obj, method, wrapper, objvars.get(method)))
+        objvars[method] = wrapper
+
+
+def uninstall_stages():
+    ''' Restore the original methods of Traffic and its sub-objects. '''
+    for obj, method, wrapper, orig in reversed(_stages):
+        objvars = vars(obj)
+        if objvars.get(method) is not wrapper:
+            # Already replaced by the selection of another implementation
+            continue
+        if orig is None:
+            del objvars[method]
+        else:
+            objvars[method] = orig
+    _stages.clear()
+
+
+def start():
+    ''' Switch on profiling. '''
+    global active, _tnext
+    if active:
+        return
+    active = True
+    _tnext = 0.0
+    _originals.update(preupdate=simtime.preupdate, update=simtime.update,
+                      call=Command.__call__)
+    simtime.preupdate = preupdate
+    simtime.update = update
+    Command.__call__ = profiled_call(_originals['call'])
+    install_stages()
+
+
+def stop():
+    ''' Switch off profiling, and restore all original functions. '''
+    global active
+    if not active:
+        return
+    active = False
+    uninstall_stages()
+    simtime.preupdate = _originals.pop('preupdate')
+    simtime.update = _originals.pop('update')
+    Command.__call__ = _originals.pop('call')
+
+
+def reset():
+    ''' Clear all recorded samples. Called when the simulation is reset. '''
+    for group in histograms.values():
+        group.clear()
+
+
+def getstats():
+    ''' Return the statistics of all profiled functions per group. '''
+    return {group: {name: hist.stats() for name, hist in hists.items()}
+            for group, hists in histograms.items()}
+
+
+def stats2txt(stats):
+    ''' Format profiler statistics as a text table, slowest first per group. '''
+    lines = [f'{"name":<32}{"calls":>8}{"mean[ms]":>10}{"p95[ms]":>10}{"max[ms]":>10}']
+    for group, groupstats in stats.items():
+        if not groupstats:
+            continue
+        lines.append(f'--- {group} ---')
+        for name, s in sorted(groupstats.items(), key=lambda item: -item[1]['total']):
+            lines.append(f'{name[:31]:<32}{s["count"]:>8}{1e3 * s["mean"]:>10.3f}'
+                         f'{1e3 * s["p95"]:>10.3f}{1e3 * s["max"]:>10.3f}')
+    return '\n'.join(lines)
+
+
+@command(name='PROFILE', aliases=('STATS',))
+def profile(cmd: 'txt' = '', fname: 'word' = ''):
+    ''' PROFILE: Profile the wall time of the simulation step.
+
+        Arguments:
+        - cmd: ON/OFF to switch profiling on or off,
+               DUMP to show the statistics (or write them as JSON to fname),
+               RESET to clear the statistics
+        - fname: Optional filename for DUMP
+    '''
+    if cmd == 'ON':
+        start()
+        return True, 'Profiling switched on'
+    if cmd == 'OFF':
+        stop()
+        return True, 'Profiling switched off'
+    if cmd == 'RESET':
+        reset()
+        return True, 'Profiler statistics cleared'
+    if cmd == 'DUMP' and fname:
+        fpath = bs.resource(settings.log_path) / fname
+        with open(fpath, 'w') as f:
+            json.dump(getstats(), f, indent=2)
+        return True, f'Profiler statistics written to {fpath}'
+    if cmd in ('', 'DUMP'):
+        return True, f'Profiling is {"on" if active else "off"}\n' + stats2txt(getstats())
+    return False, f'Unknown PROFILE argument: {cmd}'
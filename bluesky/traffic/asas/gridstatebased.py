@@ -0,0 +1,195 @@
+''' State-based conflict detection with spatial pruning of aircraft pairs. '''
+import numpy as np
+from bluesky.tools import geo
+from bluesky.tools.aero import nm, Rearth
+from bluesky.traffic.asas.statebased import StateBased
+
+
+class GridStateBased(StateBased):
+    ''' State-based conflict detection that only evaluates aircraft pairs
+        that can be in conflict within the lookahead time.
+
+        Aircraft are bucketed in a lat/lon/altitude grid. The horizontal
+        cell size is the largest protected zone radius plus the distance
+        two aircraft can close in the lookahead time at the largest ground
+        speed; the vertical cell size is derived in the same way from the
+        protected zone height and vertical speed. Only pairs in neighbouring
+        cells are passed to the (exact) CPA calculation, so the result is
+        identical to StateBased, without its ntraf x ntraf matrices.
+    '''
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        idx1, idx2 = gridpairs(ownship, intruder, rpz, hpz, dtlookahead)
+        return detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, idx1, idx2)
+
+
+def gridpairs(ownship, intruder, rpz, hpz, dtlookahead):
+    ''' Return index arrays (idx1, idx2) of all candidate pairs of ownship and
+        intruder aircraft that are close enough to possibly be in conflict.
+        Ownship-ownship pairs are not included. '''
+    ntraf = ownship.ntraf
+    if ntraf < 2:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    # Search radii: current separation beyond which no conflict can occur
+    # within the lookahead time, even for head-on encounters
+    dtlook = np.max(dtlookahead)
+    gsmax = max(np.max(ownship.gs), np.max(intruder.gs))
+    vsmax = max(np.max(np.abs(ownship.vs)), np.max(np.abs(intruder.vs)))
+    rhor = np.max(rpz) + 2.0 * gsmax * max(dtlook, 0.0) + 1.0
+    rver = np.max(hpz) + 2.0 * vsmax * max(dtlook, 0.0) + 1.0
+
+    # Cell sizes. Longitude cells are widened with the highest latitude
+    # in traffic, so that they are conservative for all aircraft pairs
+    allat = np.concatenate((ownship.lat, intruder.lat))
+    maxabslat = np.max(np.abs(allat))
+    dlat = np.degrees(rhor / Rearth)
+    coslat = np.cos(np.radians(min(maxabslat + dlat, 90.0)))
+    dlon = np.degrees(rhor / Rearth / max(coslat, 1e-9))
+
+    # Longitude wraps around the dateline. With less than three columns
+    # neighbouring cells overlap, so then use a single column.
+    ncol = int(360.0 // dlon) if dlon < 120.0 else 1
+    nrow = int(180.0 // dlat) + 1 if dlat < 60.0 else 1
+
+    def cellkeys(lat, lon, alt):
+        ''' Cell coordinates of each aircraft. Rows and layers are padded
+            by one, so neighbour offsets never alias to another cell. '''
+        row = np.clip(((lat + 90.0) // dlat).astype(np.int64), 0, nrow - 1) + 1 \
+            if nrow > 1 else np.ones(len(lat), dtype=np.int64)
+        col = (((lon + 180.0) % 360.0) // (360.0 / ncol)).astype(np.int64) % ncol
+        lay = (alt // rver).astype(np.int64)
+        return row, col, lay
+
+    orow, ocol, olay = cellkeys(ownship.lat, ownship.lon, ownship.alt)
+    irow, icol, ilay = cellkeys(intruder.lat, intruder.lon, intruder.alt)
+    laymin = min(np.min(olay), np.min(ilay)) - 1
+    olay -= laymin
+    ilay -= laymin
+    nlay = max(np.max(olay), np.max(ilay)) + 2
+    nrows = nrow + 2
+
+    def combine(row, col, lay):
+        return (col * nrows + row) * nlay + lay
+
+    # Sort intruders by cell key, so each cell is a contiguous slice
+    ikeys = combine(irow, icol, ilay)
+    order = np.argsort(ikeys, kind='stable')
+    skeys = ikeys[order]
+
+    rowoffsets = (-1, 0, 1) if nrow > 1 else (0,)
+    coloffsets = (-1, 0, 1) if ncol > 1 else (0,)
+    own = np.arange(ntraf)
+    idx1, idx2 = [], []
+    for dr in rowoffsets:
+        for dc in coloffsets:
+            for dl in (-1, 0, 1):
+                keys = combine(orow + dr, (ocol + dc) % ncol, olay + dl)
+                start = np.searchsorted(skeys, keys, side='left')
+                count = np.searchsorted(skeys, keys, side='right') - start
+                total = np.sum(count)
+                if total == 0:
+                    continue
+                # Expand each (start, count) range into individual pairs
+                own_rep = np.repeat(own, count)
+                pos = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+                idx1.append(own_rep)
+                idx2.append(order[np.repeat(start, count) + pos])
+
+    if not idx1:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    idx1 = np.concatenate(idx1)
+    idx2 = np.concatenate(idx2)
+
+    # Remove ownship-ownship pairs
+    keep = idx1 != idx2
+    return idx1[keep], idx2[keep]
+
+
+def detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, idx1, idx2):
+    ''' State-based conflict detection for the aircraft pairs (idx1, idx2).
+        Applies the same CPA calculations as StateBased.detect, but per pair
+        instead of for the full ntraf x ntraf matrix. '''
+    # Horizontal conflict ------------------------------------------------------
+    qdr, dist = geo.kwikqdrdist(ownship.lat[idx1], ownship.lon[idx1],
+                                intruder.lat[idx2], intruder.lon[idx2])
+    dist = dist * nm
+
+    # Calculate horizontal closest point of approach (CPA)
+    qdrrad = np.radians(qdr)
+    dx = dist * np.sin(qdrrad)  # is pos j rel to i
+    dy = dist * np.cos(qdrrad)  # is pos j rel to i
+
+    # Relative velocity of intruder w.r.t. ownship
+    owntrkrad = np.radians(ownship.trk[idx1])
+    inttrkrad = np.radians(intruder.trk[idx2])
+    du = intruder.gs[idx2] * np.sin(inttrkrad) - ownship.gs[idx1] * np.sin(owntrkrad)
+    dv = intruder.gs[idx2] * np.cos(inttrkrad) - ownship.gs[idx1] * np.cos(owntrkrad)
+
+    dv2 = du * du + dv * dv
+    dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
+    vrel = np.sqrt(dv2)
+
+    tcpa = -(du * dx + dv * dy) / dv2
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
+
+    # Check for horizontal conflict
+    # RPZ can differ per aircraft, get the largest value per aircraft pair
+    pairrpz = np.maximum(rpz[idx1], rpz[idx2])
+    R2 = pairrpz * pairrpz
+    swhorconf = dcpa2 < R2  # conflict or not
+
+    # Calculate times of entering and leaving horizontal conflict
+    dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
+    dtinhor = dxinhor / vrel
+
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
+
+    # Vertical conflict --------------------------------------------------------
+
+    # Vertical crossing of disk (-dh,+dh)
+    dalt = intruder.alt[idx2] - ownship.alt[idx1]
+    dvs = intruder.vs[idx2] - ownship.vs[idx1]
+    dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
+
+    # Check for passing through each others zone
+    # hPZ can differ per aircraft, get the largest value per aircraft pair
+    pairhpz = np.maximum(hpz[idx1], hpz[idx2])
+    tcrosshi = (dalt + pairhpz) / -dvs
+    tcrosslo = (dalt - pairhpz) / -dvs
+    tinver = np.minimum(tcrosshi, tcrosslo)
+    toutver = np.maximum(tcrosshi, tcrosslo)
+
+    # Combine vertical and horizontal conflict----------------------------------
+    tinconf = np.maximum(tinver, tinhor)
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf * (tinconf <= toutconf) * (toutconf > 0.0) * \
+        (tinconf < dtlookahead[idx1])
+    swlos = (dist < pairrpz) * (np.abs(dalt) < pairhpz)
+
+    # Keep the row-major pair order of the matrix-based implementation
+    iconf = np.flatnonzero(swconfl)
+    iconf = iconf[np.lexsort((idx2[iconf], idx1[iconf]))]
+    ilos = np.flatnonzero(swlos)
+    ilos = ilos[np.lexsort((idx2[ilos], idx1[ilos]))]
+
+    # --------------------------------------------------------------------------
+    # Update conflict lists
+    # --------------------------------------------------------------------------
+    # Ownship conflict flag and max tCPA
+    inconf = np.zeros(ownship.ntraf, dtype=bool)
+    inconf[idx1[iconf]] = True
+    tcpamax = np.zeros(ownship.ntraf)
+    np.maximum.at(tcpamax, idx1[iconf], tcpa[iconf])
+
+    # Select conflicting pairs: each a/c gets their own record
+    confpairs = [(ownship.id[i], intruder.id[j]) for i, j in zip(idx1[iconf], idx2[iconf])]
+    lospairs = [(ownship.id[i], intruder.id[j]) for i, j in zip(idx1[ilos], idx2[ilos])]
+
+    return confpairs, lospairs, inconf, tcpamax, \
+        qdr[iconf], dist[iconf], np.sqrt(dcpa2[iconf]), \
+        tcpa[iconf], tinconf[iconf]
@@ -161,41 +161,12 @@ class MVP(ConflictResolution):
 
     def resolve(self, conf, ownship, intruder):
         ''' Resolve all current conflicts '''
-        # Initialize an array to store the resolution velocity vector for all A/C
-        dv = np.zeros((ownship.ntraf, 3))
-
-        # Initialize an array to store time needed to resolve vertically
-        timesolveV = np.ones(ownship.ntraf) * 1e9
-
-        # Call MVP function to resolve conflicts-----------------------------------
-        for ((ac1, ac2), qdr, dist, tcpa, tLOS) in zip(conf.confpairs, conf.qdr, conf.dist, conf.tcpa, conf.tLOS):
-            idx1 = ownship.id.index(ac1)
-            idx2 = intruder.id.index(ac2)
-
-            # If A/C indexes are found, then apply MVP on this conflict pair
-            # Because ADSB is ON, this is done for each aircraft separately
-            if idx1 >-1 and idx2 > -1:
-                dv_mvp, tsolV = self.MVP(ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2)
-                if tsolV < timesolveV[idx1]:
-                    timesolveV[idx1] = tsolV
-
-                # Use priority rules if activated
-                if self.swprio:
-                    dv[idx1], _ = self.applyprio(dv_mvp, dv[idx1], dv[idx2], ownship.vs[idx1], intruder.vs[idx2])
-                else:
-                    # since cooperative, the vertical resolution component can be halved, and then dv_mvp can be added
-                    dv_mvp[2] = 0.5 * dv_mvp[2]
-                    dv[idx1] = dv[idx1] - dv_mvp
-
-                # Check the noreso aircraft. Nobody avoids noreso aircraft.
-                # But noreso aircraft will avoid other aircraft
-                if self.noresoac[idx2]:
-                    dv[idx1] = dv[idx1] + dv_mvp
-
-                # Check the resooff aircraft. These aircraft will not do resolutions.
-                if self.resooffac[idx1]:
-                    dv[idx1] = 0.0
-
+        # Use the pair-batched MVP, unless a derived class reimplements
+        # the per-pair MVP calculation or the priority rules
+        if type(self).MVP is MVP.MVP and type(self).applyprio is MVP.applyprio:
+            dv, timesolveV = self.resolve_batch(conf, ownship, intruder)
+        else:
+            dv, timesolveV = self.resolve_pairwise(conf, ownship, intruder)
 
         # Determine new speed and limit resolution direction for all aicraft-------
 
@@ -264,6 +235,111 @@ class MVP(ConflictResolution):
         alt = alt * (1 - self.swresohoriz) + ownship.selalt * self.swresohoriz
         return newtrack, newgscapped, vscapped, alt
 
+    def resolve_pairwise(self, conf, ownship, intruder):
+        ''' Calculate the resolution vectors and vertical solve times of all
+            aircraft, calling MVP for one conflict pair at a time. '''
+        # Initialize an array to store the resolution velocity vector for all A/C
+        dv = np.zeros((ownship.ntraf, 3))
+
+        # Initialize an array to store time needed to resolve vertically
+        timesolveV = np.ones(ownship.ntraf) * 1e9
+
+        # Call MVP function to resolve conflicts-----------------------------------
+        for ((ac1, ac2), qdr, dist, tcpa, tLOS) in zip(conf.confpairs, conf.qdr, conf.dist, conf.tcpa, conf.tLOS):
+            idx1 = ownship.id2idx(ac1)
+            idx2 = intruder.id2idx(ac2)
+
+            # If A/C indexes are found, then apply MVP on this conflict pair
+            # Because ADSB is ON, this is done for each aircraft separately
+            if idx1 >-1 and idx2 > -1:
+                dv_mvp, tsolV = self.MVP(ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2)
+                if tsolV < timesolveV[idx1]:
+                    timesolveV[idx1] = tsolV
+
+                # Use priority rules if activated
+                if self.swprio:
+                    dv[idx1], _ = self.applyprio(dv_mvp, dv[idx1], dv[idx2], ownship.vs[idx1], intruder.vs[idx2])
+                else:
+                    # since cooperative, the vertical resolution component can be halved, and then dv_mvp can be added
+                    dv_mvp[2] = 0.5 * dv_mvp[2]
+                    dv[idx1] = dv[idx1] - dv_mvp
+
+                # Check the noreso aircraft. Nobody avoids noreso aircraft.
+                # But noreso aircraft will avoid other aircraft
+                if self.noresoac[idx2]:
+                    dv[idx1] = dv[idx1] + dv_mvp
+
+                # Check the resooff aircraft. These aircraft will not do resolutions.
+                if self.resooffac[idx1]:
+                    dv[idx1] = 0.0
+
+        return dv, timesolveV
+
+
+    def resolve_batch(self, conf, ownship, intruder):
+        ''' Calculate the resolution vectors and vertical solve times of all
+            aircraft, with MVP evaluated for all conflict pairs at once. '''
+        # Initialize an array to store the resolution velocity vector for all A/C
+        dv = np.zeros((ownship.ntraf, 3))
+
+        # Initialize an array to store time needed to resolve vertically
+        timesolveV = np.ones(ownship.ntraf) * 1e9
+
+        if not conf.confpairs:
+            return dv, timesolveV
+
+        # Only resolve pairs for which both A/C indexes are found
+        ac1, ac2 = zip(*conf.confpairs)
+        idx1 = np.array(ownship.id2idx(ac1), dtype=int)
+        idx2 = np.array(intruder.id2idx(ac2), dtype=int)
+        found = np.logical_and(idx1 > -1, idx2 > -1)
+        idx1, idx2 = idx1[found], idx2[found]
+
+        dv_mvp, tsolV = self.MVP_batch(ownship, intruder, conf,
+                                       np.asarray(conf.qdr)[found], np.asarray(conf.dist)[found],
+                                       np.asarray(conf.tcpa)[found], np.asarray(conf.tLOS)[found],
+                                       idx1, idx2)
+        np.minimum.at(timesolveV, idx1, tsolV)
+
+        # Factor for the vertical resolution component, and whether the
+        # ownship of each pair (partly) solves the conflict
+        vfac = np.full(len(idx1), 0.5)
+        solves = np.ones(len(idx1), dtype=bool)
+
+        # Use priority rules if activated (see applyprio)
+        if self.swprio:
+            # Ownship cruising and intruder climbing/descending, and vice versa
+            ownprio = np.logical_and(np.abs(ownship.vs[idx1]) < 0.1, np.abs(intruder.vs[idx2]) > 0.1)
+            intprio = np.logical_and(np.abs(intruder.vs[idx2]) < 0.1, np.abs(ownship.vs[idx1]) > 0.1)
+            if self.priocode == 'FF2':
+                solves = ~ownprio
+            elif self.priocode == 'FF3':
+                vfac[np.logical_or(ownprio, intprio)] = 0.0
+                solves = ~intprio
+            elif self.priocode == 'LAY1':
+                vfac[:] = 0.0
+                solves = ~ownprio
+            elif self.priocode == 'LAY2':
+                vfac[:] = 0.0
+                solves = ~intprio
+            elif self.priocode != 'FF1':
+                vfac[:] = 1.0
+                solves[:] = False
+        novert = vfac == 0.0
+        dv_mvp[~novert, 2] *= vfac[~novert]
+        dv_mvp[novert, 2] = 0.0
+
+        # Nobody avoids noreso aircraft. But noreso aircraft will avoid other aircraft
+        fac = self.noresoac[idx2].astype(float) - solves
+        apply = fac != 0.0
+        np.add.at(dv, idx1[apply], fac[apply, np.newaxis] * dv_mvp[apply])
+
+        # Check the resooff aircraft. These aircraft will not do resolutions.
+        dv[idx1[self.resooffac[idx1]]] = 0.0
+
+        return dv, timesolveV
+
+
     def MVP(self, ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2):
         """Modified Voltage Potential (MVP) resolution method"""
         # Preliminary calculations-------------------------------------------------
@@ -349,3 +425,78 @@ class MVP(ConflictResolution):
         dv = np.array([dv1, dv2, dv3])
 
         return dv, tsolV
+
+    def MVP_batch(self, ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2):
+        """Modified Voltage Potential (MVP) resolution method, evaluated for
+           arrays of conflict pairs. Returns an (npairs x 3) array of
+           resolution vectors, and the vertical solve time per pair."""
+        # Preliminary calculations-------------------------------------------------
+        # Determine largest RPZ and HPZ of the conflict pair, use lookahead of ownship
+        rpz_m = np.maximum(conf.rpz[idx1] * self.resofach, conf.rpz[idx2] * self.resofach)
+        hpz_m = np.maximum(conf.hpz[idx1] * self.resofacv, conf.hpz[idx2] * self.resofacv)
+        dtlook = conf.dtlookahead[idx1]
+        # Convert qdr from degrees to radians
+        qdr = np.radians(qdr)
+
+        # Relative position vector between id1 and id2
+        drelx = np.sin(qdr) * dist
+        drely = np.cos(qdr) * dist
+        drelz = intruder.alt[idx2] - ownship.alt[idx1]
+
+        # Relative velocity vector
+        vrelx = intruder.gseast[idx2] - ownship.gseast[idx1]
+        vrely = intruder.gsnorth[idx2] - ownship.gsnorth[idx1]
+        vrelz = intruder.vs[idx2] - ownship.vs[idx1]
+
+        # Horizontal resolution----------------------------------------------------
+
+        # Find horizontal distance at the tcpa (min horizontal distance)
+        dcpax = drelx + vrelx * tcpa
+        dcpay = drely + vrely * tcpa
+        dabsH = np.sqrt(dcpax * dcpax + dcpay * dcpay)
+
+        # Compute horizontal intrusion
+        iH = rpz_m - dabsH
+
+        # Exception handlers for head-on conflicts
+        # This is done to prevent division by zero in the next step
+        headon = dabsH <= 10.
+        dabsH[headon] = 10.
+        dcpax[headon] = drely[headon] / dist[headon] * 10.
+        dcpay[headon] = -drelx[headon] / dist[headon] * 10.
+
+        # If intruder is outside the ownship PZ, then apply extra factor
+        # to make sure that resolution does not graze IPZ
+        # abs(tcpa) because it bcomes negative during intrusion.
+        outside = np.logical_and(rpz_m < dist, dabsH < dist)
+        dvfac = iH
+        erratum = np.cos(np.arcsin(rpz_m[outside] / dist[outside]) -
+                         np.arcsin(dabsH[outside] / dist[outside]))
+        dvfac[outside] = rpz_m[outside] / erratum - dabsH[outside]
+        dv1 = (dvfac * dcpax) / (np.abs(tcpa) * dabsH)
+        dv2 = (dvfac * dcpay) / (np.abs(tcpa) * dabsH)
+
+        # Vertical resolution------------------------------------------------------
+
+        # Compute the  vertical intrusion
+        # Amount of vertical intrusion dependent on vertical relative velocity
+        vertmove = np.abs(vrelz) > 0.0
+        iV = np.where(vertmove, hpz_m, hpz_m - np.abs(drelz))
+
+        # Get the time to solve the conflict vertically - tsolveV
+        tsolV = np.array(tLOS, dtype=float)
+        tsolV[vertmove] = np.abs(drelz[vertmove] / vrelz[vertmove])
+
+        # If the time to solve the conflict vertically is longer than the look-ahead time,
+        # because the the relative vertical speed is very small, then solve the intrusion
+        # within tinconf
+        slow = tsolV > dtlook
+        tsolV[slow] = tLOS[slow]
+        iV[slow] = hpz_m[slow]
+
+        # Compute the resolution velocity vector in the vertical direction
+        # The direction of the vertical resolution is such that the aircraft with
+        # higher climb/decent rate reduces their climb/decent rate
+        dv3 = np.where(vertmove, (iV / tsolV) * -np.sign(vrelz), iV / tsolV)
+
+        return np.column_stack((dv1, dv2, dv3)), tsolV
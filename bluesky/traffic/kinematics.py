@@ -0,0 +1,209 @@
+""" In-place kinematics integrator for Traffic.
+
+    Implements the same computations as Traffic.update_airspeed,
+    update_groundspeed and update_pos, in the same order of operations so
+    that the results are bit-identical, but writes all results into the
+    existing traffic arrays, using preallocated scratch buffers for the
+    intermediate results. This avoids the allocation of dozens of
+    temporary ntraf-sized arrays per simulation step.
+
+    Note that with this integrator the traffic state arrays keep their
+    identity between steps: code that keeps a reference to a traffic
+    array (i.e., without copying) to compare with in a later step will
+    see the updated values.
+"""
+import numpy as np
+import bluesky as bs
+from bluesky.tools.aero import fpm, ft, g0, Rearth, vtas2cas, vtas2mach
+
+
+class Kinematics:
+    """ In-place kinematics integrator with preallocated scratch buffers. """
+    def __init__(self):
+        self.size = -1
+
+    def scratch(self, n):
+        """ (Re)allocate the scratch buffers when the number of aircraft changed. """
+        if n == self.size:
+            return
+        self.size = n
+        self.f = [np.empty(n) for _ in range(5)]
+        self.m = [np.empty(n, dtype=bool) for _ in range(2)]
+        # Intermediate kinematic states that are not traffic arrays
+        self.az = np.empty(n)
+        self.swaltsel = np.empty(n, dtype=bool)
+
+    def update(self, traf):
+        """ Integrate the aircraft kinematics over one simulation timestep. """
+        self.scratch(traf.ntraf)
+        traf.az = self.az
+        traf.swaltsel = self.swaltsel
+        dt = bs.sim.simdt
+        self.update_airspeed(traf, dt)
+        self.update_groundspeed(traf, dt)
+        self.update_pos(traf, dt)
+
+    def update_airspeed(self, traf, dt):
+        ap = traf.aporasas
+        f0, f1, f2, f3, f4 = self.f
+        m0 = self.m[0]
+
+        # Compute horizontal acceleration
+        np.subtract(ap.tas, traf.tas, out=f0)  # delta_spd
+        np.abs(f0, out=f1)
+        np.multiply(dt, traf.perf.axmax, out=f2)
+        np.abs(f2, out=f2)
+        np.greater(f1, f2, out=m0)  # need_ax
+        np.sign(f0, out=f0)
+        np.multiply(m0, f0, out=traf.ax)
+        traf.ax *= traf.perf.axmax
+
+        # Update velocities
+        np.multiply(traf.ax, dt, out=f0)
+        f0 += traf.tas
+        np.copyto(traf.tas, f0, where=m0)
+        np.logical_not(m0, out=m0)
+        np.copyto(traf.tas, ap.tas, where=m0)
+        traf.cas[:] = vtas2cas(traf.tas, traf.alt)
+        traf.M[:] = vtas2mach(traf.tas, traf.alt)
+
+        # Turning bank triangle
+        np.multiply(traf.eps, traf.eps, out=f0)
+        np.greater(traf.ap.turnphi, f0, out=m0)
+        np.copyto(f1, traf.ap.bankdef)
+        np.copyto(f1, traf.ap.turnphi, where=m0)
+        np.maximum(traf.tas, traf.eps, out=f0)
+        np.divide(f1, f0, out=f1)
+        np.tan(f1, out=f1)
+        np.multiply(g0, f1, out=f1)
+        np.degrees(f1, out=f1)  # turnrate
+
+        np.subtract(ap.hdg, traf.hdg, out=f0)
+        f0 += 180
+        np.remainder(f0, 360, out=f0)
+        f0 -= 180  # delhdg
+        np.multiply(dt, f1, out=f2)
+        np.abs(f2, out=f3)
+        np.abs(f0, out=f4)
+        np.greater(f4, f3, out=traf.swhdgsel)
+
+        # Update heading
+        np.sign(f0, out=f0)
+        f2 *= f0
+        f2 += traf.hdg
+        np.logical_not(traf.swhdgsel, out=m0)
+        np.copyto(f2, ap.hdg, where=m0)
+        np.remainder(f2, 360.0, out=traf.hdg)
+
+        # Update vertical speed (alt select, capture and hold autopilot mode)
+        np.subtract(ap.alt, traf.alt, out=f0)  # delta_alt
+        np.multiply(dt, ap.vs, out=f1)
+        np.abs(f1, out=f1)
+        np.multiply(dt, traf.vs, out=f2)
+        np.abs(f2, out=f2)
+        np.maximum(f1, f2, out=f1)
+        np.multiply(1.05, f1, out=f1)
+        np.abs(f0, out=f2)
+        np.greater(f2, f1, out=self.swaltsel)
+
+        np.sign(f0, out=f0)
+        np.multiply(self.swaltsel, f0, out=f0)
+        np.abs(ap.vs, out=f1)
+        f0 *= f1  # target_vs
+        np.subtract(f0, traf.vs, out=f1)  # delta_vs
+        np.abs(f1, out=f2)
+        np.greater(f2, 300 * fpm, out=m0)  # need_az
+        np.sign(f1, out=f1)
+        np.multiply(m0, f1, out=self.az)
+        self.az *= 300 * fpm
+
+        np.multiply(self.az, dt, out=f1)
+        f1 += traf.vs
+        np.copyto(traf.vs, f1, where=m0)
+        np.logical_not(m0, out=m0)
+        np.copyto(traf.vs, f0, where=m0)
+        # fix vs nan issue
+        np.isfinite(traf.vs, out=m0)
+        np.logical_not(m0, out=m0)
+        np.copyto(traf.vs, 0.0, where=m0)
+
+    def update_groundspeed(self, traf, dt):
+        f0, f1, f2 = self.f[:3]
+        m0, m1 = self.m
+
+        # Compute ground speed and track from heading, airspeed and wind
+        np.radians(traf.hdg, out=f0)
+        if traf.wind.winddim == 0:  # no wind
+            np.cos(f0, out=f1)
+            np.multiply(traf.tas, f1, out=traf.gsnorth)
+            np.sin(f0, out=f1)
+            np.multiply(traf.tas, f1, out=traf.gseast)
+
+            traf.gs[:] = traf.tas
+            traf.trk[:] = traf.hdg
+            traf.windnorth[:], traf.windeast[:] = 0.0, 0.0
+
+        else:
+            np.greater(traf.alt, 50. * ft, out=m0)  # Only apply wind when airborne
+
+            vnwnd, vewnd = traf.wind.getcached(traf.lat, traf.lon, traf.alt)
+            traf.windnorth[:], traf.windeast[:] = vnwnd, vewnd
+            np.cos(f0, out=f1)
+            np.multiply(traf.tas, f1, out=traf.gsnorth)
+            np.multiply(traf.windnorth, m0, out=f2)
+            traf.gsnorth += f2
+            np.sin(f0, out=f1)
+            np.multiply(traf.tas, f1, out=traf.gseast)
+            np.multiply(traf.windeast, m0, out=f2)
+            traf.gseast += f2
+
+            np.logical_not(m0, out=m1)
+            np.square(traf.gsnorth, out=f1)
+            np.square(traf.gseast, out=f2)
+            f1 += f2
+            np.sqrt(f1, out=f1)
+            np.multiply(m0, f1, out=f1)
+            np.multiply(m1, traf.tas, out=f2)
+            np.add(f2, f1, out=traf.gs)
+
+            np.arctan2(traf.gseast, traf.gsnorth, out=f1)
+            np.degrees(f1, out=f1)
+            np.multiply(m0, f1, out=f1)
+            np.remainder(f1, 360., out=f1)
+            np.multiply(m1, traf.hdg, out=f2)
+            np.add(f2, f1, out=traf.trk)
+
+        np.multiply(traf.gs, traf.gs, out=f1)
+        np.multiply(traf.vs, traf.vs, out=f2)
+        f1 += f2
+        np.sqrt(f1, out=f1)
+        np.multiply(traf.perf.thrust, dt, out=f2)
+        f2 *= f1
+        traf.work += f2
+
+    def update_pos(self, traf, dt):
+        f0 = self.f[0]
+        m0 = self.m[0]
+
+        # Update position
+        np.multiply(traf.vs, dt, out=f0)
+        f0 += traf.alt
+        np.round(f0, 6, out=f0)
+        np.copyto(traf.alt, f0, where=self.swaltsel)
+        np.logical_not(self.swaltsel, out=m0)
+        np.copyto(traf.alt, traf.aporasas.alt, where=m0)
+
+        np.multiply(dt, traf.gsnorth, out=f0)
+        f0 /= Rearth
+        np.degrees(f0, out=f0)
+        traf.lat += f0
+        np.deg2rad(traf.lat, out=f0)
+        np.cos(f0, out=traf.coslat)
+        np.multiply(dt, traf.gseast, out=f0)
+        f0 /= traf.coslat
+        f0 /= Rearth
+        np.degrees(f0, out=f0)
+        traf.lon += f0
+
+        np.multiply(traf.gs, dt, out=f0)
+        traf.distflown += f0
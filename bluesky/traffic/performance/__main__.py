@@ -0,0 +1,31 @@
+import argparse
+from bluesky import pathfinder, settings
+
+
+def main():
+    ''' Compile the performance coefficients into their binary bundles in the
+        cache directory, e.g., before starting a set of simulation nodes.
+        Bundles that are up to date with their source files are kept. '''
+    parser = argparse.ArgumentParser(prog='python -m bluesky.traffic.performance',
+                                     description='Build the BlueSky performance coefficient bundles')
+    parser.add_argument('--workdir', help='BlueSky working directory')
+    parser.add_argument('--configfile', help='Use this configuration file instead of settings.cfg')
+    args = parser.parse_args()
+
+    pathfinder.init(args.workdir)
+    settings.init(args.configfile)
+
+    from bluesky.traffic.performance.openap import coeff
+    coeff.Coefficient()
+
+    try:
+        # Raises an ImportError when the BADA files are not available
+        from bluesky.traffic.performance.bada import coeff_bada
+    except ImportError as e:
+        print(e.args[0])
+    else:
+        coeff_bada.init()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,10 @@
    https://www.eurocontrol.int/sites/default/files/field_tabs/content/documents/sesar/user-manual-bada-3-12.pdf
 '''
 import re
+from pathlib import Path
 from .fwparser import FixedWidthParser, ParseError
 import bluesky as bs
+from bluesky.tools import cachefile
 
 bs.settings.set_variable_defaults(perf_path_bada='performance/BADA')
 
@@ -68,6 +70,16 @@ accoeffs     = dict()
 release_date = 'Unknown'
 bada_version = 'Unknown'
 
+# Version of the compiled coefficient bundle. Increase this when the layout
+# of the bundle changes. Changes to the BADA files and to the modules that
+# parse them are detected from their modification times.
+bundle_version = 'c20261017'
+
+# Coefficients of the APF files, which are optional per aircraft
+APF_ATTRS = ('CAScl1', 'CAScl2', 'Mcl', 'CAScr1', 'CAScr2', 'Mcr', 'Mdes', 'CASdes2', 'CASdes1')
+# Attributes of Synonym
+SYN_ATTRS = ('is_equiv', 'accode', 'manufact', 'model', 'file', 'icao')
+
 
 def getCoefficients(actype):
     ''' Get a set of BADA coefficients for the given aircraft type.
@@ -100,10 +112,35 @@ def check():
     return True
 
 
+def bada_sources():
+    ''' Return the files the BADA coefficients are loaded from. '''
+    path = bs.resource(bs.settings.perf_path_bada)
+    files = [path / 'ReleaseSummary', path / 'SYNONYM.NEW']
+    files += sorted(path.glob('*.OPF')) + sorted(path.glob('*.APF'))
+    # Also invalidate the bundle when the parsers change
+    files += [Path(__file__), Path(__file__).with_name('fwparser.py')]
+    return files
+
+
 def init(bada_path=''):
-    ''' init() loads the available BADA datafiles in the provided directory.'''
+    ''' init() loads the available BADA datafiles in the provided directory.
+        The parsed coefficients are stored in a compiled bundle, which is used
+        instead of the datafiles as long as these are not modified. '''
     if accoeffs:
         return True
+    cache = cachefile.ColumnCache('bada', bada_sources(), bundle_version)
+    try:
+        from_columns(cache.load())
+    except cachefile.CacheError as e:
+        print(e.args[0])
+        if not load_bada():
+            return False
+        cache.dump(to_columns())
+    return (len(synonyms) > 0 and len(accoeffs) > 0)
+
+
+def load_bada():
+    ''' Parse the BADA datafiles. '''
     bada_path = bs.resource(bs.settings.perf_path_bada)
     releasefile = bada_path / 'ReleaseSummary'
     if releasefile.is_file():
@@ -158,6 +195,51 @@ def init(bada_path=''):
     return (len(synonyms) > 0 and len(accoeffs) > 0)
 
 
+def to_columns():
+    ''' Get the loaded synonyms and coefficients as columns for the bundle. '''
+    columns = {'release': [release_date, bada_version]}
+    syns = list(synonyms.values())
+    for attr in SYN_ATTRS:
+        columns['syn.' + attr] = [getattr(syn, attr) for syn in syns]
+
+    acs = list(accoeffs.values())
+    hasapf = [hasattr(ac, APF_ATTRS[0]) for ac in acs]
+    columns['ac.hasapf'] = hasapf
+    for attr in vars(acs[0]):
+        if attr in APF_ATTRS:
+            continue
+        columns['ac.' + attr] = [getattr(ac, attr) for ac in acs]
+    if any(hasapf):
+        # Aircraft without APF data get zero-filled placeholders
+        filler = [0] * len(getattr(acs[hasapf.index(True)], APF_ATTRS[0]))
+        for attr in APF_ATTRS:
+            columns['ac.' + attr] = [list(getattr(ac, attr)) if has else filler
+                                     for ac, has in zip(acs, hasapf)]
+    return columns
+
+
+def from_columns(columns):
+    ''' Restore the synonyms and coefficients from the columns of the bundle. '''
+    global release_date, bada_version
+    release_date, bada_version = columns['release']
+    print('Found BADA version %s (release date %s)' % (bada_version, release_date))
+
+    for values in zip(*(columns['syn.' + attr] for attr in SYN_ATTRS)):
+        syn = Synonym.__new__(Synonym)
+        syn.__dict__.update(zip(SYN_ATTRS, values))
+        synonyms[syn.accode] = syn
+
+    attrs = [col[3:] for col in columns if col.startswith('ac.') and col != 'ac.hasapf']
+    for i, hasapf in enumerate(columns['ac.hasapf']):
+        ac = ACData()
+        for attr in attrs:
+            if hasapf or attr not in APF_ATTRS:
+                setattr(ac, attr, columns['ac.' + attr][i])
+        accoeffs[ac.actype] = ac
+    print('%d aircraft entries and %d unique aircraft coefficient sets loaded'
+          % (len(synonyms), len(accoeffs)))
+
+
 class Synonym:
     def __init__(self, data):
         self.is_equiv = (data[0] == '*')           # False if model is directly supported in bada, true if supported through equivalent model
@@ -1,7 +1,9 @@
 """ OpenAP performance library. """
 import json
-import pandas as pd
+from pathlib import Path
+import numpy as np
 import bluesky as bs
+from bluesky.tools import cachefile
 
 
 bs.settings.set_variable_defaults(perf_path_openap="performance/OpenAP")
@@ -13,9 +15,56 @@ ENG_TYPE_TF = 1  # turbofan, fixwing
 ENG_TYPE_TP = 2  # turboprop, fixwing
 ENG_TYPE_TS = 3  # turboshlft, rotor
 
+# Per-type performance parameters in the compiled coefficient tables, with
+# the values used for parameters that don't apply to an aircraft type
+PARAMS = dict(
+    lifttype=0.0, mass=0.0, Sref=0.0, engnum=0, engpower=0.0, engthrmax=0.0,
+    engbpr=0.0, ff_coeff_a=0.0, ff_coeff_b=0.0, ff_coeff_c=0.0,
+    vmin=-1e6, vmax=1e6, vsmin=-1e6, vsmax=1e6, hmax=1e6, axmax=2.0,
+    vminic=0.0, vminer=0.0, vminap=0.0, vmaxic=0.0, vmaxer=0.0, vmaxap=0.0,
+    vminto=0.0, hcross=0.0, mmo=0.0,
+    cd0_clean=0.0, k_clean=0.0, cd0_to=0.0, k_to=0.0, cd0_ld=0.0, k_ld=0.0,
+    delta_cd_gear=0.0)
+
+# Default aircraft type, used for unknown types
+DEFAULT_ACTYPE = "B744"
+
+# Version of the compiled coefficient bundle. Increase this when the layout
+# of the compiled tables changes. Changes to the OpenAP data files and to the
+# modules that compile them are detected from their modification times.
+bundle_version = "c20261017"
+
+
+def openap_sources():
+    """Return the files the OpenAP coefficients are compiled from."""
+    path = bs.resource(bs.settings.perf_path_openap)
+    files = [path / fname for fname in ("synonym.dat", "fixwing/aircraft.json",
+                                        "fixwing/engines.csv", "fixwing/dragpolar.csv",
+                                        "rotor/aircraft.json")]
+    files += sorted((path / "fixwing/wrap").glob("*.txt"))
+    # Also invalidate the bundle when the compiler changes
+    files += [Path(__file__), Path(__file__).with_name("thrust.py")]
+    return files
+
 
 class Coefficient:
     def __init__(self):
+        # Load the compiled coefficient tables from the bundle, when it is
+        # up to date. Otherwise compile them from the OpenAP data files.
+        cache = cachefile.ColumnCache("openap", openap_sources(), bundle_version)
+        try:
+            self.from_columns(cache.load())
+        except cachefile.CacheError as e:
+            print(e.args[0])
+            self._load_sources()
+            self._compile()
+            cache.dump(self.to_columns())
+
+    def _load_sources(self):
+        """Load the OpenAP data files."""
+        # pandas is only needed to compile the coefficients
+        import pandas as pd
+
         # Load synonyms.dat text file into dictionary
         self.synodict = {}
         with open(bs.resource(bs.settings.perf_path_openap) / 'synonym.dat', "r") as f_syno:
@@ -46,8 +95,145 @@ class Coefficient:
         self.dragpolar_fixwing = df.to_dict(orient="index")
         self.dragpolar_fixwing["NA"] = df.mean().to_dict()
 
+    def _compile(self):
+        """Compile the coefficients of all known aircraft types (and their
+        synonyms) into dense tables, with one row per type name."""
+        names = dict.fromkeys(list(self.acs_fixwing) + list(self.acs_rotor) +
+                              list(self.synodict) + list(self.dragpolar_fixwing) +
+                              list(self.limits_fixwing) + list(self.limits_rotor))
+        rows = []
+        self.actypes = []  # type name of each row
+        self.mdl = []  # model that is used for each row
+        for name in names:
+            try:
+                mdl, row = self._compile_type(name)
+            except (KeyError, IndexError, StopIteration):
+                # incomplete model data: use the default type instead
+                continue
+            self.actypes.append(name)
+            self.mdl.append(mdl)
+            rows.append(row)
+
+        self.typeidx = {name: i for i, name in enumerate(self.actypes)}
+        self.defaultidx = self.typeidx[DEFAULT_ACTYPE]
+        self.tables = {
+            param: np.array([row[param] for row in rows], dtype=type(default))
+            for param, default in PARAMS.items()
+        }
+        self._compile_phases()
+
+    def _compile_phases(self):
+        """Tabulate the drag polar coefficients per [type, flight phase]."""
+        # phase imports this module
+        from bluesky.traffic.performance.openap import phase as ph
+
+        t = self.tables
+        self.cd0 = np.empty((len(self.actypes), 7))
+        self.k = np.empty((len(self.actypes), 7))
+        for phase in (ph.NA, ph.CL, ph.CR, ph.DE):
+            self.cd0[:, phase] = t["cd0_clean"]
+            self.k[:, phase] = t["k_clean"]
+        self.cd0[:, ph.GD] = t["cd0_to"] + t["delta_cd_gear"]
+        self.k[:, ph.GD] = t["k_to"]
+        self.cd0[:, ph.IC] = t["cd0_to"]
+        self.k[:, ph.IC] = t["k_to"]
+        self.cd0[:, ph.AP] = t["cd0_ld"]
+        self.k[:, ph.AP] = t["k_ld"]
+
+    def _compile_type(self, actype):
+        """Get the performance parameters for aircraft type 'actype'.
+        Unknown types are replaced by synonyms or the default type.
+
+        Returns:
+            str, dict: name of the model used, and its parameters
+        """
+        # thrust and phase import this module
+        from bluesky.traffic.performance.openap import thrust
+
+        row = dict(PARAMS)
+
+        # Check synonym file if not in open ap actypes
+        if actype not in self.actypes_rotor and actype not in self.dragpolar_fixwing:
+            actype = self.synodict.get(actype, actype)
+
+        # initialize aircraft / engine performance parameters
+        # check fixwing or rotor, default to fixwing
+        if actype in self.actypes_rotor:
+            ac = self.acs_rotor[actype]
+            row["lifttype"] = LIFT_ROTOR
+            row["mass"] = 0.5 * (ac["oew"] + ac["mtow"])
+            row["engnum"] = int(ac["n_engines"])
+            row["engpower"] = ac["engines"][0][1]
+
+        else:
+            # convert to known aircraft type
+            if actype not in self.actypes_fixwing:
+                actype = DEFAULT_ACTYPE
+
+            ac = self.acs_fixwing[actype]
+            e = next(iter(ac["engines"].values()))
+
+            # populate fuel flow model
+            row["ff_coeff_a"], row["ff_coeff_b"], row["ff_coeff_c"] = \
+                thrust.compute_eng_ff_coeff(e["ff_idl"], e["ff_app"], e["ff_co"], e["ff_to"])
+            row["lifttype"] = LIFT_FIXWING
+            row["Sref"] = ac["wa"]
+            row["mass"] = 0.5 * (ac["oew"] + ac["mtow"])
+            row["engnum"] = int(ac["n_engines"])
+            row["engthrmax"] = e["thr"]
+            row["engbpr"] = e["bpr"]
+
+        # init type specific coefficients for flight envelops
+        if actype in self.limits_rotor:
+            for param in ("vmin", "vmax", "vsmin", "vsmax", "hmax"):
+                row[param] = self.limits_rotor[actype][param]
+            for param in ("cd0_clean", "k_clean", "cd0_to", "k_to", "cd0_ld",
+                          "k_ld", "delta_cd_gear"):
+                row[param] = np.nan
+
+        else:
+            if actype not in self.limits_fixwing:
+                actype = DEFAULT_ACTYPE
+
+            limits = self.limits_fixwing[actype]
+            for param in ("vminic", "vminer", "vminap", "vmaxic", "vmaxer", "vmaxap",
+                          "vsmin", "vsmax", "hmax", "axmax", "vminto", "mmo"):
+                row[param] = limits[param]
+            row["hcross"] = limits["crosscl"]
+
+            dragpolar = self.dragpolar_fixwing[actype]
+            for param in ("cd0_clean", "k_clean", "cd0_to", "k_to", "cd0_ld",
+                          "k_ld", "delta_cd_gear"):
+                row[param] = dragpolar[param]
+
+        return actype, row
+
+    def to_columns(self):
+        """Get the compiled coefficient tables as columns for the bundle."""
+        columns = {"actypes": self.actypes, "mdl": self.mdl, "cd0": self.cd0, "k": self.k}
+        columns.update({"table." + param: table for param, table in self.tables.items()})
+        return columns
+
+    def from_columns(self, columns):
+        """Restore the compiled coefficient tables from the columns of the bundle."""
+        self.actypes = columns["actypes"]
+        self.mdl = columns["mdl"]
+        self.typeidx = {name: i for i, name in enumerate(self.actypes)}
+        self.defaultidx = self.typeidx[DEFAULT_ACTYPE]
+        # Plain array views on the mapped data
+        self.tables = {param: np.asarray(columns["table." + param]) for param in PARAMS}
+        self.cd0 = np.asarray(columns["cd0"])
+        self.k = np.asarray(columns["k"])
+
+    def typeindex(self, actypes):
+        """Get the coefficient table rows of a list of aircraft types.
+        Unknown types get the row of the default type."""
+        return np.array([self.typeidx.get(actype.upper(), self.defaultidx)
+                         for actype in actypes], dtype=int)
+
     def _load_all_fixwing_flavor(self):
         import warnings
+        import pandas as pd
 
         warnings.simplefilter("ignore")
 
@@ -86,6 +272,8 @@ class Coefficient:
     def _load_all_fixwing_envelop(self):
         """load aircraft envelop from the model database,
         All unit in SI"""
+        import pandas as pd
+
         limits_fixwing = {}
         for mdl, ac in self.acs_fixwing.items():
             fenv = bs.resource(bs.settings.perf_path_openap) / "fixwing/wrap" / (mdl.lower() + ".txt")
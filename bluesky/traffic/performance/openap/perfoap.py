@@ -25,6 +25,7 @@ class OpenAP(PerfBase):
         self.coeff = coeff.Coefficient()
 
         with self.settrafarrays():
+            self.typeid = np.array([], dtype=int)  # row in coefficient tables
             self.lifttype = np.array([])  # lift type, fixwing [1] or rotor [2]
             self.engnum = np.array([], dtype=int)  # number of engines
             self.engthrmax = np.array([])  # static engine thrust
@@ -54,120 +55,20 @@ class OpenAP(PerfBase):
             self.mmo = np.array([])
 
     def create(self, n=1):
-        # cautious! considering multiple created aircraft with same type
         super().create(n)
 
-        actype = bs.traf.type[-1].upper()
-
-        # Check synonym file if not in open ap actypes
-        if (actype not in self.coeff.actypes_rotor) and (
-            actype not in self.coeff.dragpolar_fixwing
-        ):
-            if actype in self.coeff.synodict.keys():
-                # warn = f"Warning: {actype} replaced by {self.coeff.synodict[actype]}"
-                # print(warn)
-                # bs.scr.echo(warn)
-                actype = self.coeff.synodict[actype]
-
-        # initialize aircraft / engine performance parameters
-        # check fixwing or rotor, default to fixwing
-        if actype in self.coeff.actypes_rotor:
-            self.lifttype[-n:] = coeff.LIFT_ROTOR
-            self.mass[-n:] = 0.5 * (
-                self.coeff.acs_rotor[actype]["oew"]
-                + self.coeff.acs_rotor[actype]["mtow"]
-            )
-            self.engnum[-n:] = int(self.coeff.acs_rotor[actype]["n_engines"])
-            self.engpower[-n:] = self.coeff.acs_rotor[actype]["engines"][0][1]
+        # Look up the coefficient table rows of the new aircraft types,
+        # unknown types are replaced by a synonym or the default type
+        typeid = self.coeff.typeindex(bs.traf.type[-n:])
+        self.typeid[-n:] = typeid
 
-        else:
-            # convert to known aircraft type
-            if actype not in self.coeff.actypes_fixwing:
-                # warn = f"Warning: {actype} replaced by B744"
-                # print(warn)
-                # bs.scr.echo(warn)
-                actype = "B744"
-
-            # populate fuel flow model
-            es = self.coeff.acs_fixwing[actype]["engines"]
-            e = es[list(es.keys())[0]]
-            coeff_a, coeff_b, coeff_c = thrust.compute_eng_ff_coeff(
-                e["ff_idl"], e["ff_app"], e["ff_co"], e["ff_to"]
-            )
-
-            self.lifttype[-n:] = coeff.LIFT_FIXWING
-
-            self.Sref[-n:] = self.coeff.acs_fixwing[actype]["wa"]
-            self.mass[-n:] = 0.5 * (
-                self.coeff.acs_fixwing[actype]["oew"]
-                + self.coeff.acs_fixwing[actype]["mtow"]
-            )
-
-            self.engnum[-n:] = int(self.coeff.acs_fixwing[actype]["n_engines"])
-
-            self.ff_coeff_a[-n:] = coeff_a
-            self.ff_coeff_b[-n:] = coeff_b
-            self.ff_coeff_c[-n:] = coeff_c
-
-            all_ac_engs = list(self.coeff.acs_fixwing[actype]["engines"].keys())
-            self.engthrmax[-n:] = self.coeff.acs_fixwing[actype]["engines"][
-                all_ac_engs[0]
-            ]["thr"]
-            self.engbpr[-n:] = self.coeff.acs_fixwing[actype]["engines"][
-                all_ac_engs[0]
-            ]["bpr"]
-
-        # init type specific coefficients for flight envelops
-        if actype in self.coeff.limits_rotor.keys():  # rotorcraft
-            self.vmin[-n:] = self.coeff.limits_rotor[actype]["vmin"]
-            self.vmax[-n:] = self.coeff.limits_rotor[actype]["vmax"]
-            self.vsmin[-n:] = self.coeff.limits_rotor[actype]["vsmin"]
-            self.vsmax[-n:] = self.coeff.limits_rotor[actype]["vsmax"]
-            self.hmax[-n:] = self.coeff.limits_rotor[actype]["hmax"]
-
-            self.vsmin[-n:] = self.coeff.limits_rotor[actype]["vsmin"]
-            self.vsmax[-n:] = self.coeff.limits_rotor[actype]["vsmax"]
-            self.hmax[-n:] = self.coeff.limits_rotor[actype]["hmax"]
-
-            self.cd0_clean[-n:] = np.nan
-            self.k_clean[-n:] = np.nan
-            self.cd0_to[-n:] = np.nan
-            self.k_to[-n:] = np.nan
-            self.cd0_ld[-n:] = np.nan
-            self.k_ld[-n:] = np.nan
-            self.delta_cd_gear[-n:] = np.nan
-
-        else:
-            if actype not in self.coeff.limits_fixwing.keys():
-                actype = "B744"
-
-            self.vminic[-n:] = self.coeff.limits_fixwing[actype]["vminic"]
-            self.vminer[-n:] = self.coeff.limits_fixwing[actype]["vminer"]
-            self.vminap[-n:] = self.coeff.limits_fixwing[actype]["vminap"]
-            self.vmaxic[-n:] = self.coeff.limits_fixwing[actype]["vmaxic"]
-            self.vmaxer[-n:] = self.coeff.limits_fixwing[actype]["vmaxer"]
-            self.vmaxap[-n:] = self.coeff.limits_fixwing[actype]["vmaxap"]
-
-            self.vsmin[-n:] = self.coeff.limits_fixwing[actype]["vsmin"]
-            self.vsmax[-n:] = self.coeff.limits_fixwing[actype]["vsmax"]
-            self.hmax[-n:] = self.coeff.limits_fixwing[actype]["hmax"]
-            self.axmax[-n:] = self.coeff.limits_fixwing[actype]["axmax"]
-            self.vminto[-n:] = self.coeff.limits_fixwing[actype]["vminto"]
-            self.hcross[-n:] = self.coeff.limits_fixwing[actype]["crosscl"]
-            self.mmo[-n:] = self.coeff.limits_fixwing[actype]["mmo"]
-
-            self.cd0_clean[-n:] = self.coeff.dragpolar_fixwing[actype]["cd0_clean"]
-            self.k_clean[-n:] = self.coeff.dragpolar_fixwing[actype]["k_clean"]
-            self.cd0_to[-n:] = self.coeff.dragpolar_fixwing[actype]["cd0_to"]
-            self.k_to[-n:] = self.coeff.dragpolar_fixwing[actype]["k_to"]
-            self.cd0_ld[-n:] = self.coeff.dragpolar_fixwing[actype]["cd0_ld"]
-            self.k_ld[-n:] = self.coeff.dragpolar_fixwing[actype]["k_ld"]
-            self.delta_cd_gear[-n:] = self.coeff.dragpolar_fixwing[actype][
-                "delta_cd_gear"
-            ]
+        # initialize aircraft / engine performance parameters, and type
+        # specific coefficients for flight envelopes
+        for param, table in self.coeff.tables.items():
+            getattr(self, param)[-n:] = table[typeid]
 
         # append update actypes, after removing unknown types
-        self.actype[-n:] = [actype] * n
+        self.actype[-n:] = [self.coeff.mdl[i] for i in typeid]
 
         # Update envelope speed limits
         mask = np.zeros_like(self.actype, dtype=bool)
@@ -188,24 +89,10 @@ class OpenAP(PerfBase):
         idx_fixwing = np.where(self.lifttype == coeff.LIFT_FIXWING)[0]
 
         # ----- compute drag -----
-        # update drage coefficient based on flight phase
-        self.cd0[self.phase == ph.GD] = (
-            self.cd0_to[self.phase == ph.GD] + self.delta_cd_gear[self.phase == ph.GD]
-        )
-        self.cd0[self.phase == ph.IC] = self.cd0_to[self.phase == ph.IC]
-        self.cd0[self.phase == ph.AP] = self.cd0_ld[self.phase == ph.AP]
-        self.cd0[self.phase == ph.CL] = self.cd0_clean[self.phase == ph.CL]
-        self.cd0[self.phase == ph.CR] = self.cd0_clean[self.phase == ph.CR]
-        self.cd0[self.phase == ph.DE] = self.cd0_clean[self.phase == ph.DE]
-        self.cd0[self.phase == ph.NA] = self.cd0_clean[self.phase == ph.NA]
-
-        self.k[self.phase == ph.GD] = self.k_to[self.phase == ph.GD]
-        self.k[self.phase == ph.IC] = self.k_to[self.phase == ph.IC]
-        self.k[self.phase == ph.AP] = self.k_ld[self.phase == ph.AP]
-        self.k[self.phase == ph.CL] = self.k_clean[self.phase == ph.CL]
-        self.k[self.phase == ph.CR] = self.k_clean[self.phase == ph.CR]
-        self.k[self.phase == ph.DE] = self.k_clean[self.phase == ph.DE]
-        self.k[self.phase == ph.NA] = self.k_clean[self.phase == ph.NA]
+        # update drag coefficients based on type and flight phase
+        phase = self.phase.astype(int)
+        self.cd0 = self.coeff.cd0[self.typeid, phase]
+        self.k = self.coeff.k[self.typeid, phase]
 
         rho = aero.vdensity(bs.traf.alt[idx_fixwing])
         vtas = bs.traf.tas[idx_fixwing]
@@ -655,7 +655,7 @@ class Route(Replaceable):
 
                     # IF command starts with aircraft id, it is not missing
                     cmd = args[1].upper()
-                    if not(cmd in bs.traf.id):
+                    if not(cmd in bs.traf.idmap):
                         # Look up arg types
                         try:
                             cmdobj = Command.cmddict.get(cmd)
@@ -663,7 +663,7 @@ class Route(Replaceable):
                             # Command found, check arguments
                             argtypes = cmdobj.annotations
 
-                            if len(argtypes)>0 and argtypes[0]=="acid" and not (len(args)>2 and args[2].upper() in bs.traf.id):
+                            if len(argtypes)>0 and argtypes[0]=="acid" and not (len(args)>2 and args[2].upper() in bs.traf.idmap):
                                 # missing acid, so add ownship acid
                                 acrte.wpstack[wpidx].append(acid+" "+" ".join(args[1:]))
                             else:
@@ -16,11 +16,12 @@ from bluesky.stack.recorder import savecmd
 from bluesky.tools import geo
 from bluesky.tools.misc import latlon2txt
 from bluesky.tools.aero import cas2tas, casormach2tas, fpm, kts, ft, g0, Rearth, nm, tas2cas,\
-                         vatmos,  vtas2cas, vtas2mach, vcasormach
+                         vatmos,  vtas2cas, vtas2mach, vcasormach, atmosphere
 
 
 from bluesky.traffic.asas import ConflictDetection, ConflictResolution
 from .windsim import WindSim
+from .kinematics import Kinematics
 from .conditional import Condition
 from .trails import Trails
 from .adsbmodel import ADSB
@@ -32,7 +33,12 @@ from .trafficgroups import TrafficGroups
 from .performance.perfbase import PerfBase
 
 # Register settings defaults
-bs.settings.set_variable_defaults(performance_model='openap', asas_dt=1.0)
+# traffic_inplace: Update the kinematic state in place instead of rebinding
+#                  the state arrays. Needed for traf_prealloc to keep
+#                  create/delete amortised O(1) for the kinematic state
+#                  (see core/trafficarrays.py)
+bs.settings.set_variable_defaults(performance_model='openap', asas_dt=1.0,
+                                  traffic_inplace=False)
 
 # if bs.settings.performance_model == 'bada':
 #     try:
@@ -76,6 +82,9 @@ class Traffic(Entity):
 
         self.ntraf = 0
 
+        # Lookup table from callsign to index in the traffic arrays
+        self.idmap = dict()
+
         self.cond = Condition()  # Conditional commands list
         self.wind = WindSim()
         self.turbulence = Turbulence()
@@ -84,6 +93,9 @@ class Traffic(Entity):
         # Default commands issued for an aircraft after creation
         self.crecmdlist = []
 
+        # In-place kinematics integrator (used when settings.traffic_inplace is True)
+        self.kinematics = Kinematics()
+
         with self.settrafarrays():
             # Aircraft Info
             self.id      = []  # identifier (string)
@@ -165,6 +177,7 @@ class Traffic(Entity):
         ''' Clear all traffic data upon simulation reset. '''
         # Some child reset functions depend on a correct value of self.ntraf
         self.ntraf = 0
+        self.idmap.clear()
         # This ensures that the traffic arrays (which size is dynamic)
         # are all reset as well, so all lat,lon,sdp etc but also objects adsb
         super().reset()
@@ -209,7 +222,7 @@ class Traffic(Entity):
 
         if isinstance(acid, str):
             # Check if not already exist
-            if self.id.count(acid.upper()) > 0:
+            if acid.upper() in self.idmap:
                 return False, acid + " already exists."  # already exists do nothing
             acid = n * [acid]
 
@@ -235,6 +248,7 @@ class Traffic(Entity):
         # Aircraft Info
         self.id[-n:]   = acid
         self.type[-n:] = actype
+        self.idmap.update(zip(acid, range(self.ntraf - n, self.ntraf)))
 
         # Positions
         self.lat[-n:]  = aclat
@@ -387,8 +401,9 @@ class Traffic(Entity):
         # Call the actual delete function
         super().delete(idx)
 
-        # Update number of aircraft
+        # Update number of aircraft, and rebuild callsign lookup table
         self.ntraf = len(self.lat)
+        self.idmap = {acid: i for i, acid in enumerate(self.id)}
         return True
 
     def update(self):
@@ -397,7 +412,7 @@ class Traffic(Entity):
             return
 
         #---------- Atmosphere --------------------------------
-        self.p, self.rho, self.Temp = vatmos(self.alt)
+        self.p, self.rho, self.Temp, _ = atmosphere(self.alt)
 
         #---------- ADSB Update -------------------------------
         self.adsb.update()
@@ -416,9 +431,12 @@ class Traffic(Entity):
                              self.aporasas.alt, self.ax)
 
         #---------- Kinematics --------------------------------
-        self.update_airspeed()
-        self.update_groundspeed()
-        self.update_pos()
+        if bs.settings.traffic_inplace:
+            self.kinematics.update(self)
+        else:
+            self.update_airspeed()
+            self.update_groundspeed()
+            self.update_pos()
 
         #---------- Simulate Turbulence -----------------------
         self.turbulence.update()
@@ -488,7 +506,7 @@ class Traffic(Entity):
         else:
             applywind = self.alt>50.*ft # Only apply wind when airborne
 
-            vnwnd,vewnd = self.wind.getdata(self.lat, self.lon, self.alt)
+            vnwnd,vewnd = self.wind.getcached(self.lat, self.lon, self.alt)
             self.windnorth[:], self.windeast[:] = vnwnd,vewnd
             self.gsnorth  = self.tas * np.cos(np.radians(self.hdg)) + self.windnorth*applywind
             self.gseast   = self.tas * np.sin(np.radians(self.hdg)) + self.windeast*applywind
@@ -514,18 +532,12 @@ class Traffic(Entity):
         """Find index of aircraft id"""
         if not isinstance(acid, str):
             # id2idx is called for multiple id's
-            # Fast way of finding indices of all ACID's in a given list
-            tmp = dict((v, i) for i, v in enumerate(self.id))
-            return [tmp.get(acidi, -1) for acidi in acid]
-        else:
-             # Catch last created id (* or # symbol)
-            if acid in ('#', '*'):
-                return self.ntraf - 1
+            return [self.idmap.get(acidi, -1) for acidi in acid]
+        # Catch last created id (* or # symbol)
+        if acid in ('#', '*'):
+            return self.ntraf - 1
 
-            try:
-                return self.id.index(acid.upper())
-            except:
-                return -1
+        return self.idmap.get(acid.upper(), -1)
 
     def setnoise(self, noise=None):
         """Noise (turbulence, ADBS-transmission noise, ADSB-truncated effect)"""
@@ -698,7 +710,7 @@ class Traffic(Entity):
 
 
                     # How many others?
-                    nother = bs.navdb.wpid.count(wp)-len(iwps)
+                    nother = len(bs.navdb.wpidx.get(wp, []))-len(iwps)
                     if nother>0:
                         verb = ["is ","are "][min(1,max(0,nother-1))]
                         lines = lines +"\nThere "+verb + str(nother) +\
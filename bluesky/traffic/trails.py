@@ -1,15 +1,24 @@
 """ Create aircraft trails on the radar display."""
-from math import *
 import numpy as np
 import bluesky as bs
 from bluesky import settings
 from bluesky.core import TrafficArrays
 
 
+# Register settings defaults
+settings.set_variable_defaults(trails_maxsegments=100000)
+
+
 class Trails(TrafficArrays):
     """
     Traffic trails class definition    : Data for trails
 
+    Trail line pieces are stored in a preallocated ring buffer of at most
+    maxsegments (default: settings.trails_maxsegments) segments: when it is
+    full, the oldest segments are overwritten. Segments are identified by
+    their sequence number, so that cursors can be kept of which segments
+    have been sent to the gui (QtGL) or moved to the background (pygame).
+
     Methods:
         Trails()            :  constructor
 
@@ -18,178 +27,128 @@ class Trails(TrafficArrays):
     Created by  : Jacco M. Hoekstra
     """
 
-    def __init__(self,dttrail=10.):
+    def __init__(self,dttrail=10.,maxsegments=None):
         super().__init__()
         self.active = False  # Wether or not to show trails
         self.dt = dttrail    # Resolution of trail pieces in time
-        self.pygame = (bs.gui == 'pygame') # Trails are different for pygame
         self.tcol0 = 60.  # After how many seconds old colour
 
-        # This list contains some standard colors
-        self.colorList = {'BLUE': np.array([0, 0, 255]),
-                          'CYAN': np.array([0,255,255]),
+        # This list contains some standard colors. Colors are stored as an
+        # index in this list, with the default color (CYAN) at index 0
+        self.colorList = {'CYAN': np.array([0,255,255]),
+                          'BLUE': np.array([0, 0, 255]),
                           'RED' : np.array([255, 0, 0]),
                           'YELLOW': np.array([255, 255, 0])}
-
-        # Set default color to Blue
-        self.defcolor = self.colorList['CYAN']
-
-        # Foreground data on line pieces
-        self.lat0 = np.array([])
-        self.lon0 = np.array([])
-        self.lat1 = np.array([])
-        self.lon1 = np.array([])
-        self.time = np.array([])
-        self.col  = []
-        self.fcol = np.array([])
-
-        # background copy of data
-        self.bglat0 = np.array([])
-        self.bglon0 = np.array([])
-        self.bglat1 = np.array([])
-        self.bglon1 = np.array([])
-        self.bgtime = np.array([])
-        self.bgcol = []
+        self.colornames = list(self.colorList)
+        self.colors = np.array(list(self.colorList.values()))
+
+        # Set default color to Cyan
+        self.defcolor = self.colornames.index('CYAN')
+
+        # Ring buffer of line pieces
+        self.maxsegments = maxsegments or settings.trails_maxsegments
+        self.seglat0 = np.zeros(self.maxsegments)
+        self.seglon0 = np.zeros(self.maxsegments)
+        self.seglat1 = np.zeros(self.maxsegments)
+        self.seglon1 = np.zeros(self.maxsegments)
+        self.segtime = np.zeros(self.maxsegments)
+        self.segcol = np.zeros(self.maxsegments, dtype=np.int8)
+
+        # Total number of segments added, and cursors (segment numbers) of
+        # the first segment not yet sent, and the first foreground segment
+        self.nseg = 0
+        self.isent = 0
+        self.ifg = 0
 
         with self.settrafarrays():
-            self.accolor = []
+            self.accolor = np.array([], dtype=np.int8)
             self.lastlat = np.array([])
             self.lastlon = np.array([])
             self.lasttim = np.array([])
 
-        self.clearnew()
-
         return
 
     def create(self,n=1):
         super().create(n)
 
-        self.accolor[-1] = self.defcolor
-        self.lastlat[-1] = bs.traf.lat[-1]
-        self.lastlon[-1] = bs.traf.lon[-1]
+        self.accolor[-n:] = self.defcolor
+        self.lastlat[-n:] = bs.traf.lat[-n:]
+        self.lastlon[-n:] = bs.traf.lon[-n:]
+        self.lasttim[-n:] = bs.sim.simt
 
     def update(self):
-        self.acid    = bs.traf.id
+        """Add linepieces for trails based on traffic data"""
         if not self.active:
-            self.lastlat = bs.traf.lat
-            self.lastlon = bs.traf.lon
-            self.lasttim[:] = bs.sim.simt
             return
-        """Add linepieces for trails based on traffic data"""
 
-        # Use temporary list/array for fast append
-        lstlat0 = []
-        lstlon0 = []
-        lstlat1 = []
-        lstlon1 = []
-        lsttime = []
-
-        # Check for update
-        delta = bs.sim.simt - self.lasttim
-        idxs = np.where(delta > self.dt)[0]
-
-        # Add all a/c which need the update
-        # if len(idxs)>0:
-        #     print "len(idxs)=",len(idxs)
-
-        for i in idxs:
-            # Add to lists
-            lstlat0.append(self.lastlat[i])
-            lstlon0.append(self.lastlon[i])
-            lstlat1.append(bs.traf.lat[i])
-            lstlon1.append(bs.traf.lon[i])
-            lsttime.append(bs.sim.simt)
-
-            if isinstance(self.col, np.ndarray):
-                # print type(trailcol[i])
-                # print trailcol[i]
-                # print "col type: ",type(self.col)
-                self.col = self.col.tolist()
-
-            type(self.col)
-            self.col.append(self.accolor[i])
-
-            # Update aircraft record
-            self.lastlat[i] = bs.traf.lat[i]
-            self.lastlon[i] = bs.traf.lon[i]
-            self.lasttim[i] = bs.sim.simt
-
-        # When a/c is no longer part of trail semgment,
-        # it is no longer a/c data => move to the GUI buffer (send or draw)
-        if self.pygame:
-            # Pygame: send to drawing buffer
-            self.lat0 = np.concatenate((self.lat0, np.array(lstlat0)))
-            self.lon0 = np.concatenate((self.lon0, np.array(lstlon0)))
-            self.lat1 = np.concatenate((self.lat1, np.array(lstlat1)))
-            self.lon1 = np.concatenate((self.lon1, np.array(lstlon1)))
-            self.time = np.concatenate((self.time, np.array(lsttime)))
-        else:
-            # QtGL: add to send buffer
-            self.newlat0.extend(lstlat0)
-            self.newlon0.extend(lstlon0)
-            self.newlat1.extend(lstlat1)
-            self.newlon1.extend(lstlon1)
-        # Update colours
-        self.fcol = (1. - np.minimum(self.tcol0, np.abs(bs.sim.simt - self.time)) / self.tcol0)
+        # Select all aircraft which need an update
+        idxs = np.flatnonzero(bs.sim.simt - self.lasttim > self.dt)
+        if len(idxs) == 0:
+            return
+
+        # When there are more new segments than fit in the buffer, keep the newest
+        idxs = idxs[-self.maxsegments:]
+        slots = (self.nseg + np.arange(len(idxs))) % self.maxsegments
+        self.seglat0[slots] = self.lastlat[idxs]
+        self.seglon0[slots] = self.lastlon[idxs]
+        self.seglat1[slots] = bs.traf.lat[idxs]
+        self.seglon1[slots] = bs.traf.lon[idxs]
+        self.segtime[slots] = bs.sim.simt
+        self.segcol[slots] = self.accolor[idxs]
+        self.nseg += len(idxs)
+
+        # Update aircraft record
+        self.lastlat[idxs] = bs.traf.lat[idxs]
+        self.lastlon[idxs] = bs.traf.lon[idxs]
+        self.lasttim[idxs] = bs.sim.simt
 
         return
 
+    def slots(self, start, end=None):
+        """ Return the buffer indices of the segments numbered start to end
+            (default: the newest), skipping segments that were overwritten. """
+        end = self.nseg if end is None else end
+        start = max(start, self.nseg - self.maxsegments)
+        return np.arange(start, end) % self.maxsegments
+
+    def getnew(self):
+        """ Return the line pieces (lat0, lon0, lat1, lon1) added since the
+            previous call, and advance the send cursor (QtGL). """
+        idx = self.slots(self.isent)
+        self.isent = self.nseg
+        return self.seglat0[idx], self.seglon0[idx], self.seglat1[idx], self.seglon1[idx]
+
+    def segments(self, start, end=None):
+        """ Return the line pieces (lat0, lon0, lat1, lon1, col) of the
+            segments numbered start to end (default: the newest). """
+        idx = self.slots(start, end)
+        return self.seglat0[idx], self.seglon0[idx], self.seglat1[idx], \
+            self.seglon1[idx], self.colors[self.segcol[idx]]
+
+    def foreground(self):
+        """ Return the foreground line pieces (pygame): the segments added
+            since the last buffer(). """
+        return self.segments(self.ifg)
+
+    def background(self):
+        """ Return the background line pieces (pygame): the segments before
+            the last buffer(). """
+        return self.segments(0, self.ifg)
+
     def buffer(self):
         """Buffer trails: Move current stack to background """
-
-        self.bglat0 = np.append(self.bglat0, self.lat0)
-        self.bglon0 = np.append(self.bglon0, self.lon0)
-        self.bglat1 = np.append(self.bglat1, self.lat1)
-        self.bglon1 = np.append(self.bglon1, self.lon1)
-        self.bgtime = np.append(self.bgtime, self.time)
-
-        # No color saved: Background: always 'old color' self.col0
-        if isinstance(self.bgcol, np.ndarray):
-            self.bgcol = self.bgcol.tolist()
-        if isinstance(self.col, np.ndarray):
-            self.col = self.col.tolist()
-
-        self.bgcol = self.bgcol + self.col
-        self.bgacid = self.bgacid + self.acid
-
-        self.clearfg()  # Clear foreground trails
+        self.ifg = self.nseg
         return
 
     def clearnew(self):
-        # Clear new lines pipeline used for QtGL
-        self.newlat0 = []
-        self.newlon0 = []
-        self.newlat1 = []
-        self.newlon1 = []
-
-
-    def clearfg(self):  # Foreground
-        """Clear trails foreground"""
-        self.lat0 = np.array([])
-        self.lon0 = np.array([])
-        self.lat1 = np.array([])
-        self.lon1 = np.array([])
-        self.time = np.array([])
-        self.col = np.array([])
-        return
-
-    def clearbg(self):  # Background
-        """Clear trails background"""
-        self.bglat0 = np.array([])
-        self.bglon0 = np.array([])
-        self.bglat1 = np.array([])
-        self.bglon1 = np.array([])
-        self.bgtime = np.array([])
-        self.bgacid = []
-        return
+        """Clear new lines pipeline used for QtGL"""
+        self.isent = self.nseg
 
     def clear(self):
         """Clear all data, Foreground and background"""
-        self.lastlon = np.array([])
-        self.lastlat = np.array([])
-        self.clearfg()
-        self.clearbg()
-        self.clearnew()
+        self.nseg = 0
+        self.isent = 0
+        self.ifg = 0
         return
 
     def setTrails(self, *args):
@@ -207,6 +166,11 @@ class Trails(TrafficArrays):
         # Switch on/off
         elif type(args[0]) == bool:
             # Set trails on/off
+            if args[0] and not self.active:
+                # Trails start at the current aircraft positions
+                self.lastlat[:] = bs.traf.lat
+                self.lastlon[:] = bs.traf.lon
+                self.lasttim[:] = bs.sim.simt
             self.active = args[0]
             if len(args) > 1:
                 self.dt = args[1]
@@ -225,7 +189,7 @@ class Trails(TrafficArrays):
 
     def changeTrailColor(self, color, idx):
         """Change color of aircraft trail"""
-        self.accolor[idx] = self.colorList[color]
+        self.accolor[idx] = self.colornames.index(color)
         return
 
     def reset(self):
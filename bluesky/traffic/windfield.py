@@ -1,10 +1,70 @@
 """ Wind implementation for BlueSky."""
 from numpy import array, sin, cos, arange, radians, ones, append, ndarray, \
                   minimum, repeat, delete, zeros, maximum, floor, interp, \
-                  pi, concatenate, unique
+                  pi, concatenate, unique, argsort, searchsorted, clip, \
+                  stack, asarray
 from scipy.interpolate import interp1d, RegularGridInterpolator
 from bluesky.tools.aero import ft
 
+
+class WindGrid:
+    """ Wind field on a (rectilinear) lat/lon/alt grid, as loaded from
+        GRIB/NetCDF weather data, with trilinear interpolation.
+
+        Arguments:
+            lat(nlat), lon(nlon), alt(nalt) = grid axes [deg, deg, m]
+            vnorth(nalt,nlat,nlon)          = wind north component [m/s]
+            veast(nalt,nlat,nlon)           = wind east component [m/s]
+
+        Outside the horizontal extent of the grid the wind is zero. Below
+        the lowest and above the highest altitude level the wind of that
+        level is used.
+    """
+    def __init__(self, lat, lon, alt, vnorth, veast):
+        # North and east component together, so that both are interpolated at once
+        values = stack((asarray(vnorth, dtype=float), asarray(veast, dtype=float)), axis=-1)
+        self.axes = []
+        for dim, axis in enumerate((alt, lat, lon)):
+            axis = asarray(axis, dtype=float)
+            order = argsort(axis)
+            values = values.take(order, axis=dim)
+            axis = axis[order]
+            # A single value along an axis: give it a second (equal) grid plane
+            if len(axis) == 1:
+                axis = append(axis, axis[0] + 1.0)
+                values = concatenate((values, values), axis=dim)
+            self.axes.append(axis)
+        self.shape = values.shape[:3]
+        self.values = values.reshape(-1, 2)
+
+    @staticmethod
+    def _index(axis, x):
+        """ Get the lower grid index and the interpolation factor of x on axis. """
+        i = clip(searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+        f = clip((x - axis[i]) / (axis[i + 1] - axis[i]), 0.0, 1.0)
+        return i, f
+
+    def interpolate(self, lat, lon, alt):
+        """ Get the wind [m/s] north and east at the given positions (arrays). """
+        ialt, falt = self._index(self.axes[0], alt)
+        ilat, flat = self._index(self.axes[1], lat)
+        ilon, flon = self._index(self.axes[2], lon)
+        _, nlat, nlon = self.shape
+
+        # Sum the values of the eight surrounding grid points, weighted by volume
+        wind = zeros((len(ialt), 2))
+        for da, wa in ((0, 1.0 - falt), (1, falt)):
+            for dy, wy in ((0, 1.0 - flat), (1, flat)):
+                for dx, wx in ((0, 1.0 - flon), (1, flon)):
+                    idx = ((ialt + da) * nlat + ilat + dy) * nlon + ilon + dx
+                    wind += (wa * wy * wx)[:, None] * self.values[idx]
+
+        # No wind outside the horizontal extent of the grid
+        outside = (lat < self.axes[1][0]) | (lat > self.axes[1][-1]) | \
+                  (lon < self.axes[2][0]) | (lon > self.axes[2][-1])
+        wind[outside] = 0.0
+        return wind[:, 0], wind[:, 1]
+
 class Windfield():
     """ Windfield class:
         Methods:
@@ -31,6 +91,12 @@ class Windfield():
             vnorth(nalt,nvec)  = wind north component [m/s]
             veast(nalt,nvec)   = wind east component [m/s]
 
+            grid               = gridded wind field (WindGrid), when set with
+                                 addgrid() this is used instead of the vectors
+
+            version            = counter that increases with every change
+                                 of the wind field
+
             winddim   = Windfield dimension, will automatically be detected:
                           0 = no wind
                           1 = constant wind
@@ -51,6 +117,9 @@ class Windfield():
         # List of indices of points with an altitude profile (for 3D check)
         self.iprof   = []
 
+        # Changes of the wind field, to invalidate wind that was looked up before
+        self.version = 0
+
         # Clear actual field
         self.clear()
         return
@@ -67,13 +136,38 @@ class Windfield():
         self.nvec    = 0
         self.fe      = None
         self.fn      = None
+        self.grid    = None
+        self.version += 1
         return
 
+    def addgrid(self, lat, lon, alt, vnorth, veast):
+        """ Set a gridded wind field, replacing all wind defined so far.
+            lat(nlat), lon(nlon) and alt(nalt) are the grid axes [deg, deg, m],
+            vnorth and veast(nalt,nlat,nlon) the wind components [m/s].
+        """
+        self.clear()
+        self.grid = WindGrid(lat, lon, alt, vnorth, veast)
+        self.winddim = 3
+
+    def addgridpoints(self, lat, lon, alt, vnorth, veast):
+        """ Set a gridded wind field from the wind vectors [m/s] at all
+            points (lat, lon, alt arrays) of a grid, in any order.
+        """
+        lats, ilat = unique(lat, return_inverse=True)
+        lons, ilon = unique(lon, return_inverse=True)
+        alts, ialt = unique(alt, return_inverse=True)
+        gridvn = zeros((len(alts), len(lats), len(lons)))
+        gridve = zeros((len(alts), len(lats), len(lons)))
+        gridvn[ialt, ilat, ilon] = vnorth
+        gridve[ialt, ilat, ilon] = veast
+        self.addgrid(lats, lons, alts, gridvn, gridve)
+
     def addpointvne(self, lat, lon, vnorth, veast, windalt=None):
         """ Add a vector of lat/lon positions (arrays) with a (2D vector of) 
             wind speed [m/s] in north and east component. 
             Optionally an array with altitudes can be used
         """              
+        self.version += 1
         if windalt is not None and len(windalt) > 1:           
             # Set altitude interpolation functions
             fnorth = interp1d(windalt, vnorth.T, bounds_error=False, 
@@ -137,6 +231,8 @@ class Windfield():
             and wind speed need to have the same dimension
         """
 
+        self.version += 1
+
         # If scalar, copy into table for altitude axis
         if not(type(windalt) in [ndarray,list]) and windalt == None: # scalar to array
             prof3D = False # no wind profile, just one value
@@ -204,8 +300,12 @@ class Windfield():
         else:
             alt = zeros(npos)
 
+        # Gridded wind field: trilinear interpolation
+        if self.grid is not None:
+            vnorth, veast = self.grid.interpolate(lat.reshape(npos), lon.reshape(npos), alt)
+
         # Check if RGI functions are present, if so use them for interpolation
-        if self.fe is not None and self.fn is not None:
+        elif self.fe is not None and self.fn is not None:
             vnorth = self.fn(concatenate((alt.reshape(1,-1), lat, lon), axis=0).T)
             veast  = self.fe(concatenate((alt.reshape(1,-1), lat, lon), axis=0).T)
         else:
@@ -276,10 +376,11 @@ class Windfield():
             return list(vnorth),list(veast)
 
         else:
-            return float(vnorth),float(veast)
+            return float(vnorth[0]),float(veast[0])
 
     def remove(self,idx): # remove a point using the returned index when it was added
         if idx<len(self.lat):
+            self.version += 1
             self.lat = delete(self.lat,idx)
             self.lon = delete(self.lat,idx)
 
@@ -1,13 +1,93 @@
 ''' Simulate wind in BlueSky. '''
 from numpy import arctan2,degrees,array,sqrt # to allow arrays, their functions and types
+import numpy as np
 
-from bluesky.tools.aero import kts, ft
+import bluesky as bs
+from bluesky import settings
+from bluesky.tools.aero import kts, ft, nm, Rearth
 from bluesky.core import Entity
 from bluesky.stack import command
 from .windfield import Windfield
 
+# Per-aircraft wind cache: the wind of an aircraft is looked up again when it
+# moved more than wind_cache_dist [m] horizontally or wind_cache_dalt [m]
+# vertically, or after wind_cache_dt [s]. A wind_cache_dt of zero disables the cache.
+settings.set_variable_defaults(wind_cache_dt=0.0, wind_cache_dist=5.0 * nm,
+                               wind_cache_dalt=500.0 * ft)
+
 
 class WindSim(Entity, Windfield, replaceable=True):      
+    def __init__(self):
+        super().__init__()
+        self.cachedt = settings.wind_cache_dt
+        self.cachedist = settings.wind_cache_dist
+        self.cachedalt = settings.wind_cache_dalt
+        # Version of the wind field the cached wind was looked up in
+        self.cacheversion = -1
+        with self.settrafarrays():
+            self.cachevalid = np.array([], dtype=bool)  # cached wind available
+            self.cachet = np.array([])      # time of wind lookup [s]
+            self.cachelat = np.array([])    # position of wind lookup [deg, deg, m]
+            self.cachelon = np.array([])
+            self.cachealt = np.array([])
+            self.cachevn = np.array([])     # cached wind north/east component [m/s]
+            self.cacheve = np.array([])
+
+    def getcached(self, lat, lon, alt):
+        """ Get the wind at the positions of all aircraft (arrays of ntraf).
+            With the wind cache enabled, only the wind of aircraft that moved
+            more than the set distance, or whose wind is older than the set
+            time is looked up again in the wind field.
+        """
+        if self.cachedt <= 0.0:
+            return self.getdata(lat, lon, alt)
+
+        refresh = ~self.cachevalid | (bs.sim.simt - self.cachet >= self.cachedt) | \
+            (np.abs(alt - self.cachealt) > self.cachedalt)
+        if self.cacheversion != self.version:
+            # The wind field changed: look up the wind of all aircraft
+            self.cacheversion = self.version
+            refresh[:] = True
+        else:
+            # Flat-earth horizontal distance since the last lookup
+            dy = np.radians(lat - self.cachelat)
+            dx = np.cos(np.radians(lat)) * np.radians(lon - self.cachelon)
+            refresh |= (dx * dx + dy * dy) * (Rearth * Rearth) > self.cachedist * self.cachedist
+
+        idx = np.flatnonzero(refresh)
+        if len(idx):
+            self.cachevn[idx], self.cacheve[idx] = self.getdata(lat[idx], lon[idx], alt[idx])
+            self.cachelat[idx] = lat[idx]
+            self.cachelon[idx] = lon[idx]
+            self.cachealt[idx] = alt[idx]
+            self.cachet[idx] = bs.sim.simt
+            self.cachevalid[idx] = True
+        return self.cachevn, self.cacheve
+
+    @command(name='WINDCACHE')
+    def setcache(self, dt: float = None, dist: float = None, dalt: float = None):
+        """ Set the per-aircraft wind cache. The wind of an aircraft is looked
+            up again when it moved more than dist horizontally or dalt
+            vertically, or after dt.
+
+            Arguments:
+            - dt: Maximum age of the cached wind [s], 0 to disable the cache
+            - dist: Horizontal distance [nm]
+            - dalt: Vertical distance [ft]
+        """
+        if dt is None:
+            if self.cachedt <= 0.0:
+                return True, 'WINDCACHE is off'
+            return True, f'WINDCACHE refreshes wind after {self.cachedt} s, ' + \
+                f'{self.cachedist / nm} nm or {self.cachedalt / ft} ft'
+        self.cachedt = dt
+        if dist is not None:
+            self.cachedist = dist * nm
+        if dalt is not None:
+            self.cachedalt = dalt * ft
+        self.cachevalid[:] = False
+        return True
+
     @command(name='WIND')
     def add(self, lat: 'lat', lon: 'lon', *winddata: 'float'):
         """ Define a wind vector as part of the 2D or 3D wind field.
@@ -27,6 +27,10 @@ from bluesky.network.client import Client
 from bluesky.tools.misc import tim2txt
 from bluesky.tools.aero import ft, kts, nm, fpm
 
+# Aircraft data fields used by the console, received with ACDATA2
+ACDATA_FIELDS = ['lat', 'lon', 'alt', 'tas', 'cas', 'inconf', 'tcpamax', 'rpz',
+                 'vs', 'vmin', 'vmax']
+
 NodeID = NewType("NodeID", int)
 NodeDataType = TypeVar("NodeDataType")
 class ConsoleClient(Client):
@@ -40,7 +44,7 @@ class ConsoleClient(Client):
     def __init__(self, actnode_topics=b''):
         super().__init__(actnode_topics)
         self.subscribe(b'SIMINFO')
-        self.subscribe(b'ACDATA')
+        self.subscribe(b'ACDATA2' + self.client_id)
         
         self.count = 0
         self.nodes = dict()
@@ -72,7 +76,7 @@ class ConsoleClient(Client):
             # send to tui
             ConsoleUI.instance.set_nodes(copy.deepcopy(self.nodes), node_times)
         
-        if name == b'ACDATA':
+        if name == b'ACDATA2' + self.client_id:
             self.extend_node_data(data, sender_id)
             if sender_id == bs.net.actnode():
                 gen_data, table_data = self.get_traffic(data)
@@ -119,6 +123,8 @@ class ConsoleClient(Client):
             self.nodes[connid]['time'] = time
         
         else:
+            # Subscribe to the aircraft data of this new node
+            self.send_event(b'ACDATASUB', dict(fields=ACDATA_FIELDS), target=connid)
             node_count = self.count + 1
             self.nodes[connid] = {'num': f'{node_count}','scenename': scenname, 
                                 'time': time, 'nair': 0, 'nconf_cur': 0, 'nconf_tot': 0,
@@ -551,15 +551,15 @@ class Screen:
             if bs.traf.trails.active:
                 bs.traf.trails.buffer()  # move all new trails to background
 
+                lat0, lon0, lat1, lon1, col = bs.traf.trails.background()
                 trlsel = list(np.where(
-                    self.onradar(bs.traf.trails.bglat0, bs.traf.trails.bglon0) + \
-                    self.onradar(bs.traf.trails.bglat1, bs.traf.trails.bglon1))[0])
+                    self.onradar(lat0, lon0) + self.onradar(lat1, lon1))[0])
 
-                x0, y0 = self.ll2xy(bs.traf.trails.bglat0, bs.traf.trails.bglon0)
-                x1, y1 = self.ll2xy(bs.traf.trails.bglat1, bs.traf.trails.bglon1)
+                x0, y0 = self.ll2xy(lat0, lon0)
+                x1, y1 = self.ll2xy(lat1, lon1)
 
                 for i in trlsel:
-                    pg.draw.aaline(self.radbmp, bs.traf.trails.bgcol[i], \
+                    pg.draw.aaline(self.radbmp, col[i], \
                                    (x0[i], y0[i]), (x1[i], y1[i]))
 
             #---------- Draw ADSB Coverage Area
@@ -683,7 +683,7 @@ class Screen:
 
                 # Draw last trail part
                 if bs.traf.trails.active:
-                    pg.draw.line(self.win, tuple(bs.traf.trails.accolor[i]),
+                    pg.draw.line(self.win, tuple(bs.traf.trails.colors[bs.traf.trails.accolor[i]]),
                                  (ltx[i], lty[i]), (trafx[i], trafy[i]))
 
                 # Label text
@@ -836,15 +836,15 @@ class Screen:
 
             # Draw aircraft trails which are on screen
             if bs.traf.trails.active:
+                lat0, lon0, lat1, lon1, col = bs.traf.trails.foreground()
                 trlsel = list(np.where(
-                    self.onradar(bs.traf.trails.lat0, bs.traf.trails.lon0) + \
-                    self.onradar(bs.traf.trails.lat1, bs.traf.trails.lon1))[0])
+                    self.onradar(lat0, lon0) + self.onradar(lat1, lon1))[0])
 
-                x0, y0 = self.ll2xy(bs.traf.trails.lat0, bs.traf.trails.lon0)
-                x1, y1 = self.ll2xy(bs.traf.trails.lat1, bs.traf.trails.lon1)
+                x0, y0 = self.ll2xy(lat0, lon0)
+                x1, y1 = self.ll2xy(lat1, lon1)
 
                 for i in trlsel:
-                    pg.draw.line(self.win, bs.traf.trails.col[i], \
+                    pg.draw.line(self.win, col[i], \
                                  (x0[i], y0[i]), (x1[i], y1[i]))
 
                 # Redraw background => buffer ; if >1500 foreground linepieces on screen
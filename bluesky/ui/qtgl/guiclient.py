@@ -14,7 +14,10 @@ from bluesky.tools.aero import ft
 
 # Globals
 UPDATE_ALL = ['SHAPE', 'TRAILS', 'CUSTWPT', 'PANZOOM', 'ECHOTEXT', 'ROUTEDATA']
-ACTNODE_TOPICS = [b'ACDATA', b'PLOT*', b'ROUTEDATA*']
+ACTNODE_TOPICS = [b'PLOT*', b'ROUTEDATA*']
+# Aircraft data fields used by the gui, received with ACDATA2
+ACDATA_FIELDS = ['lat', 'lon', 'alt', 'tas', 'cas', 'gs', 'trk', 'vs', 'inconf',
+                 'ingroup', 'tcpamax', 'rpz', 'vmin', 'vmax']
 
 
 class GuiClient(Client):
@@ -30,6 +33,9 @@ class GuiClient(Client):
         self.subscribe(b'TRAILS')
         self.subscribe(b'PLOT' + self.client_id)
         self.subscribe(b'ROUTEDATA' + self.client_id)
+        self.subscribe(b'ACDATA2' + self.client_id)
+        # The node that sends us aircraft data with ACDATA2
+        self.acdata_node = b''
 
         # Signals
         self.actnodedata_changed = Signal('actnodedata_changed')
@@ -49,9 +55,9 @@ class GuiClient(Client):
         ''' Guiclient stream handler. '''
         changed = ''
         actdata = self.get_nodedata(sender_id)
-        if name == b'ACDATA':
+        if name.startswith(b'ACDATA2'):
             actdata.setacdata(data)
-            changed = name.decode('utf8')
+            changed = 'ACDATA'
         elif name.startswith(b'ROUTEDATA'):
             actdata.setroutedata(data)
             changed = 'ROUTEDATA'
@@ -107,6 +113,12 @@ class GuiClient(Client):
             self.actnodedata_changed.emit(sender_id, sender_data, data_changed)
 
     def actnode_changed(self, newact):
+        # Only receive aircraft data from the active node
+        if self.acdata_node:
+            self.send_event(b'ACDATASUB', None, target=self.acdata_node)
+        self.acdata_node = newact
+        self.send_event(b'ACDATASUB', dict(fields=ACDATA_FIELDS, viewport=True),
+                        target=newact)
         self.actnodedata_changed.emit(newact, self.get_nodedata(newact), UPDATE_ALL)
 
     def get_nodedata(self, nodeid=None):
@@ -137,6 +149,8 @@ class nodeData:
 
         self.naircraft = 0
         self.acdata = ACDataEvent()
+        # Full aircraft state, rebuilt from ACDATA2 frames
+        self.acstate = dict()
         self.routedata = RouteDataEvent()
 
         # Per-scenario data
@@ -146,6 +160,20 @@ class nodeData:
         self._route = route
 
     def setacdata(self, data):
+        if 'key' in data:
+            # ACDATA2 frame: update the full aircraft state
+            idx = data.pop('idx', None)
+            if data.pop('key'):
+                # Keyframe: copy, as delta frames update these arrays in place
+                self.acstate.update((name, np.array(value) if isinstance(value, np.ndarray) else value)
+                                    for name, value in data.items())
+            elif 'id' in self.acstate:
+                for name, value in data.items():
+                    if isinstance(value, np.ndarray) and value.ndim:
+                        self.acstate[name][idx] = value
+                    else:
+                        self.acstate[name] = value
+            data = self.acstate
         self.acdata = ACDataEvent(data)
         self.naircraft = len(self.acdata.lat)
 
@@ -175,6 +203,8 @@ class nodeData:
 
         self.naircraft = 0
         self.acdata = ACDataEvent()
+        # Full aircraft state, rebuilt from ACDATA2 frames
+        self.acstate = dict()
         self.routedata = RouteDataEvent()
 
         # Filteralt settings
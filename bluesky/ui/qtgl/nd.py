@@ -65,14 +65,16 @@ class ND(QGLWidget):
         bs.net.stream_received.connect(self.on_simstream_received)
 
     def on_simstream_received(self, streamname, data, sender_id):
-        if streamname == b'ACDATA':
-            if self.ac_id in data['id']:
-                idx = data['id'].index(self.ac_id.upper())
-                lat = data['lat'][idx]
-                lon = data['lon'][idx]
-                trk = data['trk'][idx]
-                tas = data['tas'][idx]
-                self.n_aircraft = len(data['lat'])
+        if streamname.startswith(b'ACDATA2'):
+            # Use the full aircraft state, rebuilt from the ACDATA2 frames
+            data = bs.net.get_nodedata(sender_id).acdata
+            if self.ac_id in data.id:
+                idx = data.id.index(self.ac_id.upper())
+                lat = data.lat[idx]
+                lon = data.lon[idx]
+                trk = data.trk[idx]
+                tas = data.tas[idx]
+                self.n_aircraft = len(data.lat)
                 self.globaldata.set_owndata(idx, lat, lon, trk)
 
     def setAircraftID(self, ac_id):